@@ -0,0 +1,632 @@
+"""Benchmarks for the public srsly serialization functions.
+
+Run every dumps/loads/read/write function over a set of realistic payloads and
+write the results to a JSON file:
+
+    python benchmarks/bench.py run --output results.json
+
+Compare two result files, e.g. from two different commits. Exits with a
+non-zero code if any benchmark got slower (or used more memory) than the
+threshold allows:
+
+    python benchmarks/bench.py compare baseline.json results.json --threshold 0.1
+"""
+
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from contextlib import contextmanager
+from dataclasses import dataclass
+from decimal import Decimal
+from pathlib import Path
+import argparse
+import collections.abc
+import datetime
+import gc
+import platform
+import random
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+import srsly
+
+try:
+    import numpy as np
+
+    has_numpy = True
+except ImportError:
+    has_numpy = False
+
+
+# Payloads
+
+
+def make_flat_records(scale: float) -> List[Dict[str, Any]]:
+    """A list of flat records with mixed scalar fields, e.g. a table of
+    annotations."""
+    rng = random.Random(0)
+    labels = ["PERSON", "ORG", "GPE", "DATE", "MONEY", "PRODUCT"]
+    records = []
+    for i in range(int(10_000 * scale)):
+        records.append(
+            {
+                "id": i,
+                "text": "".join(rng.choices(string.ascii_letters + " ", k=80)),
+                "label": rng.choice(labels),
+                "score": rng.random(),
+                "start": rng.randint(0, 1000),
+                "end": rng.randint(1000, 2000),
+                "answer": rng.choice(["accept", "reject", "ignore"]),
+                "flagged": rng.random() > 0.9,
+                "meta": None,
+                "session": f"session-{rng.randint(0, 100)}",
+            }
+        )
+    return records
+
+
+def make_nested_config(scale: float) -> Dict[str, Any]:
+    """A deeply nested config-style dict of sections and settings."""
+    rng = random.Random(0)
+    depth = 6 + int(scale > 1)
+
+    def section(level: int) -> Dict[str, Any]:
+        node: Dict[str, Any] = {
+            "name": f"section_{level}_{rng.randint(0, 1000)}",
+            "enabled": rng.random() > 0.5,
+            "dropout": round(rng.random(), 3),
+            "sizes": [rng.randint(1, 512) for _ in range(4)],
+        }
+        if level < depth:
+            for i in range(3):
+                node[f"child_{i}"] = section(level + 1)
+        return node
+
+    return section(0)
+
+
+def make_numpy_dict(scale: float) -> Dict[str, Any]:
+    """A dict of numpy arrays and scalars, e.g. serialized model weights."""
+    rng = np.random.default_rng(0)
+    n = max(int(64 * scale), 1)
+    data: Dict[str, Any] = {}
+    for i in range(n):
+        data[f"layer_{i}"] = {
+            "W": rng.random((128, 64), dtype="float32"),
+            "b": rng.random((64,), dtype="float32"),
+            "ids": rng.integers(0, 10_000, size=(256,), dtype="int64"),
+            "scale": np.float64(rng.random()),
+        }
+    return data
+
+
+def make_jsonl_records(scale: float) -> List[Dict[str, Any]]:
+    """A large list of records to be written to and read from JSONL files."""
+    return make_flat_records(scale * 10)
+
+
+def make_large_document(scale: float) -> List[Dict[str, Any]]:
+    """A single large document made of many small containers, e.g. a corpus
+    of tokenized texts. Decoding it allocates enough objects to trigger many
+    garbage collection passes."""
+    rng = random.Random(0)
+    docs = []
+    for i in range(int(20_000 * scale)):
+        tokens = []
+        start = 0
+        for _ in range(8):
+            length = rng.randint(1, 10)
+            tokens.append({"text": "x" * length, "start": start, "pos": "NOUN"})
+            start += length + 1
+        spans = [[rng.randint(0, 4), rng.randint(4, 8)] for _ in range(3)]
+        docs.append({"id": i, "tokens": tokens, "spans": spans, "cats": {}})
+    return docs
+
+
+def make_typed_records(scale: float) -> List[Dict[str, Any]]:
+    """Records with datetimes, UUIDs, Decimals and sets, e.g. logged events,
+    which are serialized with the optional msgpack codecs."""
+    rng = random.Random(0)
+    start = datetime.datetime(2024, 1, 1)
+    tags = ["new", "urgent", "review", "spam", "flagged"]
+    records = []
+    for i in range(int(10_000 * scale)):
+        seconds = rng.randint(0, 365 * 86400)
+        records.append(
+            {
+                "id": uuid.UUID(int=rng.getrandbits(128), version=4),
+                "time": start + datetime.timedelta(seconds=seconds, microseconds=i),
+                "price": Decimal(rng.randint(0, 100_000)).scaleb(-2),
+                "tags": set(rng.sample(tags, 2)),
+            }
+        )
+    return records
+
+
+def stringify_typed_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Convert the values of typed_records to strings and lists, the usual
+    workaround without codecs."""
+    return [
+        {
+            "id": str(record["id"]),
+            "time": record["time"].isoformat(),
+            "price": str(record["price"]),
+            "tags": sorted(record["tags"]),
+        }
+        for record in records
+    ]
+
+
+def parse_typed_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Parse the values converted by stringify_typed_records back."""
+    return [
+        {
+            "id": uuid.UUID(record["id"]),
+            "time": datetime.datetime.fromisoformat(record["time"]),
+            "price": Decimal(record["price"]),
+            "tags": set(record["tags"]),
+        }
+        for record in records
+    ]
+
+
+@dataclass
+class FlatRecord:
+    """A record of the flat_records and jsonl_records payloads as a compact
+    object, for reading them with into=FlatRecord instead of as dicts."""
+
+    __slots__ = (
+        "id",
+        "text",
+        "label",
+        "score",
+        "start",
+        "end",
+        "answer",
+        "flagged",
+        "meta",
+        "session",
+    )
+    id: int
+    text: str
+    label: str
+    score: float
+    start: int
+    end: int
+    answer: str
+    flagged: bool
+    meta: Any
+    session: str
+
+
+PAYLOADS: Dict[str, Callable[[float], Any]] = {
+    "flat_records": make_flat_records,
+    "nested_config": make_nested_config,
+    "numpy_dict": make_numpy_dict,
+    "jsonl_records": make_jsonl_records,
+    "large_document": make_large_document,
+    "typed_records": make_typed_records,
+    "typed_records_str": make_typed_records,
+}
+NUMPY_PAYLOADS = {"numpy_dict"}
+# Payloads serialized with the optional msgpack codecs
+CODEC_PAYLOADS = {"typed_records"}
+# Payloads converted to and from types the serializers support within the
+# timed call, e.g. the same records as typed_records without codecs
+CONVERTED_PAYLOADS: Dict[str, Tuple[Callable[[Any], Any], Callable[[Any], Any]]] = {
+    "typed_records_str": (stringify_typed_records, parse_typed_records),
+}
+NUMPY_FUNCS = {"read_jsonl_columns"}
+
+
+# Benchmark cases
+
+
+class Case(NamedTuple):
+    """A function to benchmark and the payloads to run it over.
+
+    func (str): Name of the function in the srsly namespace.
+    kind (str): "dumps", "loads", "write", "read" or "check".
+    payloads (Tuple[str, ...]): Names of payloads in PAYLOADS.
+    pair (str): Name of the function producing the input for "loads" and
+        "read" cases.
+    kwargs (dict): Keyword arguments passed to the function.
+    label (str): Suffix to tell apart variants of the same function.
+    pair_kwargs (dict): Keyword arguments passed to the pair function.
+    """
+
+    func: str
+    kind: str
+    payloads: Tuple[str, ...]
+    pair: Optional[str] = None
+    kwargs: Dict[str, Any] = {}
+    label: str = ""
+    pair_kwargs: Dict[str, Any] = {}
+
+    def name(self, payload: str) -> str:
+        label = f":{self.label}" if self.label else ""
+        return f"{self.func}{label}[{payload}]"
+
+
+DOCS = ("flat_records", "nested_config")
+LINES = ("jsonl_records",)
+BINARY = ("flat_records", "nested_config", "numpy_dict")
+# Payloads whose decoding is slowed down by garbage collection
+LARGE = ("large_document",)
+TYPED = ("typed_records", "typed_records_str")
+
+CASES: List[Case] = [
+    # JSON
+    Case("json_dumps", "dumps", DOCS),
+    Case("json_dumps", "dumps", ("numpy_dict",)),
+    Case(
+        "json_dumps",
+        "dumps",
+        ("numpy_dict",),
+        kwargs={"float_precision": 4},
+        label="float_precision",
+    ),
+    Case("json_dumpb", "dumps", DOCS),
+    Case("json_loads", "loads", DOCS + LARGE, pair="json_dumps"),
+    Case("write_json", "write", DOCS),
+    Case("read_json", "read", DOCS + LARGE, pair="write_json"),
+    Case("write_gzip_json", "write", DOCS),
+    Case("read_gzip_json", "read", DOCS, pair="write_gzip_json"),
+    Case("write_jsonl", "write", LINES),
+    Case("read_jsonl", "read", LINES, pair="write_jsonl"),
+    Case(
+        "read_jsonl",
+        "read",
+        LINES,
+        pair="write_jsonl",
+        kwargs={"intern_keys": True},
+        label="intern_keys",
+    ),
+    Case(
+        "read_jsonl",
+        "read",
+        LINES,
+        pair="write_jsonl",
+        kwargs={"intern_keys": True, "intern_values": True},
+        label="intern_values",
+    ),
+    Case(
+        "read_jsonl",
+        "read",
+        LINES,
+        pair="write_jsonl",
+        kwargs={"read_ahead": True},
+        label="read_ahead",
+    ),
+    Case(
+        "read_jsonl",
+        "read",
+        LINES,
+        pair="write_jsonl",
+        kwargs={"prefilter": b'"label": "MONEY"'},
+        label="prefilter",
+    ),
+    Case(
+        "read_jsonl",
+        "read",
+        LINES,
+        pair="write_jsonl",
+        kwargs={"into": FlatRecord},
+        label="into",
+    ),
+    Case("read_jsonl_columns", "read", LINES, pair="write_jsonl"),
+    Case(
+        "sample_jsonl",
+        "read",
+        LINES,
+        pair="write_jsonl",
+        kwargs={"k": 1000, "seed": 0},
+    ),
+    Case(
+        "sample_jsonl",
+        "read",
+        LINES,
+        pair="write_jsonl",
+        kwargs={"k": 1000, "seed": 0, "seek": True},
+        label="seek",
+    ),
+    Case("write_gzip_jsonl", "write", LINES),
+    Case("read_gzip_jsonl", "read", LINES, pair="write_gzip_jsonl"),
+    Case(
+        "sample_gzip_jsonl",
+        "read",
+        LINES,
+        pair="write_gzip_jsonl",
+        kwargs={"k": 1000, "seed": 0},
+    ),
+    Case(
+        "read_gzip_jsonl",
+        "read",
+        LINES,
+        pair="write_gzip_jsonl",
+        kwargs={"read_ahead": True},
+        label="read_ahead",
+    ),
+    Case("is_json_serializable", "check", DOCS),
+    Case("find_json_unserializable", "check", DOCS),
+    # msgpack
+    Case("msgpack_dumps", "dumps", BINARY),
+    Case("msgpack_loads", "loads", BINARY + LARGE, pair="msgpack_dumps"),
+    Case("write_msgpack", "write", BINARY + LINES),
+    Case("read_msgpack", "read", BINARY + LINES + LARGE, pair="write_msgpack"),
+    Case(
+        "read_msgpack",
+        "read",
+        LINES,
+        pair="write_msgpack",
+        kwargs={"intern_values": True},
+        label="intern_values",
+    ),
+    Case(
+        "write_msgpack",
+        "write",
+        LINES,
+        kwargs={"pack_records": True},
+        label="pack_records",
+    ),
+    Case(
+        "read_msgpack",
+        "read",
+        LINES,
+        pair="write_msgpack",
+        pair_kwargs={"pack_records": True},
+        label="pack_records",
+    ),
+    Case("msgpack_dumps", "dumps", TYPED),
+    Case("msgpack_loads", "loads", TYPED, pair="msgpack_dumps"),
+    Case("write_msgpack_stream", "write", LINES),
+    Case("iter_msgpack", "read", LINES, pair="write_msgpack_stream"),
+    Case(
+        "iter_msgpack",
+        "read",
+        LINES,
+        pair="write_msgpack_stream",
+        kwargs={"into": FlatRecord},
+        label="into",
+    ),
+    Case("write_records", "write", LINES),
+    Case("read_records", "read", LINES, pair="write_records"),
+    # YAML (pure Python, so only the config-style payload)
+    Case("yaml_dumps", "dumps", ("nested_config",)),
+    Case("yaml_loads", "loads", ("nested_config",), pair="yaml_dumps"),
+    Case("write_yaml", "write", ("nested_config",)),
+    Case("read_yaml", "read", ("nested_config",), pair="write_yaml"),
+    Case("is_yaml_serializable", "check", ("nested_config",)),
+    Case("find_yaml_unserializable", "check", ("nested_config",)),
+    # pickle
+    Case("pickle_dumps", "dumps", BINARY),
+    Case("pickle_loads", "loads", BINARY, pair="pickle_dumps"),
+    Case("write_pickle", "write", BINARY),
+    Case("read_pickle", "read", BINARY, pair="write_pickle"),
+    Case("write_pickle_stream", "write", LINES),
+    Case("iter_pickle", "read", LINES, pair="write_pickle_stream"),
+]
+
+
+def _consume(result: Any) -> Any:
+    """Materialize generators returned by the streaming readers."""
+    if isinstance(result, collections.abc.Iterator):
+        return list(result)
+    return result
+
+
+def prepare(
+    case: Case,
+    data: Any,
+    tmp_dir: Path,
+    convert: Optional[Tuple[Callable[[Any], Any], Callable[[Any], Any]]] = None,
+) -> Tuple[Callable[[], Any], int]:
+    """Set up a benchmark case and return the callable to time and the number
+    of serialized bytes it processes per call. For "dumps" and "loads" cases,
+    convert is a pair of functions applied to the data before it's serialized
+    and after it's deserialized, which are timed as well.
+    """
+    func = getattr(srsly, case.func)
+    kwargs = case.kwargs
+    if convert is not None and case.kind not in ("dumps", "loads"):
+        raise ValueError(f"Can't convert the data of {case.kind} benchmarks")
+    if case.kind == "dumps":
+        if convert is not None:
+            encode = convert[0]
+            n_bytes = len(func(encode(data), **kwargs))
+            return lambda: func(encode(data), **kwargs), n_bytes
+        n_bytes = len(func(data, **kwargs))
+        return lambda: func(data, **kwargs), n_bytes
+    elif case.kind == "loads":
+        if convert is not None:
+            encode, decode = convert
+            blob = getattr(srsly, case.pair)(encode(data), **case.pair_kwargs)
+            return lambda: decode(func(blob, **kwargs)), len(blob)
+        blob = getattr(srsly, case.pair)(data, **case.pair_kwargs)
+        return lambda: func(blob, **kwargs), len(blob)
+    elif case.kind == "check":
+        return lambda: func(data, **kwargs), 0
+    path = tmp_dir / case.name("data").replace(":", "_")
+    if case.kind == "write":
+        func(path, data, **kwargs)
+        return lambda: func(path, data, **kwargs), path.stat().st_size
+    elif case.kind == "read":
+        getattr(srsly, case.pair)(path, data, **case.pair_kwargs)
+        return lambda: _consume(func(path, **kwargs)), path.stat().st_size
+    raise ValueError(f"Unknown benchmark kind: {case.kind}")
+
+
+def measure(
+    thunk: Callable[[], Any], n_bytes: int, n_records: int, repeat: int
+) -> Dict[str, Any]:
+    """Time a callable and trace its peak Python memory usage."""
+    thunk()  # warm up
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        thunk()
+        timings.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        thunk()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    timings.sort()
+    median = statistics.median(timings)
+    return {
+        "repeat": repeat,
+        "min_s": timings[0],
+        "median_s": median,
+        "mean_s": statistics.fmean(timings),
+        "p90_s": _percentile(timings, 0.9),
+        "p99_s": _percentile(timings, 0.99),
+        "max_s": timings[-1],
+        "bytes": n_bytes,
+        "records": n_records,
+        "mb_per_s": n_bytes / median / 1e6 if median and n_bytes else None,
+        "records_per_s": n_records / median if median and n_records else None,
+        "peak_memory_bytes": peak,
+    }
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    idx = min(int(round(q * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[idx]
+
+
+@contextmanager
+def _msgpack_codecs(enable: bool):
+    """Register the optional msgpack codecs for the duration of a case."""
+    if not enable:
+        yield
+        return
+    srsly.register_msgpack_codecs()
+    try:
+        yield
+    finally:
+        for name in ("datetime", "uuid", "decimal", "set"):
+            srsly.msgpack_encoders.deregister(name)
+            srsly.msgpack_decoders.deregister(name)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def run(
+    output: Optional[Path], scale: float, repeat: int, select: Optional[str]
+) -> Dict[str, Any]:
+    payloads: Dict[str, Any] = {}
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        for case in CASES:
+            for payload in case.payloads:
+                name = case.name(payload)
+                if select and select not in name:
+                    continue
+                needs_numpy = payload in NUMPY_PAYLOADS or case.func in NUMPY_FUNCS
+                if needs_numpy and not has_numpy:
+                    continue
+                if payload not in payloads:
+                    payloads[payload] = PAYLOADS[payload](scale)
+                data = payloads[payload]
+                n_records = len(data) if isinstance(data, list) else 0
+                with _msgpack_codecs(payload in CODEC_PAYLOADS):
+                    convert = CONVERTED_PAYLOADS.get(payload)
+                    thunk, n_bytes = prepare(case, data, tmp_dir, convert)
+                    results[name] = measure(thunk, n_bytes, n_records, repeat)
+                _print_result(name, results[name])
+    report = {
+        "meta": {
+            "srsly": srsly.__version__,
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "scale": scale,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+    if output is not None:
+        srsly.write_json(output, report)
+    return report
+
+
+def _print_result(name: str, result: Dict[str, Any]) -> None:
+    throughput = result["mb_per_s"]
+    throughput = f"{throughput:9.1f} MB/s" if throughput else " " * 14
+    peak = result["peak_memory_bytes"] / 1e6
+    print(
+        f"{name:<48} {result['median_s'] * 1e3:10.2f} ms "
+        f"(p90 {result['p90_s'] * 1e3:9.2f} ms) {throughput} "
+        f"{peak:9.1f} MB peak",
+        flush=True,
+    )
+
+
+def compare(baseline: Path, current: Path, threshold: float) -> int:
+    """Compare two result files and return the number of regressions."""
+    old = srsly.read_json(baseline)["results"]
+    new = srsly.read_json(current)["results"]
+    regressions = 0
+    for name in sorted(set(old) & set(new)):
+        time_ratio = new[name]["median_s"] / old[name]["median_s"]
+        old_peak = max(old[name]["peak_memory_bytes"], 1)
+        mem_ratio = new[name]["peak_memory_bytes"] / old_peak
+        flags = []
+        if time_ratio > 1 + threshold:
+            flags.append("SLOWER")
+        if mem_ratio > 1 + threshold:
+            flags.append("MORE MEMORY")
+        regressions += bool(flags)
+        print(
+            f"{name:<48} time x{time_ratio:5.2f}  memory x{mem_ratio:5.2f}  "
+            + " ".join(flags)
+        )
+    for name in sorted(set(old) ^ set(new)):
+        print(f"{name:<48} only in {'baseline' if name in old else 'current'}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("--output", "-o", type=Path, help="JSON results file")
+    run_parser.add_argument("--scale", type=float, default=1.0, help="Payload size")
+    run_parser.add_argument("--repeat", type=int, default=5, help="Timed runs")
+    run_parser.add_argument("--select", "-k", help="Only run matching benchmarks")
+    cmp_parser = subparsers.add_parser("compare", help="Compare two result files")
+    cmp_parser.add_argument("baseline", type=Path)
+    cmp_parser.add_argument("current", type=Path)
+    cmp_parser.add_argument(
+        "--threshold", type=float, default=0.1, help="Allowed relative slowdown"
+    )
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        run(args.output, args.scale, args.repeat, args.select)
+        return 0
+    return 1 if compare(args.baseline, args.current, args.threshold) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,22 @@
 from ._json_api import read_json, read_gzip_json, write_json, write_gzip_json
 from ._json_api import read_gzip_jsonl, write_gzip_jsonl
-from ._json_api import read_jsonl, write_jsonl
-from ._json_api import json_dumps, json_loads, is_json_serializable
+from ._json_api import read_jsonl, write_jsonl, read_jsonl_columns
+from ._json_api import sample_jsonl, sample_gzip_jsonl
+from ._json_api import json_dumps, json_dumpb, json_loads, is_json_serializable
+from ._json_api import find_json_unserializable
 from ._msgpack_api import read_msgpack, write_msgpack, msgpack_dumps, msgpack_loads
 from ._msgpack_api import msgpack_encoders, msgpack_decoders
+from ._msgpack_api import iter_msgpack, write_msgpack_stream
+from ._msgpack_api import MsgpackSerializer
+from ._msgpack_codecs import register_msgpack_codecs
+from ._msgpack_shared import write_shared_msgpack, read_shared_msgpack, SharedMsgpack
 from ._pickle_api import pickle_dumps, pickle_loads
+from ._pickle_api import read_pickle, write_pickle, iter_pickle, write_pickle_stream
 from ._yaml_api import read_yaml, write_yaml, yaml_dumps, yaml_loads
-from ._yaml_api import is_yaml_serializable
+from ._yaml_api import is_yaml_serializable, find_yaml_unserializable
+from ._parallel_api import read_many, write_shards, ShardWriter
+from ._records_api import read_records, write_records, RecordReader, RecordWriter
+from ._records_api import RecordStore
+from ._ragged import RaggedArray
+from ._instrumentation import io_listeners, IOEvent
 from .about import __version__
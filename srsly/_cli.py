@@ -0,0 +1,336 @@
+"""
+Command-line interface for converting and inspecting data files:
+
+    python -m srsly convert data.jsonl data.msgpack.gz
+    python -m srsly cat shard-*.jsonl.gz --to jsonl | grep ...
+    python -m srsly head data.msgpack -n 5
+    python -m srsly count data.jsonl.gz
+    python -m srsly sample data.jsonl -k 1000 --seed 0 -o sample.jsonl
+
+Records are streamed through binary standard input/output with bounded
+memory. Only the json and yaml formats, which hold a single document, load or
+build the whole document in memory.
+"""
+
+from typing import Any, Iterable, Iterator, List, Optional
+from contextlib import contextmanager
+from pathlib import Path
+import argparse
+import gzip
+import itertools
+import os
+import random
+import sys
+
+from ._json_api import read_json, read_gzip_json, read_jsonl, read_gzip_jsonl
+from ._json_api import write_json, write_gzip_json, json_dumpb
+from ._json_api import sample_jsonl, sample_gzip_jsonl
+from ._msgpack_api import iter_msgpack, msgpack_dumps
+from ._yaml_api import read_yaml, write_yaml
+from .util import ParallelGzipWriter, FilePath, open_binary, reservoir_sample
+
+# Formats by file extension
+EXTENSIONS = {
+    ".jsonl": "jsonl",
+    ".jsonl.gz": "jsonl.gz",
+    ".json": "json",
+    ".json.gz": "json.gz",
+    ".msgpack": "msgpack",
+    ".msg": "msgpack",
+    ".mpk": "msgpack",
+    ".msgpack.gz": "msgpack.gz",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+}
+FORMATS = sorted(set(EXTENSIONS.values()))
+# Formats holding one record after another, which can be streamed
+STREAM_FORMATS = {"jsonl", "jsonl.gz", "msgpack", "msgpack.gz"}
+# Number of records to serialize before writing them out
+BATCH_SIZE = 1000
+
+
+def get_format(path: FilePath, fmt: Optional[str] = None) -> str:
+    """Get the format of a file from its extension, unless it's set
+    explicitly. Standard input/output defaults to jsonl.
+
+    path (str): The file path, or "-" for standard input/output.
+    fmt (Optional[str]): The format set explicitly.
+    RETURNS (str): The format.
+    """
+    if fmt is not None:
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format: {fmt}. Supported: {FORMATS}")
+        return fmt
+    if path == "-":
+        return "jsonl"
+    suffixes = Path(str(path).lower()).suffixes
+    suffix = "".join(suffixes[-2:] if suffixes[-1:] == [".gz"] else suffixes[-1:])
+    if suffix not in EXTENSIONS:
+        raise ValueError(
+            f"Can't infer format of {path}, use --from or --to. "
+            f"Supported: {', '.join(EXTENSIONS)}"
+        )
+    return EXTENSIONS[suffix]
+
+
+def iter_records(path: str, fmt: str, skip: bool = False) -> Iterator[Any]:
+    """Yield the records of a file or standard input. Documents of the json
+    and yaml formats that are lists yield one record per item.
+
+    path (str): The file path. "-" for reading from stdin.
+    fmt (str): The format.
+    skip (bool): Skip broken lines of jsonl files.
+    YIELDS: The records.
+    """
+    # Reading ahead on a pipe would wait for a full chunk before the first
+    # record, e.g. when following a log with tail -f
+    read_ahead = path != "-"
+    if fmt == "jsonl":
+        yield from read_jsonl(path, skip=skip, read_ahead=read_ahead)
+    elif fmt == "jsonl.gz":
+        yield from read_gzip_jsonl(path, skip=skip, read_ahead=read_ahead)
+    elif fmt in ("msgpack", "msgpack.gz"):
+        yield from iter_msgpack(path, compress=fmt == "msgpack.gz")
+    else:
+        if fmt == "json":
+            data = read_json(path)
+        elif fmt == "yaml":
+            data = read_yaml(path)
+        elif path == "-":
+            raise ValueError(f"Can't read format {fmt} from stdin")
+        else:
+            data = read_gzip_json(path)
+        if isinstance(data, list):
+            yield from data
+        else:
+            yield data
+
+
+def write_records(
+    path: str,
+    fmt: str,
+    records: Iterable[Any],
+    workers: int = 4,
+    level: int = 6,
+) -> int:
+    """Write records to a file or standard output. Stream formats are written
+    as the records come in, and compressed on a pool of worker threads.
+
+    path (str): The file path. "-" for writing to stdout.
+    fmt (str): The format.
+    records (Iterable[Any]): The records.
+    workers (int): Number of compression threads.
+    level (int): The gzip compression level.
+    RETURNS (int): The number of records written.
+    """
+    if fmt not in STREAM_FORMATS:
+        data = list(records)
+        if fmt == "json":
+            write_json(path, data)
+        elif fmt == "yaml":
+            write_yaml(path, data)
+        elif path == "-":
+            raise ValueError(f"Can't write format {fmt} to stdout")
+        else:
+            write_gzip_json(path, data)
+        return len(data)
+    if fmt.startswith("jsonl"):
+        encoded = (json_dumpb(record) + b"\n" for record in records)
+    else:
+        encoded = (msgpack_dumps(record) for record in records)
+    n_records = 0
+    with _replace_on_success(path) as tmp_path, open_binary(tmp_path, "wb") as f:
+        out = ParallelGzipWriter(f, workers, level) if fmt.endswith(".gz") else f
+        while True:
+            batch = list(itertools.islice(encoded, BATCH_SIZE))
+            if not batch:
+                break
+            out.write(b"".join(batch))
+            n_records += len(batch)
+        if out is not f:
+            out.close()
+    return n_records
+
+
+@contextmanager
+def _replace_on_success(path: str) -> Iterator[str]:
+    """Write to a temporary file next to the output file, which replaces it
+    once the block succeeds. If reading the input fails, an existing output
+    file is left as it was.
+
+    path (str): The output file path. "-" for stdout, which is used as is.
+    YIELDS (str): The path to write to.
+    """
+    if path == "-":
+        yield path
+        return
+    directory, name = os.path.split(os.path.abspath(path))
+    tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def count_records(path: str, fmt: str) -> int:
+    """Count the records of a file or standard input. Lines of jsonl files
+    are counted without parsing them.
+
+    path (str): The file path. "-" for reading from stdin.
+    fmt (str): The format.
+    RETURNS (int): The number of records.
+    """
+    if fmt in ("jsonl", "jsonl.gz"):
+        with open_binary(path, "rb", compress=fmt == "jsonl.gz") as f:
+            # Blank lines are skipped by the readers
+            return sum(map(bool, map(bytes.strip, f)))
+    return sum(1 for _ in iter_records(path, fmt))
+
+
+def sample_records(
+    path: str,
+    fmt: str,
+    k: int,
+    seed: Optional[int] = None,
+    seek: bool = False,
+    skip: bool = False,
+) -> List[Any]:
+    """Draw a random sample of k records of a file or standard input in a
+    single pass. For jsonl files, only the sampled lines are parsed.
+
+    path (str): The file path. "-" for reading from stdin.
+    fmt (str): The format.
+    k (int): Number of records to sample.
+    seed (int): Seed for the random number generator.
+    seek (bool): Seek to random offsets of uncompressed jsonl files instead of
+        scanning them.
+    skip (bool): Skip broken lines of jsonl files.
+    RETURNS (List[Any]): The sampled records, in their original order.
+    """
+    if fmt == "jsonl":
+        return sample_jsonl(path, k, seed=seed, skip=skip, seek=seek)
+    if seek:
+        raise ValueError("--seek is only supported for uncompressed jsonl files")
+    if fmt == "jsonl.gz" and path != "-":
+        return sample_gzip_jsonl(path, k, seed=seed, skip=skip)
+    return reservoir_sample(iter_records(path, fmt, skip=skip), k, random.Random(seed))
+
+
+def convert(args: argparse.Namespace) -> None:
+    in_fmt = get_format(args.input, args.from_format)
+    out_fmt = get_format(args.output, args.to_format)
+    if "-" not in (args.input, args.output):
+        if Path(args.input).resolve() == Path(args.output).resolve():
+            raise ValueError("Input and output must be different files")
+    records = iter_records(args.input, in_fmt, skip=args.skip)
+    write_records(args.output, out_fmt, records, args.workers, args.level)
+
+
+def cat(args: argparse.Namespace) -> None:
+    records = itertools.chain.from_iterable(
+        iter_records(path, get_format(path, args.from_format), skip=args.skip)
+        for path in args.inputs
+    )
+    out_fmt = get_format(args.output, args.to_format)
+    write_records(args.output, out_fmt, records, args.workers, args.level)
+
+
+def head(args: argparse.Namespace) -> None:
+    in_fmt = get_format(args.input, args.from_format)
+    records = itertools.islice(iter_records(args.input, in_fmt, skip=args.skip), args.n)
+    out_fmt = get_format(args.output, args.to_format)
+    write_records(args.output, out_fmt, records, args.workers, args.level)
+
+
+def count(args: argparse.Namespace) -> None:
+    for path in args.inputs:
+        n_records = count_records(path, get_format(path, args.from_format))
+        line = f"{n_records}\t{path}" if len(args.inputs) > 1 else str(n_records)
+        sys.stdout.write(line + "\n")
+
+
+def sample(args: argparse.Namespace) -> None:
+    in_fmt = get_format(args.input, args.from_format)
+    records = sample_records(
+        args.input, in_fmt, args.k, seed=args.seed, seek=args.seek, skip=args.skip
+    )
+    out_fmt = get_format(args.output, args.to_format)
+    write_records(args.output, out_fmt, records, args.workers, args.level)
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m srsly",
+        description="Convert and inspect jsonl, json, msgpack and yaml files. "
+        "Use - for standard input/output.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name, func, help, inputs="one", output=True):
+        sub = subparsers.add_parser(name, help=help, description=help)
+        if inputs == "many":
+            sub.add_argument("inputs", nargs="+", help="input files or -")
+        else:
+            sub.add_argument("input", help="input file or -")
+        sub.add_argument("--from", dest="from_format", choices=FORMATS)
+        sub.add_argument(
+            "--skip", action="store_true", help="skip broken lines of jsonl input"
+        )
+        if output:
+            sub.add_argument("--to", dest="to_format", choices=FORMATS)
+            sub.add_argument(
+                "--workers",
+                type=int,
+                default=min(4, os.cpu_count() or 1),
+                help="number of threads compressing gzip output",
+            )
+            sub.add_argument("--level", type=int, default=6, help="gzip level")
+        sub.set_defaults(func=func)
+        return sub
+
+    sub = add_command("convert", convert, "Convert a file to another format.")
+    sub.add_argument("output", help="output file or -")
+    sub = add_command("cat", cat, "Concatenate the records of files.", inputs="many")
+    sub.add_argument("-o", "--output", default="-", help="output file or -")
+    sub = add_command("head", head, "Write the first records of a file.")
+    sub.add_argument("-n", type=int, default=10, help="number of records")
+    sub.add_argument("-o", "--output", default="-", help="output file or -")
+    add_command(
+        "count", count, "Count the records of files.", inputs="many", output=False
+    )
+    sub = add_command("sample", sample, "Write a random sample of records.")
+    sub.add_argument("-k", type=int, required=True, help="number of records")
+    sub.add_argument("--seed", type=int, default=None)
+    sub.add_argument(
+        "--seek",
+        action="store_true",
+        help="seek to random offsets of a jsonl file instead of scanning it",
+    )
+    sub.add_argument("-o", "--output", default="-", help="output file or -")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the command-line interface.
+
+    argv (Optional[List[str]]): The arguments. Defaults to sys.argv.
+    RETURNS (int): The exit code.
+    """
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    try:
+        args.func(args)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader went away, e.g. when piping into head. Point stdout to
+        # devnull so Python doesn't fail again when flushing it on exit.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+    except (ValueError, OSError, gzip.BadGzipFile) as e:
+        sys.stderr.write(f"srsly {args.command}: {e}\n")
+        return 1
+    return 0
@@ -0,0 +1,135 @@
+"""
+Conversion of deserialized records into instances of dataclasses and named
+tuples, e.g. with read_jsonl(path, into=Token). Holding many records as
+objects of a class with __slots__ uses a fraction of the memory of dicts.
+
+For each class, the conversion function is generated once as Python source
+that reads every field from the record and calls the class with them, so
+converting a record costs about as much as constructing the object by hand.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import dataclasses
+import functools
+
+# Policies for keys of a record that aren't fields of the class
+UNKNOWN_POLICIES = ("ignore", "error")
+# Policies for fields without a default that are missing from a record
+MISSING_POLICIES = ("error", "none")
+_NO_DEFAULT = object()
+
+
+@functools.lru_cache(maxsize=None)
+def get_converter(
+    cls: type, unknown: str = "ignore", missing: str = "error"
+) -> Callable[[Any], Any]:
+    """Get the function converting a record dict into an instance of a
+    dataclass or named tuple. Fields missing from the record get their
+    default value, if they have one.
+
+    cls (type): The dataclass or named tuple class.
+    unknown (str): What to do with keys that aren't fields of the class:
+        "ignore" them or raise an "error".
+    missing (str): What to do with missing fields without a default: raise
+        an "error" or set them to "none".
+    RETURNS (Callable[[Any], Any]): The function, which raises ValueError if
+        a record can't be converted.
+    """
+    if unknown not in UNKNOWN_POLICIES:
+        raise ValueError(f"Invalid unknown policy: {unknown}. {UNKNOWN_POLICIES}")
+    if missing not in MISSING_POLICIES:
+        raise ValueError(f"Invalid missing policy: {missing}. {MISSING_POLICIES}")
+    fields = _get_fields(cls)
+    names = {name for name, _, _, _ in fields}
+    namespace: Dict[str, Any] = {
+        "cls": cls,
+        "names": frozenset(names),
+        "_get_error": functools.partial(_get_error, cls, fields, unknown),
+    }
+    args = []
+    for i, (name, default, factory, keyword) in enumerate(fields):
+        if default is not _NO_DEFAULT:
+            namespace[f"default_{i}"] = default
+            value = f"record.get({name!r}, default_{i})"
+        elif factory is not _NO_DEFAULT:
+            namespace[f"factory_{i}"] = factory
+            value = f"(record[{name!r}] if {name!r} in record else factory_{i}())"
+        elif missing == "none":
+            value = f"record.get({name!r})"
+        else:
+            value = f"record[{name!r}]"
+        args.append(f"{name}={value}" if keyword else value)
+    lines = [
+        "def convert(record):",
+        "    if type(record) is not dict:",
+        "        raise _get_error(record)",
+    ]
+    if unknown == "error":
+        lines += [
+            "    if not names.issuperset(record):",
+            "        raise _get_error(record)",
+        ]
+    lines += [
+        "    try:",
+        f"        return cls({', '.join(args)})",
+        "    except KeyError:",
+        "        error = _get_error(record)",
+        "        if error is None:",
+        "            raise",
+        "    raise error",
+    ]
+    exec("\n".join(lines), namespace)
+    convert = namespace["convert"]
+    convert.__qualname__ = f"convert_to_{cls.__name__}"
+    return convert
+
+
+def _get_fields(cls: type) -> List[Tuple[str, Any, Any, bool]]:
+    """Get the name, default, default factory and whether the field is
+    keyword-only for each field of the class's __init__."""
+    if isinstance(cls, type) and dataclasses.is_dataclass(cls):
+        fields = []
+        for field in dataclasses.fields(cls):
+            if not field.init:
+                continue
+            default = field.default
+            factory = field.default_factory
+            if default is dataclasses.MISSING:
+                default = _NO_DEFAULT
+            if factory is dataclasses.MISSING:
+                factory = _NO_DEFAULT
+            keyword = getattr(field, "kw_only", False)
+            fields.append((field.name, default, factory, keyword))
+        return fields
+    if isinstance(cls, type) and issubclass(cls, tuple) and hasattr(cls, "_fields"):
+        defaults = cls._field_defaults
+        return [
+            (name, defaults.get(name, _NO_DEFAULT), _NO_DEFAULT, False)
+            for name in cls._fields
+        ]
+    raise TypeError(
+        f"Can't convert records into {cls!r}: not a dataclass or namedtuple"
+    )
+
+
+def _get_error(
+    cls: type, fields: List[Tuple[str, Any, Any, bool]], unknown: str, record: Any
+) -> Optional[ValueError]:
+    """Explain why a record can't be converted, or return None if it's not
+    the record's fault."""
+    name = cls.__name__
+    if not isinstance(record, dict):
+        return ValueError(f"Can't convert {type(record).__name__} into {name}")
+    names: Set[str] = {field[0] for field in fields}
+    if unknown == "error":
+        unknown_keys = [key for key in record if key not in names]
+        if unknown_keys:
+            return ValueError(f"Unknown fields for {name}: {unknown_keys}")
+    missing = [
+        field
+        for field, default, factory, _ in fields
+        if field not in record and default is _NO_DEFAULT and factory is _NO_DEFAULT
+    ]
+    if missing:
+        return ValueError(f"Missing fields for {name}: {missing}")
+    return None
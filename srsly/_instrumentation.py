@@ -0,0 +1,247 @@
+from typing import Any, Callable, Iterator, Optional
+from contextlib import contextmanager
+import functools
+import inspect
+import os
+import threading
+import time
+
+
+class IOEvent:
+    """Report of a single srsly read, write, dumps or loads call, passed to
+    the functions registered on srsly.io_listeners.
+
+    format (str): The serialization format, e.g. "json", "msgpack".
+    func (str): Name of the called function, e.g. "read_jsonl".
+    path (str): The file path, "-" for standard input/output. None for dumps
+        and loads.
+    bytes_in (int): Number of serialized bytes read (size on disk for files,
+        length of the input for loads). None if unknown.
+    bytes_out (int): Number of serialized bytes written (size on disk for
+        files, length of the output for dumps). None if unknown.
+    records (int): Number of records read or written.
+    skipped (int): Number of broken lines skipped, e.g. with skip=True.
+    wall_time (float): Wall-clock time in seconds spent inside srsly. For
+        streaming readers, time spent by the consumer is not included.
+    cpu_time (float): CPU time in seconds of the calling thread.
+    error (Exception): The exception raised by the call, if any.
+    """
+
+    __slots__ = (
+        "format",
+        "func",
+        "path",
+        "bytes_in",
+        "bytes_out",
+        "records",
+        "skipped",
+        "wall_time",
+        "cpu_time",
+        "error",
+    )
+
+    def __init__(self, format: str, func: str, path: Optional[str] = None):
+        self.format = format
+        self.func = func
+        self.path = path
+        self.bytes_in: Optional[int] = None
+        self.bytes_out: Optional[int] = None
+        self.records = 0
+        self.skipped = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.error: Optional[BaseException] = None
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"IOEvent({fields})"
+
+
+class _IOListeners:
+    """API for observing srsly I/O:
+
+        srsly.io_listeners.register(name, func)
+        srsly.io_listeners.deregister(name)
+
+    where `name` is a unique ID and `func` is a callable that receives an
+    IOEvent after every read_*, write_*, *_dumps and *_loads call. Calls made
+    internally by another srsly function (e.g. json_dumps inside write_json)
+    are not reported separately. When no listener is registered, the functions
+    run without any instrumentation.
+    """
+
+    __slots__ = ("_ext", "_lock")
+
+    def __init__(self):
+        self._ext = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, func):
+        """Register a listener function"""
+        with self._lock:
+            ext = dict(self._ext)
+            ext[name] = func
+            self._ext = ext
+
+    def deregister(self, name):
+        with self._lock:
+            ext = dict(self._ext)
+            del ext[name]
+            self._ext = ext
+
+    @contextmanager
+    def listen(self, func: Callable[[IOEvent], Any]) -> Iterator[None]:
+        """Register a listener for the duration of the block."""
+        name = f"listen-{id(func)}-{threading.get_ident()}"
+        self.register(name, func)
+        try:
+            yield
+        finally:
+            self.deregister(name)
+
+    def _emit(self, event):
+        for func in self._ext.values():
+            func(event)
+
+
+io_listeners = _IOListeners()
+# The event currently being recorded in this thread, if any
+_state = threading.local()
+
+
+def record_skip() -> None:
+    """Count a skipped broken line on the event currently being recorded."""
+    event = getattr(_state, "event", None)
+    if event is not None:
+        event.skipped += 1
+
+
+def instrument(
+    format: str,
+    kind: str,
+    stream_arg: Optional[str] = None,
+    count_result: Optional[Callable[[Any], int]] = None,
+):
+    """Decorator reporting calls of a serialization function to io_listeners.
+
+    format (str): The serialization format.
+    kind (str): "dumps", "loads", "read" or "write".
+    stream_arg (str): Name of the argument holding the records to write, so
+        they can be counted.
+    count_result (Callable[[Any], int]): Function getting the number of
+        records from the return value, for readers returning many records at
+        once. Otherwise, a call returning a value counts as one record.
+    """
+
+    def decorator(func):
+        params = list(inspect.signature(func).parameters)
+        stream_idx = params.index(stream_arg) if stream_arg else None
+        append_idx = params.index("append") if "append" in params else None
+        is_generator = inspect.isgeneratorfunction(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not io_listeners._ext or getattr(_state, "event", None) is not None:
+                return func(*args, **kwargs)
+            data = args[0] if args else kwargs.get(params[0])
+            path = None
+            if kind in ("read", "write"):
+                path = data if isinstance(data, str) else os.fspath(data)
+            event = IOEvent(format, func.__name__, path)
+            # Only appending writes keep the previous contents of the file
+            size_before = None
+            if kind == "write" and _is_append(append_idx, args, kwargs):
+                size_before = _file_size(path)
+            if kind == "read":
+                event.bytes_in = _file_size(path)
+            elif kind == "loads" and isinstance(data, (str, bytes, bytearray)):
+                event.bytes_in = len(data)
+            if stream_idx is not None:
+                args, kwargs = _count_records(event, stream_idx, params, args, kwargs)
+            else:
+                event.records = 0 if is_generator else 1
+            if is_generator:
+                return _run_generator(event, func(*args, **kwargs))
+            start, cpu_start = time.perf_counter(), time.thread_time()
+            _state.event = event
+            try:
+                result = func(*args, **kwargs)
+                if kind == "dumps":
+                    event.bytes_out = len(result)
+                if count_result is not None:
+                    event.records = count_result(result)
+            except BaseException as e:
+                event.error = e
+                raise
+            finally:
+                _state.event = None
+                event.wall_time = time.perf_counter() - start
+                event.cpu_time = time.thread_time() - cpu_start
+                if kind == "write" and event.error is None:
+                    size_after = _file_size(path)
+                    if size_after is not None:
+                        event.bytes_out = size_after - (size_before or 0)
+                io_listeners._emit(event)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _run_generator(event: IOEvent, gen: Iterator) -> Iterator:
+    try:
+        while True:
+            start, cpu_start = time.perf_counter(), time.thread_time()
+            # The generator may be consumed inside another instrumented call
+            prev_event = getattr(_state, "event", None)
+            _state.event = event
+            try:
+                item = next(gen)
+            except StopIteration:
+                return
+            finally:
+                _state.event = prev_event
+                event.wall_time += time.perf_counter() - start
+                event.cpu_time += time.thread_time() - cpu_start
+            event.records += 1
+            yield item
+    except GeneratorExit:
+        raise
+    except BaseException as e:
+        event.error = e
+        raise
+    finally:
+        gen.close()
+        io_listeners._emit(event)
+
+
+def _count_records(event, idx, params, args, kwargs):
+    def counter(records):
+        for record in records:
+            event.records += 1
+            yield record
+
+    if len(args) > idx:
+        args = args[:idx] + (counter(args[idx]),) + args[idx + 1 :]
+    else:
+        kwargs = dict(kwargs)
+        kwargs[params[idx]] = counter(kwargs[params[idx]])
+    return args, kwargs
+
+
+def _is_append(idx: Optional[int], args: tuple, kwargs: dict) -> bool:
+    if idx is None:
+        return False
+    if len(args) > idx:
+        return bool(args[idx])
+    return bool(kwargs.get("append", False))
+
+
+def _file_size(path: Optional[str]) -> Optional[int]:
+    if path is None or path == "-":
+        return None
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return None
@@ -1,45 +1,135 @@
-from typing import Union, Iterable, Any, Optional, Iterator
+from typing import Union, Iterable, Any, Optional, Iterator, Dict, List, Sequence
+from typing import Callable, Pattern, IO, Tuple, Hashable
+from decimal import Decimal
 import sys
+import re
+import random
+import itertools
 import json as _builtin_json
 import gzip
 
 import ujson
 
 from .util import force_path, force_string, FilePath, JSONInput, JSONOutput
-
-
+from .util import StringInterner, read_ahead_lines, reservoir_sample, suspend_gc
+from .util import open_binary, GC_SUSPEND_MIN_SIZE
+from ._instrumentation import instrument, record_skip
+from ._convert import get_converter
+from ._json_numpy import encode_numpy_json, get_json_default, get_numpy_json_value
+from ._json_numpy import has_numpy, has_cupy
+from ._serializable import StructuralChecker, Verdict, has_call
+from ._serializable import OK, FAIL, SEQUENCE, MAPPING
+
+if has_numpy:
+    import numpy
+if has_cupy:
+    import cupy
+
+# A substring, regular expression or function checking raw lines
+PrefilterType = Union[bytes, str, Pattern, Callable[[bytes], bool]]
+# Number of lines of a file parsed at a time while the collector is
+# suspended, and serialized at a time before they're written
+JSONL_BATCH_SIZE = 1000
+# Number of bytes read from the start of a file to estimate its number of
+# lines before sampling by seeking
+SEEK_SAMPLE_PROBE_SIZE = 2**16
+
+
+@instrument("json", "dumps")
 def json_dumps(
-    data: JSONInput, indent: Optional[int] = 0, sort_keys: bool = False
+    data: JSONInput,
+    indent: Optional[int] = 0,
+    sort_keys: bool = False,
+    float_precision: Optional[int] = None,
 ) -> str:
-    """Serialize an object to a JSON string.
+    """Serialize an object to a JSON string. numpy arrays and scalars are
+    converted in bulk.
 
     data: The JSON-serializable data.
     indent (int): Number of spaces used to indent JSON.
     sort_keys (bool): Sort dictionary keys. Falls back to json module for now.
+    float_precision (int): Round numpy float values to this number of
+        decimals. By default, they're written at full float64 precision.
     RETURNS (str): The serialized string.
     """
+    return _dumps(data, indent, sort_keys, get_json_default(float_precision))
+
+
+@instrument("json", "dumps")
+def json_dumpb(
+    data: JSONInput,
+    indent: Optional[int] = 0,
+    sort_keys: bool = False,
+    float_precision: Optional[int] = None,
+) -> bytes:
+    """Serialize an object to UTF-8 encoded JSON bytes, e.g. to write them to
+    a binary file or socket. numpy arrays and scalars are converted in bulk.
+
+    data: The JSON-serializable data.
+    indent (int): Number of spaces used to indent JSON.
+    sort_keys (bool): Sort dictionary keys. Falls back to json module for now.
+    float_precision (int): Round numpy float values to this number of
+        decimals. By default, they're written at full float64 precision.
+    RETURNS (bytes): The serialized bytes.
+    """
+    default = get_json_default(float_precision)
+    return _dumps(data, indent, sort_keys, default).encode("utf8")
+
+
+def _dumps(
+    data: JSONInput,
+    indent: Optional[int],
+    sort_keys: bool,
+    default: Callable[[Any], Any],
+) -> str:
     if sort_keys:
         indent = None if indent == 0 else indent
-        result = _builtin_json.dumps(
-            data, indent=indent, separators=(",", ":"), sort_keys=sort_keys
+        return _builtin_json.dumps(
+            data,
+            indent=indent,
+            separators=(",", ":"),
+            sort_keys=sort_keys,
+            default=default,
         )
-    else:
-        result = ujson.dumps(data, indent=indent, escape_forward_slashes=False)
-    return result
-
-
-def json_loads(data: Union[str, bytes]) -> JSONOutput:
-    """Deserialize unicode or bytes to a Python object.
+    # Non-ASCII characters are escaped, so the output encodes to UTF-8 with a
+    # plain copy
+    return ujson.dumps(
+        data, indent=indent, escape_forward_slashes=False, default=default
+    )
+
+
+@instrument("json", "loads")
+def json_loads(
+    data: Union[str, bytes], intern_keys: bool = False, intern_values: bool = False
+) -> JSONOutput:
+    """Deserialize unicode or bytes to a Python object. ujson doesn't support
+    decoding hooks, so with intern_keys or intern_values the data is parsed
+    with the json module's C decoder instead. It accepts the same documents,
+    but is slower: about 1.3x on string-heavy data and over 2x on
+    number-heavy data.
 
     data (str / bytes): The data to deserialize.
+    intern_keys (bool): Share one string object between repeated dict keys.
+    intern_values (bool): Share one string object between repeated short
+        string values of dicts.
     RETURNS: The deserialized Python object.
     """
     # Avoid transforming the string '-' into the int '0'
     if data == "-":
         raise ValueError("Expected object or value")
-    return ujson.loads(data)
-
-
+    loads = ujson.loads
+    if intern_values:
+        loads = _get_interning_loads(intern_keys, intern_values)
+    elif intern_keys:
+        # The json module's decoder shares repeated keys within a call itself
+        loads = _builtin_loads
+    if len(data) >= GC_SUSPEND_MIN_SIZE:
+        with suspend_gc():
+            return loads(data)
+    return loads(data)
+
+
+@instrument("json", "read")
 def read_json(path: FilePath) -> JSONOutput:
     """Load JSON from file or standard input.
 
@@ -48,12 +138,14 @@ def read_json(path: FilePath) -> JSONOutput:
     """
     if path == "-":  # reading from sys.stdin
         data = sys.stdin.read()
-        return ujson.loads(data)
+        with suspend_gc():
+            return ujson.loads(data)
     file_path = force_path(path)
-    with file_path.open("r", encoding="utf8") as f:
+    with file_path.open("r", encoding="utf8") as f, suspend_gc():
         return ujson.load(f)
 
 
+@instrument("json", "read")
 def read_gzip_json(path: FilePath) -> JSONOutput:
     """Load JSON from a gzipped file.
 
@@ -61,40 +153,87 @@ def read_gzip_json(path: FilePath) -> JSONOutput:
     RETURNS (JSONOutput): The loaded JSON content.
     """
     file_path = force_string(path)
-    with gzip.open(file_path, "r") as f:
+    with gzip.open(file_path, "r") as f, suspend_gc():
         return ujson.load(f)
 
 
-def read_gzip_jsonl(path: FilePath, skip: bool = False) -> Iterator[JSONOutput]:
+@instrument("json", "read")
+def read_gzip_jsonl(
+    path: FilePath,
+    skip: bool = False,
+    intern_keys: bool = False,
+    intern_values: bool = False,
+    read_ahead: bool = False,
+    prefilter: Optional[PrefilterType] = None,
+    into: Optional[type] = None,
+    unknown: str = "ignore",
+    missing: str = "error",
+) -> Iterator[Any]:
     """Read a gzipped .jsonl file and yield contents line by line.
     Blank lines will always be skipped.
 
-    path (FilePath): The file path.
+    path (FilePath): The file path. "-" for reading from stdin.
     skip (bool): Skip broken lines and don't raise ValueError.
-    YIELDS (JSONOutput): The unpacked, deserialized Python objects.
+    intern_keys (bool): Share one string object between repeated dict keys
+        across all lines.
+    intern_values (bool): Share one string object between repeated short
+        string values of dicts across all lines. Like json_loads, interning parses with the
+        slower json module.
+    read_ahead (bool): Read and decompress upcoming chunks of the file on a
+        background thread while the current lines are parsed.
+    prefilter (Union[bytes, str, Pattern, Callable[[bytes], bool]]): Only
+        parse lines containing this substring, matching this regular
+        expression, or for which this function returns True. Other lines are
+        skipped without being parsed.
+    into (Optional[type]): A dataclass or namedtuple class to convert each
+        line into, e.g. one with __slots__ to keep many records in memory.
+    unknown (str): With into, what to do with keys that aren't fields of the
+        class: "ignore" them or raise an "error".
+    missing (str): With into, what to do with missing fields without a
+        default: raise an "error" or set them to "none".
+    YIELDS (Any): The unpacked, deserialized Python objects, or instances of
+        into.
     """
-    with gzip.open(force_path(path), "r") as f:
-        for line in _yield_json_lines(f, skip=skip):
+    convert = get_converter(into, unknown, missing) if into is not None else None
+    # gzip.open also accepts a file object
+    source = sys.stdin.buffer if path == "-" else force_path(path)
+    with gzip.open(source, "r") as f:
+        stream = read_ahead_lines(f) if read_ahead else f
+        for line in _yield_json_lines(
+            stream,
+            skip=skip,
+            intern_keys=intern_keys,
+            intern_values=intern_values,
+            prefilter=_get_prefilter(prefilter),
+            convert=convert,
+        ):
             yield line
 
 
-def write_json(path: FilePath, data: JSONInput, indent: int = 2) -> None:
+@instrument("json", "write")
+def write_json(
+    path: FilePath,
+    data: JSONInput,
+    indent: int = 2,
+    float_precision: Optional[int] = None,
+) -> None:
     """Create a .json file and dump contents or write to standard
     output.
 
     location (FilePath): The file path. "-" for writing to stdout.
     data (JSONInput): The JSON-serializable data to output.
     indent (int): Number of spaces used to indent JSON.
+    float_precision (int): Round numpy float values to this number of
+        decimals.
     """
-    json_data = json_dumps(data, indent=indent)
+    json_data = json_dumpb(data, indent=indent, float_precision=float_precision)
     if path == "-":  # writing to stdout
-        print(json_data)
-    else:
-        file_path = force_path(path, require_exists=False)
-        with file_path.open("w", encoding="utf8") as f:
-            f.write(json_data)
+        json_data += b"\n"
+    with open_binary(path, "wb") as f:
+        f.write(json_data)
 
 
+@instrument("json", "write")
 def write_gzip_json(path: FilePath, data: JSONInput, indent: int = 2) -> None:
     """Create a .json.gz file and dump contents.
 
@@ -102,12 +241,13 @@ def write_gzip_json(path: FilePath, data: JSONInput, indent: int = 2) -> None:
     data (JSONInput): The JSON-serializable data to output.
     indent (int): Number of spaces used to indent JSON.
     """
-    json_data = json_dumps(data, indent=indent)
+    json_data = json_dumpb(data, indent=indent)
     file_path = force_string(path)
     with gzip.open(file_path, "w") as f:
-        f.write(json_data.encode("utf-8"))
+        f.write(json_data)
 
 
+@instrument("json", "write", stream_arg="lines")
 def write_gzip_jsonl(
     path: FilePath,
     lines: Iterable[JSONInput],
@@ -128,33 +268,241 @@ def write_gzip_jsonl(
     file_path = force_path(path, require_exists=False)
     with gzip.open(file_path, mode=mode) as f:
         if append and append_new_line:
-            f.write("\n".encode("utf-8"))
-        f.writelines([(json_dumps(line) + "\n").encode("utf-8") for line in lines])
+            f.write(b"\n")
+        _write_json_lines(f, lines)
 
 
-def read_jsonl(path: FilePath, skip: bool = False) -> Iterable[JSONOutput]:
+@instrument("json", "read")
+def read_jsonl(
+    path: FilePath,
+    skip: bool = False,
+    intern_keys: bool = False,
+    intern_values: bool = False,
+    read_ahead: bool = False,
+    prefilter: Optional[PrefilterType] = None,
+    into: Optional[type] = None,
+    unknown: str = "ignore",
+    missing: str = "error",
+) -> Iterable[Any]:
     """Read a .jsonl file or standard input and yield contents line by line.
     Blank lines will always be skipped.
 
     path (FilePath): The file path. "-" for reading from stdin.
     skip (bool): Skip broken lines and don't raise ValueError.
-    YIELDS (JSONOutput): The loaded JSON contents of each line.
+    intern_keys (bool): Share one string object between repeated dict keys
+        across all lines.
+    intern_values (bool): Share one string object between repeated short
+        string values of dicts across all lines. Like json_loads, interning parses with the
+        slower json module.
+    read_ahead (bool): Read upcoming chunks of the file on a background
+        thread while the current lines are parsed.
+    prefilter (Union[bytes, str, Pattern, Callable[[bytes], bool]]): Only
+        parse lines containing this substring, matching this regular
+        expression, or for which this function returns True. Other lines are
+        skipped without being parsed.
+    into (Optional[type]): A dataclass or namedtuple class to convert each
+        line into, e.g. one with __slots__ to keep many records in memory.
+    unknown (str): With into, what to do with keys that aren't fields of the
+        class: "ignore" them or raise an "error".
+    missing (str): With into, what to do with missing fields without a
+        default: raise an "error" or set them to "none".
+    YIELDS (Any): The loaded JSON contents of each line, or instances of into.
     """
+    convert = get_converter(into, unknown, missing) if into is not None else None
+    line_filter = _get_prefilter(prefilter)
+    # Lines are checked by the prefilter as raw bytes
+    binary = read_ahead or line_filter is not None
     if path == "-":  # reading from sys.stdin
-        for line in _yield_json_lines(sys.stdin, skip=skip):
+        stream = sys.stdin.buffer if binary else sys.stdin
+        stream = read_ahead_lines(stream) if read_ahead else stream
+        # Don't wait for a batch of lines to be piped in
+        for line in _yield_json_lines(
+            stream,
+            skip=skip,
+            intern_keys=intern_keys,
+            intern_values=intern_values,
+            prefilter=line_filter,
+            convert=convert,
+            batch_size=1,
+        ):
             yield line
     else:
         file_path = force_path(path)
-        with file_path.open("r", encoding="utf8") as f:
-            for line in _yield_json_lines(f, skip=skip):
+        mode, encoding = ("rb", None) if binary else ("r", "utf8")
+        with file_path.open(mode, encoding=encoding) as f:
+            stream = read_ahead_lines(f) if read_ahead else f
+            for line in _yield_json_lines(
+                stream,
+                skip=skip,
+                intern_keys=intern_keys,
+                intern_values=intern_values,
+                prefilter=line_filter,
+                convert=convert,
+            ):
                 yield line
 
 
+def _count_rows(columns: Dict[str, Any]) -> int:
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+@instrument("json", "read", count_result=_count_rows)
+def read_jsonl_columns(
+    path: FilePath,
+    fields: Optional[Sequence[str]] = None,
+    dtypes: Optional[Dict[str, Any]] = None,
+    fill_values: Optional[Dict[str, Any]] = None,
+    skip: bool = False,
+    chunk_size: int = 10000,
+) -> Dict[str, Any]:
+    """Read a .jsonl file of flat records or standard input into one numpy
+    array per field. Lines are parsed in chunks and appended to growable typed
+    column buffers, so the full list of records is never held in memory.
+
+    path (FilePath): The file path. "-" for reading from stdin.
+    fields (Sequence[str]): The fields to load. Defaults to the keys of the
+        first record.
+    dtypes (Dict[str, Any]): numpy dtypes of the columns, keyed by field. The
+        dtype of other fields is inferred from the first values: numbers and
+        booleans become numeric arrays, strings, other values and booleans
+        mixed with numbers object arrays.
+    fill_values (Dict[str, Any]): Values to use for records missing a field or
+        with a null value, keyed by field. Defaults to NaN for float columns, "" for string
+        columns and None for object columns. Inferred int columns with missing
+        values become float columns and bool columns object columns. Missing
+        values in other columns with a dtype from dtypes raise a ValueError.
+    skip (bool): Skip broken lines and lines that aren't objects, and don't
+        raise ValueError.
+    chunk_size (int): Number of lines to parse at a time.
+    RETURNS (Dict[str, numpy.ndarray]): The columns, keyed by field.
+    """
+    # Crash with a clean ModuleNotFoundError if numpy is not available
+    import numpy  # noqa: F401
+
+    dtypes = dtypes or {}
+    fill_values = fill_values or {}
+    columns: Dict[str, _ColumnBuffer] = {}
+    records = read_jsonl(path, skip=skip)
+    line_no = 1
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+        if {type(record) for record in chunk} != {dict}:
+            chunk = _check_column_records(chunk, line_no, skip)
+        line_no += chunk_size
+        if not chunk:
+            continue
+        if fields is None:
+            fields = list(chunk[0])
+        for field in fields:
+            if field not in columns:
+                columns[field] = _ColumnBuffer(
+                    field, dtypes.get(field), fill_values.get(field, _NO_FILL)
+                )
+            columns[field].extend([record.get(field) for record in chunk])
+    if fields is None:
+        return {}
+    for field in fields:
+        if field not in columns:
+            columns[field] = _ColumnBuffer(
+                field, dtypes.get(field), fill_values.get(field, _NO_FILL)
+            )
+    return {field: columns[field].finish() for field in fields}
+
+
+def _check_column_records(
+    chunk: List[JSONOutput], line_no: int, skip: bool
+) -> List[Dict[str, Any]]:
+    """Remove the records of a chunk that aren't dicts if skip is True, or
+    raise a ValueError naming the first one's line."""
+    records = []
+    for i, record in enumerate(chunk):
+        if isinstance(record, dict):
+            records.append(record)
+        elif skip:
+            record_skip()
+        else:
+            raise ValueError(
+                f"Invalid record on line {line_no + i}: expected an object, "
+                f"got {type(record).__name__}"
+            )
+    return records
+
+
+@instrument("json", "read", count_result=len)
+def sample_jsonl(
+    path: FilePath,
+    k: int,
+    seed: Optional[int] = None,
+    skip: bool = False,
+    seek: bool = False,
+) -> List[JSONOutput]:
+    """Draw a random sample of k lines from a .jsonl file or standard input
+    in a single pass. Lines are sampled as raw bytes and only the selected
+    lines are parsed. Blank lines are ignored.
+
+    path (FilePath): The file path. "-" for reading from stdin.
+    k (int): Number of lines to sample. If the file has fewer lines, all
+        of them are returned.
+    seed (int): Seed for the random number generator.
+    skip (bool): Skip broken lines and don't raise ValueError. Broken lines
+        are sampled like any other line, so fewer than k records may be
+        returned.
+    seek (bool): Instead of scanning the file, seek to random byte offsets
+        and take the next line, wrapping around at the end. Much faster for
+        large files, but each line's chance of being selected is proportional
+        to the length of the line before it, so the sample is only uniform
+        for lines of similar length. Files that look like they have fewer
+        than 2 * k lines are scanned instead. Not available for standard
+        input.
+    RETURNS (List[JSONOutput]): The sampled records, in file order.
+    """
+    rng = random.Random(seed)
+    if path == "-":
+        if seek:
+            raise ValueError("Can't seek in standard input, use seek=False")
+        lines = reservoir_sample(filter(bytes.strip, sys.stdin.buffer), k, rng)
+    else:
+        file_path = force_path(path)
+        with file_path.open("rb") as f:
+            if seek:
+                lines = _seek_sample(f, file_path.stat().st_size, k, rng)
+            else:
+                lines = reservoir_sample(filter(bytes.strip, f), k, rng)
+    return list(_yield_json_lines(lines, skip=skip))
+
+
+@instrument("json", "read", count_result=len)
+def sample_gzip_jsonl(
+    path: FilePath, k: int, seed: Optional[int] = None, skip: bool = False
+) -> List[JSONOutput]:
+    """Draw a random sample of k lines from a gzipped .jsonl file in a single
+    pass. Lines are sampled as raw bytes and only the selected lines are
+    parsed. Blank lines are ignored.
+
+    path (FilePath): The file path.
+    k (int): Number of lines to sample. If the file has fewer lines, all
+        of them are returned.
+    seed (int): Seed for the random number generator.
+    skip (bool): Skip broken lines and don't raise ValueError. Broken lines
+        are sampled like any other line, so fewer than k records may be
+        returned.
+    RETURNS (List[JSONOutput]): The sampled records, in file order.
+    """
+    rng = random.Random(seed)
+    with gzip.open(force_path(path), "r") as f:
+        lines = reservoir_sample(filter(bytes.strip, f), k, rng)
+    return list(_yield_json_lines(lines, skip=skip))
+
+
+@instrument("json", "write", stream_arg="lines")
 def write_jsonl(
     path: FilePath,
     lines: Iterable[JSONInput],
     append: bool = False,
     append_new_line: bool = True,
+    float_precision: Optional[int] = None,
 ) -> None:
     """Create a .jsonl file and dump contents or write to standard output.
 
@@ -163,22 +511,19 @@ def write_jsonl(
     append (bool): Whether or not to append to the location.
     append_new_line (bool): Whether or not to write a new line before appending
         to the file.
+    float_precision (int): Round numpy float values to this number of
+        decimals.
     """
-    if path == "-":  # writing to stdout
-        for line in lines:
-            print(json_dumps(line))
-    else:
-        mode = "a" if append else "w"
-        file_path = force_path(path, require_exists=False)
-        with file_path.open(mode, encoding="utf-8") as f:
-            if append and append_new_line:
-                f.write("\n")
-            for line in lines:
-                f.write(json_dumps(line) + "\n")
+    mode = "ab" if append else "wb"
+    with open_binary(path, mode) as f:
+        if append and append_new_line and path != "-":
+            f.write(b"\n")
+        _write_json_lines(f, lines, float_precision=float_precision)
 
 
 def is_json_serializable(obj: Any) -> bool:
-    """Check if a Python object is JSON-serializable.
+    """Check if a Python object is JSON-serializable. To find out which value
+    isn't serializable, use find_json_unserializable.
 
     obj: The object to check.
     RETURNS (bool): Whether the object is JSON-serializable.
@@ -187,24 +532,352 @@ def is_json_serializable(obj: Any) -> bool:
         # Check this separately here to prevent infinite recursions
         return False
     try:
-        ujson.dumps(obj)
+        # ujson stops at the first value it can't serialize, and is faster
+        # than walking the object in Python
+        ujson.dumps(obj, default=encode_numpy_json)
         return True
     except (TypeError, OverflowError):
         return False
 
 
+def find_json_unserializable(obj: Any) -> Optional[Tuple[Hashable, ...]]:
+    """Find the first value of an object that isn't JSON-serializable. The
+    object is checked structurally, without serializing it, following the
+    same rules as json_dumps.
+
+    obj: The object to check.
+    RETURNS (Optional[Tuple[Hashable, ...]]): The keys and indices leading to
+        the value, an empty tuple if it's the object itself, or None if the
+        object is JSON-serializable.
+    """
+    return _json_checker.find(obj)
+
+
+def _classify_json_type(cls: type) -> Verdict:
+    """Get the verdict for values of a type, following the types supported
+    by ujson.dumps with the numpy support of json_dumps."""
+    if has_call(cls):
+        return FAIL
+    if cls is type(None) or issubclass(cls, (str, int, float, Decimal)):
+        return OK
+    if issubclass(cls, dict):
+        # ujson converts all keys to strings
+        return MAPPING
+    if issubclass(cls, (list, tuple)):
+        return SEQUENCE
+    if has_numpy and issubclass(cls, (numpy.ndarray, numpy.generic)):
+        return get_numpy_json_value
+    if has_cupy and issubclass(cls, cupy.ndarray):
+        return get_numpy_json_value
+    if hasattr(cls, "toDict"):
+        return lambda obj: obj.toDict()
+    if hasattr(cls, "__json__"):
+        return OK
+    return FAIL
+
+
+# ujson fails for containers nested more than 1025 levels deep
+_json_checker = StructuralChecker(_classify_json_type, max_depth=1025)
+
+
+def _get_prefilter(
+    prefilter: Optional[PrefilterType],
+) -> Optional[Callable[[bytes], bool]]:
+    """Get a function checking raw bytes lines for a prefilter value. A str
+    substring is searched for in its UTF-8 encoded form, which finds the same
+    lines as searching the decoded text."""
+    if (
+        prefilter is None
+        or callable(prefilter)
+        and not isinstance(prefilter, re.Pattern)
+    ):
+        return prefilter
+    if isinstance(prefilter, str):
+        prefilter = prefilter.encode("utf8")
+    if isinstance(prefilter, bytes):
+        substring = prefilter
+        return lambda line: substring in line
+    if isinstance(prefilter, re.Pattern):
+        search = prefilter.search
+        if isinstance(prefilter.pattern, str):
+            # Match str patterns against the decoded line, so classes like \w
+            # and case-insensitive matching work as they do for text
+            return lambda line: search(line.decode("utf8", "replace")) is not None
+        return lambda line: search(line) is not None
+    raise TypeError(
+        f"Invalid prefilter: {prefilter!r}. Expected bytes, str, a compiled "
+        f"regular expression or a callable."
+    )
+
+
+def _seek_sample(f: IO[bytes], size: int, k: int, rng: random.Random) -> List[bytes]:
+    """Sample k distinct non-blank lines of a binary file by seeking to
+    random offsets and taking the line starting after each offset. If the
+    start of the file suggests it has fewer than twice as many lines as k,
+    the whole file is scanned with reservoir_sample instead.
+    """
+    head = f.read(SEEK_SAMPLE_PROBE_SIZE)
+    n_lines = size * max(head.count(b"\n"), 1) / max(len(head), 1)
+    if len(head) >= size or n_lines < 2 * k:
+        f.seek(0)
+        return reservoir_sample(filter(bytes.strip, f), k, rng)
+    sampled: Dict[int, bytes] = {}
+    # Give up on finding distinct lines after a number of attempts, e.g. if
+    # the line count was overestimated
+    attempts = 0
+    while len(sampled) < k and attempts < 10 * k + 100 and size:
+        attempts += 1
+        f.seek(rng.randrange(size))
+        f.readline()  # skip to the start of the next line
+        start = f.tell()
+        line = f.readline()
+        if not line:  # wrap around to the first line
+            start = 0
+            f.seek(0)
+            line = f.readline()
+        if start not in sampled and line.strip():
+            sampled[start] = line
+    return [sampled[start] for start in sorted(sampled)]
+
+
+def _write_json_lines(
+    f: IO[bytes], lines: Iterable[JSONInput], float_precision: Optional[int] = None
+) -> None:
+    """Serialize lines and write them to a binary stream in batches, so each
+    batch is encoded and written at once."""
+    default = get_json_default(float_precision)
+    lines = iter(lines)
+    while True:
+        batch = [
+            ujson.dumps(line, indent=0, escape_forward_slashes=False, default=default)
+            for line in itertools.islice(lines, JSONL_BATCH_SIZE)
+        ]
+        if not batch:
+            break
+        batch.append("")
+        f.write("\n".join(batch).encode("utf8"))
+
+
 def _yield_json_lines(
-    stream: Iterable[str], skip: bool = False
-) -> Iterable[JSONOutput]:
+    stream: Iterable[str],
+    skip: bool = False,
+    intern_keys: bool = False,
+    intern_values: bool = False,
+    prefilter: Optional[Callable[[bytes], bool]] = None,
+    convert: Optional[Callable[[Any], Any]] = None,
+    batch_size: int = JSONL_BATCH_SIZE,
+) -> Iterable[Any]:
+    """Parse the lines of a stream in batches, with the garbage collector
+    suspended while a batch is parsed and converted, but not while it's
+    consumed.
+    """
+    loads = ujson.loads
+    if intern_keys or intern_values:
+        # One table of strings for all lines
+        loads = _get_interning_loads(intern_keys, intern_values)
     line_no = 1
-    for line in stream:
-        line = line.strip()
-        if line == "":
-            continue
-        try:
-            yield ujson.loads(line)
-        except ValueError:
-            if skip:
-                continue
-            raise ValueError(f"Invalid JSON on line {line_no}: {line}")
-        line_no += 1
+    lines = iter(stream)
+    while True:
+        batch = []
+        error = None
+        n_lines = 0
+        with suspend_gc():
+            for line in itertools.islice(lines, batch_size):
+                n_lines += 1
+                line = line.strip()
+                if not line:
+                    continue
+                if prefilter is not None and not prefilter(line):
+                    continue
+                try:
+                    data = loads(line)
+                except ValueError:
+                    if skip:
+                        record_skip()
+                        continue
+                    error = ValueError(f"Invalid JSON on line {line_no}: {line}")
+                    break
+                if convert is not None:
+                    try:
+                        data = convert(data)
+                    except ValueError as e:
+                        if skip:
+                            record_skip()
+                            continue
+                        error = ValueError(f"Invalid record on line {line_no}: {e}")
+                        break
+                batch.append(data)
+                line_no += 1
+        # Yield the lines before a broken one first
+        yield from batch
+        if error is not None:
+            raise error
+        if n_lines < batch_size:
+            break
+
+
+def _get_interning_loads(
+    intern_keys: bool, intern_values: bool
+) -> Callable[[Union[str, bytes]], Any]:
+    """Get a function parsing JSON that interns the strings of each dict
+    while it's decoded. ujson doesn't support hooks, so this uses the json
+    module's C decoder, which is 1.3-2.2x slower.
+    """
+    hook = StringInterner().pairs_hook(intern_keys, intern_values)
+    # Accept control characters in strings, like ujson
+    decode = _builtin_json.JSONDecoder(object_pairs_hook=hook, strict=False).decode
+
+    def loads(data: Union[str, bytes]) -> Any:
+        if type(data) is not str:
+            data = bytes(data).decode("utf8")
+        return decode(data)
+
+    return loads
+
+
+def _builtin_loads(data: Union[str, bytes]) -> Any:
+    if type(data) is not str:
+        data = bytes(data).decode("utf8")
+    return _BUILTIN_DECODER.decode(data)
+
+
+_BUILTIN_DECODER = _builtin_json.JSONDecoder(strict=False)
+
+
+_NO_FILL = object()
+
+
+class _ColumnBuffer:
+    """Growable typed buffer for a single column of read_jsonl_columns."""
+
+    def __init__(self, name: str, dtype: Any = None, fill_value: Any = _NO_FILL):
+        import numpy
+
+        self.name = name
+        self.dtype = numpy.dtype(dtype) if dtype is not None else None
+        self.inferred = dtype is None
+        self.fill_value = fill_value
+        self.size = 0
+        # Values of string and object columns are collected in a list
+        self.values: Optional[List[Any]] = None
+        self.data: Any = None
+        # Number of leading missing values seen before the dtype is known
+        self.n_pending = 0
+        if self.dtype is not None:
+            self._init_storage()
+
+    def _init_storage(self) -> None:
+        import numpy
+
+        if self.dtype.kind in "OUS":
+            self.values = []
+        else:
+            self.data = numpy.empty(1024, dtype=self.dtype)
+        if self.n_pending:
+            n_pending = self.n_pending
+            self.n_pending = 0
+            self.extend([None] * n_pending)
+
+    def _fill(self) -> Any:
+        if self.fill_value is not _NO_FILL:
+            return self.fill_value
+        if self.dtype.kind == "f":
+            return float("nan")
+        elif self.dtype.kind in "US":
+            return ""
+        elif self.dtype.kind == "O":
+            return None
+        raise ValueError(
+            f"Missing value for field '{self.name}' with dtype {self.dtype}. "
+            f"Use fill_values to set a default."
+        )
+
+    def extend(self, values: List[Any]) -> None:
+        """Append a chunk of values. Missing values are None."""
+        import numpy
+
+        if self.dtype is None:
+            dtype = _infer_dtype(values)
+            if dtype is None:
+                self.n_pending += len(values)
+                return
+            self.dtype = numpy.dtype(dtype)
+            self._init_storage()
+        if None in values:
+            if self.inferred and self.fill_value is _NO_FILL:
+                # Missing values can't be stored in int and bool columns, so
+                # they're widened no matter which chunk the value is missing in
+                if self.dtype.kind in "iu":
+                    self._promote(numpy.dtype("float64"))
+                elif self.dtype.kind == "b":
+                    self._promote(numpy.dtype("O"))
+            fill = self._fill()
+            values = [fill if value is None else value for value in values]
+        if self.inferred and self.values is None:
+            dtype = _infer_dtype(values)
+            if dtype is not None and dtype != self.dtype:
+                self._promote(numpy.dtype(dtype))
+        if self.values is not None:
+            self.values.extend(values)
+            self.size += len(values)
+            return
+        array = numpy.asarray(values, dtype=self.dtype)
+        end = self.size + len(array)
+        if end > len(self.data):
+            new_data = numpy.empty(max(end, len(self.data) * 2), dtype=self.dtype)
+            new_data[: self.size] = self.data[: self.size]
+            self.data = new_data
+        self.data[self.size : end] = array
+        self.size = end
+
+    def _promote(self, dtype: Any) -> None:
+        """Widen the dtype of an inferred column, e.g. from int to float, or
+        fall back to an object column for mixed values."""
+        import numpy
+
+        if dtype.kind in "iuf" and self.dtype.kind in "iuf":
+            new_dtype = numpy.result_type(self.dtype, dtype)
+        elif dtype.kind == "b" and self.dtype.kind == "b":
+            new_dtype = dtype
+        else:
+            new_dtype = numpy.dtype("O")
+        if new_dtype == self.dtype:
+            return
+        self.dtype = new_dtype
+        if new_dtype.kind == "O":
+            self.values = self.data[: self.size].tolist()
+            self.data = None
+        else:
+            self.data = self.data.astype(new_dtype)
+
+    def finish(self) -> Any:
+        import numpy
+
+        if self.dtype is None:
+            # All values are missing
+            self.dtype = numpy.dtype("float64")
+            self._init_storage()
+        if self.values is not None:
+            if self.dtype.kind == "O":
+                array = numpy.empty(len(self.values), dtype=self.dtype)
+                array[:] = self.values
+                return array
+            return numpy.array(self.values, dtype=self.dtype)
+        self.data.resize((self.size,), refcheck=False)
+        return self.data
+
+
+def _infer_dtype(values: List[Any]) -> Optional[str]:
+    """Infer the column dtype of a chunk of values, ignoring missing values.
+    Returns None if all values are missing."""
+    types = {type(value) for value in values}
+    types.discard(type(None))
+    if not types:
+        return None
+    elif types == {bool}:
+        return "bool"
+    elif types == {int}:
+        return "int64"
+    elif types <= {int, float}:
+        return "float64"
+    return "O"
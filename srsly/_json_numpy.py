@@ -0,0 +1,79 @@
+"""
+Support for serialization of numpy data types with ujson. Arrays are converted
+with ndarray.tolist(). This still creates a Python object per element, but in a
+single C loop, which is faster than formatting the values with numpy.
+"""
+
+from typing import Any, Callable, Optional
+
+from ._serializable import UNSERIALIZABLE
+
+try:
+    import numpy as np
+
+    has_numpy = True
+except ImportError:
+    has_numpy = False
+
+try:
+    import cupy
+
+    has_cupy = True
+except ImportError:
+    has_cupy = False
+
+
+def get_json_default(float_precision: Optional[int] = None) -> Callable[[Any], Any]:
+    """Get a `default` function for ujson.dumps and json.dumps that converts
+    numpy arrays and scalars.
+
+    float_precision (int): Round numpy float values to this number of
+        decimals.
+    RETURNS (Callable[[Any], Any]): The default function.
+    """
+    if float_precision is None:
+        return encode_numpy_json
+
+    def default(obj):
+        return encode_numpy_json(obj, float_precision=float_precision)
+
+    return default
+
+
+def encode_numpy_json(obj: Any, float_precision: Optional[int] = None) -> Any:
+    """
+    Convert a numpy array or scalar to JSON-serializable Python objects. Raises
+    a TypeError for other objects, like ujson.dumps does.
+    """
+    if has_numpy:
+        if has_cupy and isinstance(obj, cupy.ndarray):
+            obj = obj.get()
+        if isinstance(obj, (np.ndarray, np.generic)):
+            kind = obj.dtype.kind
+            if kind == "f":
+                # float16/float32 values are widened exactly to float64
+                values = obj.astype(np.float64, copy=False)
+                if float_precision is not None:
+                    values = values.round(float_precision)
+                return values.tolist()
+            # Values of object arrays are passed to the default function
+            # again if needed
+            if kind in "biuU" or (kind == "O" and obj.ndim):
+                return obj.tolist()
+    raise TypeError(f"{obj!r} is not JSON serializable")
+
+
+def get_numpy_json_value(obj: Any) -> Any:
+    """Get the value to check instead of a numpy array or scalar when checking
+    if data is JSON-serializable: None if it's converted to numbers or
+    strings, the list of values of object arrays, and UNSERIALIZABLE if it's
+    not supported.
+    """
+    if has_cupy and isinstance(obj, cupy.ndarray):
+        obj = obj.get()
+    kind = obj.dtype.kind
+    if kind in "fbiuU":
+        return None
+    if kind == "O" and obj.ndim:
+        return obj.ravel().tolist()
+    return UNSERIALIZABLE
@@ -1,10 +1,74 @@
-import gc
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Union
+import itertools
+import os
+import struct
+import threading
+import time
 from contextlib import contextmanager
 
 import msgpack
 
-from .util import force_path, FilePath, JSONInputBin, JSONOutputBin
-from ._msgpack_numpy import encode_numpy, decode_numpy
+from .util import force_path, open_binary, FilePath, JSONInputBin, JSONOutputBin
+from .util import StringInterner, suspend_gc, GC_SUSPEND_MIN_SIZE
+from ._instrumentation import instrument
+from ._convert import get_converter
+from ._msgpack_numpy import encode_numpy, decode_numpy, get_numpy_header
+from ._msgpack_numpy import get_numpy_order, iter_numpy_chunks, count_numpy_chunks
+from ._msgpack_numpy import has_numpy
+from . import _msgpack_numpy
+from ._msgpack_records import pack_records as _pack_records
+
+if has_numpy:
+    import numpy
+
+# Number of objects converted at a time by iter_msgpack while the collector is
+# suspended
+CONVERT_BATCH_SIZE = 1000
+# Extension type of the placeholders of chunked arrays in write_msgpack
+_PLACEHOLDER_CODE = 127
+
+
+class ExtensionStats:
+    """Call statistics of a single registered msgpack encoder/decoder.
+
+    calls (int): Number of times the function was called.
+    hits (int): Number of times it returned a new object.
+    time (float): Cumulative time in seconds spent in the function.
+    """
+
+    __slots__ = ("calls", "hits", "time")
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.time = 0.0
+
+    def __repr__(self):
+        return f"ExtensionStats(calls={self.calls}, hits={self.hits}, time={self.time})"
+
+
+class ExtensionProfile:
+    """Statistics collected while profiling msgpack encoders/decoders, keyed by
+    the registered name.
+    """
+
+    def __init__(self):
+        self.stats: Dict[str, ExtensionStats] = {}
+
+    def to_dict(self) -> Dict[str, Dict[str, Union[int, float]]]:
+        """RETURNS (dict): The statistics as plain dicts, keyed by name."""
+        return {
+            name: {"calls": s.calls, "hits": s.hits, "time": s.time}
+            for name, s in self.stats.items()
+        }
+
+    def report(self) -> str:
+        """RETURNS (str): A table of the statistics, slowest function first."""
+        rows = [f"{'name':<24} {'calls':>12} {'hits':>12} {'time (s)':>12}"]
+        by_time = sorted(self.stats.items(), key=lambda item: -item[1].time)
+        for name, s in by_time:
+            rows.append(f"{name:<24} {s.calls:>12} {s.hits:>12} {s.time:>12.6f}")
+        return "\n".join(rows)
 
 
 class _MsgpackExtensions:
@@ -22,30 +86,112 @@ class _MsgpackExtensions:
     - For decoders, the argument is the dict to deserialize, as returned by the encoders.
       The callable should return a new object or the original dict if the callback
       does not recognize it.
+
+    Types can also be packed as msgpack extension types, with one function per
+    type or extension code instead of a chain of checks:
+
+        srsly.msgpack_encoders.register_type(name, cls, func)
+        srsly.msgpack_decoders.register_ext(name, code, func)
+
+    The encoder is called with objects of exactly the type `cls` before any
+    other encoder and should return e.g. a msgpack.ExtType. The decoder is
+    called with the data bytes of extension types with the given code.
+    Extension types without a decoder are returned as msgpack.ExtType.
+    msgpack timestamps (extension type -1) are unpacked by msgpack itself, as
+    datetimes in UTC after srsly.msgpack_decoders.register_timestamps(name).
+
+    To find out which functions are slow, profile them while (de)serializing:
+
+        with srsly.msgpack_decoders.profile() as prof:
+            srsly.read_msgpack(path)
+        print(prof.report())
     """
 
-    __slots__ = ("_ext",)
+    __slots__ = ("_ext", "_profile")
 
     def __init__(self):
         self._ext = {}
+        self._profile = None
 
     def register(self, name, func):
         """Register a custom encoder/decoder function"""
         self._ext[name] = func
 
     def deregister(self, name):
+        """Remove the functions registered under a name"""
         del self._ext[name]
 
+    @contextmanager
+    def profile(self) -> Iterator[ExtensionProfile]:
+        """Record call counts, hit counts and cumulative time of every
+        registered function for the duration of the block.
+
+        YIELDS (ExtensionProfile): The collected statistics.
+        """
+        prev_profile = self._profile
+        profile = ExtensionProfile()
+        self._profile = profile
+        try:
+            yield profile
+        finally:
+            self._profile = prev_profile
+
     def _run(self, obj):
+        if self._profile is not None:
+            return self._run_profiled(obj)
         for func in self._ext.values():
             out = func(obj)
             if out is not obj:
                 return out
         return obj
 
+    def _run_profiled(self, obj):
+        for name, func in self._ext.items():
+            out = self._call_profiled(name, func, obj)
+            if out is not obj:
+                return out
+        return obj
+
+    def _call_profiled(self, name, func, obj):
+        stats = self._profile.stats
+        if name not in stats:
+            stats[name] = ExtensionStats()
+        start = time.perf_counter()
+        out = func(obj)
+        func_stats = stats[name]
+        func_stats.time += time.perf_counter() - start
+        func_stats.calls += 1
+        if out is not obj:
+            func_stats.hits += 1
+        return out
+
 
 class _MsgpackEncoderExtensions(_MsgpackExtensions):
+    __slots__ = ("_types",)
+
+    def __init__(self):
+        super().__init__()
+        # (name, func) by type
+        self._types = {}
+
+    def register_type(self, name, cls, func):
+        """Register an encoder for objects of exactly the type cls"""
+        self._types[cls] = (name, func)
+
+    def deregister(self, name):
+        """Remove the functions registered under a name"""
+        types = [cls for cls, (n, _) in self._types.items() if n == name]
+        for cls in types:
+            del self._types[cls]
+        if name in self._ext or not types:
+            super().deregister(name)
+
     def _run(self, obj):
+        entry = self._types.get(type(obj))
+        if entry is not None:
+            if self._profile is not None:
+                return self._call_profiled(*entry, obj)
+            return entry[1](obj)
         out = super()._run(obj)
         if out is not obj:
             return out
@@ -66,8 +212,56 @@ class _MsgpackEncoderExtensions(_MsgpackExtensions):
         return obj
 
 
+def _ext_type(code: int, data: bytes) -> msgpack.ExtType:
+    """Create a msgpack.ExtType without validating its arguments in Python,
+    which costs more than packing it. The arguments must be valid."""
+    return tuple.__new__(msgpack.ExtType, (code, data))
+
+
+class _MsgpackDecoderExtensions(_MsgpackExtensions):
+    __slots__ = ("_codes", "_timestamp", "_timestamp_name")
+
+    def __init__(self):
+        super().__init__()
+        # (name, func) by extension type code
+        self._codes = {}
+        # The timestamp option of msgpack's unpacker
+        self._timestamp = 0
+        self._timestamp_name = None
+
+    def register_ext(self, name, code, func):
+        """Register a decoder for the data of extension types with a code"""
+        self._codes[code] = (name, func)
+
+    def register_timestamps(self, name):
+        """Unpack msgpack timestamps (extension type -1), which msgpack decodes
+        itself, as datetimes in UTC instead of msgpack.Timestamp objects"""
+        self._timestamp = 3
+        self._timestamp_name = name
+
+    def deregister(self, name):
+        """Remove the functions registered under a name"""
+        codes = [code for code, (n, _) in self._codes.items() if n == name]
+        for code in codes:
+            del self._codes[code]
+        timestamps = self._timestamp_name == name
+        if timestamps:
+            self._timestamp = 0
+            self._timestamp_name = None
+        if name in self._ext or not (codes or timestamps):
+            super().deregister(name)
+
+    def _run_ext(self, code, data):
+        entry = self._codes.get(code)
+        if entry is None:
+            return msgpack.ExtType(code, data)
+        if self._profile is not None:
+            return self._call_profiled(*entry, data)
+        return entry[1](data)
+
+
 msgpack_encoders = _MsgpackEncoderExtensions()
-msgpack_decoders = _MsgpackExtensions()
+msgpack_decoders = _MsgpackDecoderExtensions()
 
 
 def encode_complex(obj):
@@ -90,22 +284,18 @@ msgpack_encoders.register("complex", func=encode_complex)
 msgpack_decoders.register("complex", func=decode_complex)
 
 
-@contextmanager
-def _without_gc():
-    """msgpack-python docs suggest disabling gc before unpacking large messages"""
-    gc.disable()
-    try:
-        yield
-    finally:
-        gc.enable()
-
-
-def msgpack_dumps(data: JSONInputBin) -> bytes:
+@instrument("msgpack", "dumps")
+def msgpack_dumps(data: JSONInputBin, pack_records: bool = False) -> bytes:
     """Serialize an object to a msgpack byte string.
 
     data: The data to serialize.
+    pack_records (bool): Store lists of dicts with identical keys as a key
+        table followed by positional value arrays. Makes the output smaller and
+        faster to load for tabular data, but slower to write.
     RETURNS (bytes): The serialized bytes.
     """
+    if pack_records:
+        data = _pack_records(data)
     return msgpack.dumps(
         data,
         # strict_types is False for everything except np.float64
@@ -115,41 +305,336 @@ def msgpack_dumps(data: JSONInputBin) -> bytes:
     )
 
 
-def msgpack_loads(data: bytes, use_list: bool = True) -> JSONOutputBin:
+@instrument("msgpack", "loads")
+def msgpack_loads(
+    data: bytes,
+    use_list: bool = True,
+    intern_keys: bool = False,
+    intern_values: bool = False,
+) -> JSONOutputBin:
     """Deserialize msgpack bytes to a Python object.
 
     data (bytes): The data to deserialize.
     use_list (bool): Don't use tuples instead of lists. Can make
         deserialization slower.
+    intern_keys (bool): Share one string object between repeated map keys.
+    intern_values (bool): Share one string object between repeated short
+        string values in maps.
     RETURNS: The deserialized Python object.
     """
-    with _without_gc():
+    # msgpack-python docs suggest disabling gc before unpacking large messages
+    with suspend_gc():
         return msgpack.loads(
-            data, raw=False, use_list=use_list, object_hook=msgpack_decoders._run
+            data, **_unpack_kwargs(use_list, intern_keys, intern_values)
         )
 
 
-def write_msgpack(path: FilePath, data: JSONInputBin) -> None:
+@instrument("msgpack", "write")
+def write_msgpack(
+    path: FilePath, data: JSONInputBin, pack_records: bool = False
+) -> None:
     """Create a msgpack file and dump contents.
 
     location (FilePath): The file path.
     data (JSONInputBin): The data to serialize.
+    pack_records (bool): Store lists of dicts with identical keys as a key
+        table followed by positional value arrays. Makes the output smaller and
+        faster to load for tabular data, but slower to write.
     """
+    if pack_records:
+        data = _pack_records(data)
     file_path = force_path(path, require_exists=False)
     with file_path.open("wb") as f:
-        msgpack.dump(data, f, strict_types=True, default=msgpack_encoders._run)
+        _dump_chunked(data, f)
 
 
-def read_msgpack(path: FilePath, use_list: bool = True) -> JSONOutputBin:
+@instrument("msgpack", "read")
+def read_msgpack(
+    path: FilePath,
+    use_list: bool = True,
+    intern_keys: bool = False,
+    intern_values: bool = False,
+) -> JSONOutputBin:
     """Load a msgpack file.
 
     location (FilePath): The file path.
     use_list (bool): Don't use tuples instead of lists. Can make
         deserialization slower.
+    intern_keys (bool): Share one string object between repeated map keys.
+    intern_values (bool): Share one string object between repeated short
+        string values in maps.
     RETURNS (JSONOutputBin): The loaded and deserialized content.
     """
     file_path = force_path(path)
-    with file_path.open("rb") as f, _without_gc():
-        return msgpack.load(
-            f, raw=False, use_list=use_list, object_hook=msgpack_decoders._run
+    with file_path.open("rb") as f, suspend_gc():
+        return msgpack.load(f, **_unpack_kwargs(use_list, intern_keys, intern_values))
+
+
+@instrument("msgpack", "write", stream_arg="data")
+def write_msgpack_stream(
+    path: FilePath,
+    data: Iterable[JSONInputBin],
+    compress: bool = False,
+    append: bool = False,
+) -> None:
+    """Create a msgpack file and dump a sequence of objects into it one after
+    another, or write them to standard output. The records can be read back
+    lazily with iter_msgpack.
+
+    path (FilePath): The file path. "-" for writing to stdout.
+    data (Iterable[JSONInputBin]): The objects to serialize.
+    compress (bool): Compress the output with gzip.
+    append (bool): Whether or not to append to the location.
+    """
+    mode = "ab" if append else "wb"
+    packer = msgpack.Packer(strict_types=True, default=msgpack_encoders._run)
+    with open_binary(path, mode, compress=compress) as f:
+        for obj in data:
+            f.write(packer.pack(obj))
+
+
+@instrument("msgpack", "read")
+def iter_msgpack(
+    path: FilePath,
+    compress: bool = False,
+    use_list: bool = True,
+    into: Optional[type] = None,
+    unknown: str = "ignore",
+    missing: str = "error",
+) -> Iterator[Any]:
+    """Read a msgpack file written with write_msgpack_stream or standard
+    input and yield the objects one by one.
+
+    path (FilePath): The file path. "-" for reading from stdin.
+    compress (bool): Whether the file is compressed with gzip.
+    use_list (bool): Don't use tuples instead of lists. Can make
+        deserialization slower.
+    into (Optional[type]): A dataclass or namedtuple class to convert each
+        object into, e.g. one with __slots__ to keep many records in memory.
+    unknown (str): With into, what to do with keys that aren't fields of the
+        class: "ignore" them or raise an "error".
+    missing (str): With into, what to do with missing fields without a
+        default: raise an "error" or set them to "none".
+    YIELDS (Any): The deserialized Python objects, or instances of into.
+    """
+    with open_binary(path, "rb", compress=compress) as f:
+        unpacker = msgpack.Unpacker(f, **_unpack_kwargs(use_list, False, False))
+        if into is None:
+            yield from unpacker
+        else:
+            convert = get_converter(into, unknown, missing)
+            # Don't wait for a batch of objects to be piped in
+            batch_size = 1 if path == "-" else CONVERT_BATCH_SIZE
+            yield from _convert_batches(unpacker, convert, batch_size)
+
+
+class MsgpackSerializer:
+    """Serializer with its own encoder and decoder registries, for hot paths
+    like RPC calls that serialize many small messages. The registries are
+    scoped to the serializer, so it only runs the hooks it needs, and each
+    thread reuses its own msgpack.Packer instead of setting up a new one for
+    every call. Without decoders, objects are unpacked without a hook.
+
+        serializer = MsgpackSerializer(encoders={}, decoders={})
+        msg = serializer.dumps({"method": "predict", "args": [1, 2, 3]})
+        batch = serializer.dumps_many(messages)
+        messages = serializer.loads_many(batch)
+
+    encoders (Dict[str, Callable]): Encoder functions, keyed by name. Defaults
+        to the functions registered in srsly.msgpack_encoders when the
+        serializer is created, including the ones registered by type. Use an
+        empty dict for no hooks.
+    decoders (Dict[str, Callable]): Decoder functions, keyed by name. Defaults
+        to the functions registered in srsly.msgpack_decoders, including the
+        ones registered by extension type code.
+    use_list (bool): Don't use tuples instead of lists. Can make
+        deserialization slower.
+    """
+
+    def __init__(
+        self,
+        encoders: Optional[Dict[str, Callable[[Any], Any]]] = None,
+        decoders: Optional[Dict[str, Callable[[Any], Any]]] = None,
+        use_list: bool = True,
+    ):
+        self.encoders = _MsgpackEncoderExtensions()
+        self.decoders = _MsgpackDecoderExtensions()
+        if encoders is None:
+            encoders = msgpack_encoders._ext
+            self.encoders._types.update(msgpack_encoders._types)
+        if decoders is None:
+            decoders = msgpack_decoders._ext
+            self.decoders._codes.update(msgpack_decoders._codes)
+            self.decoders._timestamp = msgpack_decoders._timestamp
+            self.decoders._timestamp_name = msgpack_decoders._timestamp_name
+        for name, func in encoders.items():
+            self.encoders.register(name, func)
+        for name, func in decoders.items():
+            self.decoders.register(name, func)
+        self.use_list = use_list
+        self._local = threading.local()
+
+    def dumps(self, data: JSONInputBin) -> bytes:
+        """Serialize an object to msgpack bytes.
+
+        data: The data to serialize.
+        RETURNS (bytes): The serialized bytes.
+        """
+        try:
+            packer = self._local.packer
+        except AttributeError:
+            packer = self._local.packer = self._make_packer(autoreset=True)
+        return packer.pack(data)
+
+    def dumps_many(self, data: Iterable[JSONInputBin]) -> bytes:
+        """Serialize a sequence of objects into one buffer, as a msgpack
+        array that can also be read with msgpack_loads. The objects are packed
+        one after another by the same packer, without building the list.
+
+        data (Iterable[JSONInputBin]): The objects to serialize.
+        RETURNS (bytes): The serialized bytes.
+        """
+        try:
+            packer = self._local.batch_packer
+        except AttributeError:
+            packer = self._local.batch_packer = self._make_packer(autoreset=False)
+        try:
+            n_objects = 0
+            for obj in data:
+                packer.pack(obj)
+                n_objects += 1
+            header = msgpack.Packer().pack_array_header(n_objects)
+            return b"".join((header, packer.getbuffer()))
+        finally:
+            packer.reset()
+
+    def loads(self, data: bytes) -> JSONOutputBin:
+        """Deserialize msgpack bytes to a Python object.
+
+        data (bytes): The data to deserialize.
+        RETURNS: The deserialized Python object.
+        """
+        # Skip the hooks if there's nothing to decode
+        hooks = {}
+        if self.decoders._ext:
+            hooks["object_hook"] = self.decoders._run
+        if self.decoders._codes:
+            hooks["ext_hook"] = self.decoders._run_ext
+        if self.decoders._timestamp:
+            hooks["timestamp"] = self.decoders._timestamp
+        if len(data) < GC_SUSPEND_MIN_SIZE:
+            return msgpack.unpackb(data, raw=False, use_list=self.use_list, **hooks)
+        with suspend_gc():
+            return msgpack.unpackb(data, raw=False, use_list=self.use_list, **hooks)
+
+    def loads_many(self, data: bytes) -> List[JSONOutputBin]:
+        """Deserialize a buffer written by dumps_many.
+
+        data (bytes): The data to deserialize.
+        RETURNS (List[JSONOutputBin]): The deserialized Python objects.
+        """
+        return list(self.loads(data))
+
+    def _make_packer(self, autoreset: bool) -> msgpack.Packer:
+        return msgpack.Packer(
+            strict_types=True, default=self.encoders._run, autoreset=autoreset
         )
+
+
+def _dump_chunked(data: JSONInputBin, f: IO[bytes]) -> None:
+    """Pack an object to a file. The data of numpy arrays larger than a chunk
+    is written to the file straight from the arrays, one chunk at a time,
+    instead of being copied into the packed bytes first. The arrays are
+    packed with a placeholder for their chunks, which is replaced by the
+    chunks when the bytes are written out.
+    """
+    arrays = []
+    token = os.urandom(8)
+    chunk_size = _msgpack_numpy.NUMPY_CHUNK_SIZE
+
+    def get_placeholder(i: int) -> msgpack.ExtType:
+        return msgpack.ExtType(_PLACEHOLDER_CODE, token + struct.pack("<Q", i))
+
+    def default(obj):
+        if (
+            has_numpy
+            and isinstance(obj, numpy.ndarray)
+            and obj.nbytes > chunk_size
+            and not obj.dtype.hasobject
+        ):
+            header = get_numpy_header(obj)
+            header[b"order"] = get_numpy_order(obj)
+            header[b"chunks"] = get_placeholder(len(arrays))
+            arrays.append(obj)
+            return header
+        return msgpack_encoders._run(obj)
+
+    packed = memoryview(msgpack.dumps(data, strict_types=True, default=default))
+    packer = msgpack.Packer()
+    start = 0
+    for i, arr in enumerate(arrays):
+        placeholder = packer.pack(get_placeholder(i))
+        end = packed.obj.index(placeholder, start)
+        f.write(packed[start:end])
+        f.write(packer.pack_array_header(count_numpy_chunks(arr, chunk_size)))
+        for chunk in iter_numpy_chunks(arr, chunk_size):
+            f.write(_pack_bin_header(len(chunk)))
+            f.write(chunk)
+        start = end + len(placeholder)
+    f.write(packed[start:])
+
+
+def _pack_bin_header(n_bytes: int) -> bytes:
+    if n_bytes < 2**8:
+        return struct.pack(">BB", 0xC4, n_bytes)
+    elif n_bytes < 2**16:
+        return struct.pack(">BH", 0xC5, n_bytes)
+    return struct.pack(">BI", 0xC6, n_bytes)
+
+
+def _convert_batches(
+    objs: Iterable[Any], convert: Callable[[Any], Any], batch_size: int
+) -> Iterator[Any]:
+    """Convert objects in batches, with the garbage collector suspended while
+    a batch is converted. Unlike dicts of atomic values, the converted objects
+    are tracked by the collector, which would otherwise run over and over.
+    """
+    objs = iter(objs)
+    while True:
+        batch = []
+        error = None
+        with suspend_gc():
+            for obj in itertools.islice(objs, batch_size):
+                try:
+                    batch.append(convert(obj))
+                except ValueError as e:
+                    error = e
+                    break
+        # Yield the objects before a broken one first
+        yield from batch
+        if error is not None:
+            raise error
+        if len(batch) < batch_size:
+            break
+
+
+def _unpack_kwargs(
+    use_list: bool, intern_keys: bool, intern_values: bool
+) -> Dict[str, Any]:
+    """Get the keyword arguments for msgpack.load and msgpack.loads."""
+    kwargs: Dict[str, Any] = {
+        "raw": False,
+        "use_list": use_list,
+        "ext_hook": msgpack_decoders._run_ext,
+        "timestamp": msgpack_decoders._timestamp,
+    }
+    if not intern_keys and not intern_values:
+        kwargs["object_hook"] = msgpack_decoders._run
+        return kwargs
+    make_dict = StringInterner().pairs_hook(intern_keys, intern_values)
+
+    def object_pairs_hook(pairs):
+        return msgpack_decoders._run(make_dict(pairs))
+
+    kwargs["object_pairs_hook"] = object_pairs_hook
+    return kwargs
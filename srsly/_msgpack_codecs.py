@@ -0,0 +1,156 @@
+"""
+Optional msgpack codecs for standard library types, which msgpack can't
+serialize by itself. They're not registered by default, so data that contains
+these types keeps failing loudly unless they're enabled:
+
+    srsly.register_msgpack_codecs()  # or e.g. ["datetime", "uuid"]
+
+Datetimes are packed as msgpack timestamps (extension type -1), which other
+msgpack implementations can read, too. Timestamps are points in time, so aware
+datetimes are converted to UTC and naive datetimes are taken to be in UTC.
+When the codec is registered, timestamps are unpacked as aware datetimes in
+UTC, also the ones that were naive.
+
+UUIDs and Decimals are packed as msgpack extension types, and decoded by
+their extension type code:
+
+    102  UUID             the 16 bytes of the UUID
+    103  Decimal          the string of the Decimal (ASCII), which keeps its
+                          exponent
+
+Sets and frozensets are packed as {b"set": [...]} and {b"frozenset": [...]}.
+"""
+
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+from decimal import Decimal
+import datetime
+import struct
+import uuid
+
+import msgpack
+
+from ._msgpack_api import msgpack_encoders, msgpack_decoders, _ext_type
+
+TIMESTAMP_CODE = -1
+UUID_CODE = 102
+DECIMAL_CODE = 103
+_EPOCH = datetime.datetime(1970, 1, 1)
+_TIMESTAMP32 = struct.Struct(">I")
+_TIMESTAMP64 = struct.Struct(">Q")
+_TIMESTAMP96 = struct.Struct(">Iq")
+
+
+def encode_datetime(obj: datetime.datetime) -> msgpack.ExtType:
+    offset = obj.utcoffset()
+    # Naive datetimes are taken to be in UTC
+    if offset is not None:
+        obj = obj.replace(tzinfo=None) - offset
+    return _ext_type(TIMESTAMP_CODE, _pack_timestamp(obj))
+
+
+def encode_uuid(obj: uuid.UUID) -> msgpack.ExtType:
+    return _ext_type(UUID_CODE, obj.bytes)
+
+
+def decode_uuid(data: bytes) -> uuid.UUID:
+    return uuid.UUID(bytes=data)
+
+
+def encode_decimal(obj: Decimal) -> msgpack.ExtType:
+    # The string keeps the exponent, e.g. "12.50", and is faster to convert
+    # both ways than the digits and exponent of the Decimal
+    return _ext_type(DECIMAL_CODE, str(obj).encode("ascii"))
+
+
+def decode_decimal(data: bytes) -> Decimal:
+    return Decimal(data.decode("ascii"))
+
+
+def encode_set(obj):
+    if isinstance(obj, frozenset):
+        return {b"frozenset": list(obj)}
+    return {b"set": list(obj)}
+
+
+def decode_set(obj):
+    if b"set" in obj:
+        return set(map(_to_hashable, obj[b"set"]))
+    if b"frozenset" in obj:
+        return frozenset(map(_to_hashable, obj[b"frozenset"]))
+    return obj
+
+
+class MsgpackCodec(NamedTuple):
+    """The functions of an optional msgpack codec.
+
+    types (Tuple[type, ...]): The types encoded by the codec, which have to
+        match exactly.
+    encode (Callable): Encoder for objects of these types.
+    ext_decoders (Dict[int, Callable]): Decoders for the data of extension
+        types, by code.
+    decode (Optional[Callable]): Decoder for dicts returned by the encoder.
+    timestamps (bool): Unpack msgpack timestamps as datetimes.
+    """
+
+    types: Tuple[type, ...]
+    encode: Callable[[Any], Any]
+    ext_decoders: Dict[int, Callable[[bytes], Any]]
+    decode: Optional[Callable[[Any], Any]] = None
+    timestamps: bool = False
+
+
+MSGPACK_CODECS: Dict[str, MsgpackCodec] = {
+    "datetime": MsgpackCodec(
+        (datetime.datetime,), encode_datetime, {}, timestamps=True
+    ),
+    "uuid": MsgpackCodec((uuid.UUID,), encode_uuid, {UUID_CODE: decode_uuid}),
+    "decimal": MsgpackCodec((Decimal,), encode_decimal, {DECIMAL_CODE: decode_decimal}),
+    "set": MsgpackCodec((set, frozenset), encode_set, {}, decode_set),
+}
+
+
+def register_msgpack_codecs(names: Optional[Iterable[str]] = None) -> None:
+    """Register optional codecs for datetimes, UUIDs, Decimals and sets with
+    srsly.msgpack_encoders and srsly.msgpack_decoders, under their names. They
+    can be removed again with deregister(name).
+
+    Objects are passed to the encoder of their exact type and extension types
+    to the decoder of their code, so the codecs don't add checks for the
+    other objects and dicts. Subclasses of these types aren't encoded.
+
+    names (Optional[Iterable[str]]): The codecs to register: "datetime",
+        "uuid", "decimal" and/or "set". Defaults to all of them.
+    """
+    names = list(MSGPACK_CODECS) if names is None else list(names)
+    for name in names:
+        if name not in MSGPACK_CODECS:
+            raise ValueError(f"Unknown msgpack codec: {name}. {list(MSGPACK_CODECS)}")
+    for name in names:
+        codec = MSGPACK_CODECS[name]
+        for cls in codec.types:
+            msgpack_encoders.register_type(name, cls, codec.encode)
+        for code, decode in codec.ext_decoders.items():
+            msgpack_decoders.register_ext(name, code, decode)
+        if codec.decode is not None:
+            msgpack_decoders.register(name, func=codec.decode)
+        if codec.timestamps:
+            msgpack_decoders.register_timestamps(name)
+
+
+def _pack_timestamp(dt: datetime.datetime) -> bytes:
+    """Pack a naive datetime in UTC in the smallest msgpack timestamp format."""
+    delta = dt - _EPOCH
+    seconds = delta.days * 86400 + delta.seconds
+    nanoseconds = delta.microseconds * 1000
+    if seconds >> 34 == 0:
+        if nanoseconds == 0 and seconds >> 32 == 0:
+            return _TIMESTAMP32.pack(seconds)
+        return _TIMESTAMP64.pack(nanoseconds << 34 | seconds)
+    return _TIMESTAMP96.pack(nanoseconds, seconds)
+
+
+def _to_hashable(obj: Any) -> Any:
+    """Turn lists back into tuples, so they can be items of a set."""
+    if type(obj) is list:
+        return tuple(map(_to_hashable, obj))
+    return obj
@@ -21,6 +21,14 @@ try:
 except ImportError:
     has_cupy = False
 
+from ._ragged import RaggedArray
+from ._msgpack_records import decode_records
+
+# Size of the chunks of arrays that are encoded in chunks
+NUMPY_CHUNK_SIZE = 2**26
+# Largest msgpack bin
+MAX_BIN_SIZE = 2**32 - 1
+
 
 def encode_numpy(obj):
     """
@@ -31,32 +39,131 @@ def encode_numpy(obj):
     if has_cupy and isinstance(obj, cupy.ndarray):
         obj = obj.get()
     if isinstance(obj, np.ndarray):
-        # If the dtype is structured, store the interface description;
-        # otherwise, store the corresponding array protocol type string:
-        if obj.dtype.kind == "V":
-            kind = b"V"
-            descr = obj.dtype.descr
+        header = get_numpy_header(obj)
+        if obj.flags["C_CONTIGUOUS"] and obj.nbytes <= MAX_BIN_SIZE:
+            header[b"data"] = obj.data
+        elif obj.nbytes <= NUMPY_CHUNK_SIZE or obj.dtype.hasobject:
+            # Same layout as older versions, which can't read chunks
+            header[b"data"] = obj.tobytes()
         else:
-            kind = b""
-            descr = obj.dtype.str
-        return {
-            b"nd": True,
-            b"type": descr,
-            b"kind": kind,
-            b"shape": obj.shape,
-            b"data": obj.data if obj.flags["C_CONTIGUOUS"] else obj.tobytes(),
-        }
+            # Large Fortran-ordered, strided and huge arrays
+            header[b"order"] = get_numpy_order(obj)
+            header[b"chunks"] = list(iter_numpy_chunks(obj, NUMPY_CHUNK_SIZE))
+        return header
     if isinstance(obj, (np.bool_, np.number)):
         return {b"nd": False, b"type": obj.dtype.str, b"data": obj.data}
-
+    # Checked last, as instance checks of Sequence subclasses are slower
+    if isinstance(obj, RaggedArray):
+        # The arrays are encoded by this function, too
+        return {b"ragged": True, b"data": obj.data, b"offsets": obj.offsets}
     return obj
 
 
+def get_numpy_header(arr):
+    """
+    Get the metadata of an array that's needed to restore it from its data.
+    """
+    # If the dtype is structured, store the interface description;
+    # otherwise, store the corresponding array protocol type string:
+    if arr.dtype.kind == "V":
+        kind = b"V"
+        descr = arr.dtype.descr
+    else:
+        kind = b""
+        descr = arr.dtype.str
+    return {b"nd": True, b"type": descr, b"kind": kind, b"shape": arr.shape}
+
+
+def get_numpy_order(arr):
+    """
+    Get the order the data of an array is encoded in. Fortran-ordered arrays
+    keep their order, so their data doesn't have to be copied.
+    """
+    if arr.flags["F_CONTIGUOUS"] and not arr.flags["C_CONTIGUOUS"]:
+        return b"F"
+    return b"C"
+
+
+def iter_numpy_chunks(arr, chunk_size):
+    """
+    Yield the data of an array as contiguous chunks of at most chunk_size
+    bytes, in the order given by get_numpy_order. The chunks of contiguous
+    arrays are views of their data, while the chunks of other arrays are
+    copied one at a time.
+    """
+    if get_numpy_order(arr) == b"F":
+        data = arr.reshape(-1, order="F").view(np.uint8)
+        for start in range(0, data.size, chunk_size):
+            yield data[start : start + chunk_size].data
+    else:
+        yield from _iter_c_chunks(arr, chunk_size)
+
+
+def count_numpy_chunks(arr, chunk_size):
+    """
+    Get the number of chunks iter_numpy_chunks yields, without copying any.
+    """
+    if get_numpy_order(arr) == b"F":
+        return -(-arr.nbytes // chunk_size)
+    return _count_c_chunks(arr, chunk_size)
+
+
+def _iter_c_chunks(arr, chunk_size):
+    """
+    Yield the data of an array in C order. The rows of a strided array are
+    split in C order, too, even if they're Fortran-contiguous themselves.
+    """
+    if arr.flags["C_CONTIGUOUS"]:
+        data = arr.reshape(-1).view(np.uint8)
+        for start in range(0, data.size, chunk_size):
+            yield data[start : start + chunk_size].data
+    elif arr.ndim > 1 and arr[0].nbytes > chunk_size:
+        for row in arr:
+            yield from _iter_c_chunks(row, chunk_size)
+    else:
+        n_rows = max(chunk_size // (arr.nbytes // len(arr)), 1)
+        for start in range(0, len(arr), n_rows):
+            chunk = np.ascontiguousarray(arr[start : start + n_rows])
+            yield chunk.reshape(-1).view(np.uint8).data
+
+
+def _count_c_chunks(arr, chunk_size):
+    if arr.flags["C_CONTIGUOUS"]:
+        return -(-arr.nbytes // chunk_size)
+    elif arr.ndim > 1 and arr[0].nbytes > chunk_size:
+        # All rows have the same strides
+        return len(arr) * _count_c_chunks(arr[0], chunk_size)
+    n_rows = max(chunk_size // (arr.nbytes // len(arr)), 1)
+    return -(-len(arr) // n_rows)
+
+
+def get_numpy_dtype(obj):
+    """
+    Get the dtype of an array from its metadata.
+    """
+    # Check if "kind" is in obj to enable decoding of data
+    # serialized with older versions (#20):
+    if b"kind" in obj and obj[b"kind"] == b"V":
+        descr = [
+            tuple(t.decode() if type(t) is bytes else t for t in d)
+            for d in obj[b"type"]
+        ]
+    else:
+        descr = obj[b"type"]
+    return np.dtype(descr)
+
+
 def decode_numpy(obj):
     """
     Decoder for deserializing numpy data types.
     """
     if b"nd" not in obj:
+        if b"ragged" in obj:
+            return RaggedArray(obj[b"data"], obj[b"offsets"])
+        # Record lists written with pack_records are decoded here, so other
+        # dicts don't pay for another decoder
+        if b"records" in obj:
+            return decode_records(obj)
         return obj
 
     # Crash with a clean ModuleNotFoundError if numpy is not available
@@ -64,17 +171,32 @@ def decode_numpy(obj):
     import numpy  # noqa: F401
 
     if obj[b"nd"]:
-        # Check if "kind" is in obj to enable decoding of data
-        # serialized with older versions (#20):
-        if b"kind" in obj and obj[b"kind"] == b"V":
-            descr = [
-                tuple(t.decode() if type(t) is bytes else t for t in d)
-                for d in obj[b"type"]
-            ]
-        else:
-            descr = obj[b"type"]
-        return np.frombuffer(obj[b"data"], dtype=np.dtype(descr)).reshape(obj[b"shape"])
+        dtype = get_numpy_dtype(obj)
+        if b"chunks" in obj:
+            return _join_numpy_chunks(obj, dtype)
+        return np.frombuffer(obj[b"data"], dtype=dtype).reshape(obj[b"shape"])
     else:
         # NumPy scalar
         descr = obj[b"type"]
         return np.frombuffer(obj[b"data"], dtype=np.dtype(descr))[0]
+
+
+def _join_numpy_chunks(obj, dtype):
+    """
+    Copy the chunks of an array into a new array, releasing each chunk once
+    it's copied.
+    """
+    order = obj[b"order"].decode()
+    arr = np.empty(obj[b"shape"], dtype=dtype, order=order)
+    data = arr.reshape(-1, order=order).view(np.uint8)
+    # A list of the chunks (which may be a tuple), to release them one by one
+    chunks = list(obj.pop(b"chunks"))
+    start = 0
+    for i in range(len(chunks)):
+        chunk = np.frombuffer(chunks[i], dtype=np.uint8)
+        chunks[i] = None
+        data[start : start + chunk.size] = chunk
+        start += chunk.size
+    if start != data.size:
+        raise ValueError(f"Expected {data.size} bytes of array data, got {start}")
+    return arr
@@ -0,0 +1,85 @@
+"""
+Support for compact msgpack serialization of homogeneous record lists, i.e.
+lists of dicts that all have the same keys. Instead of repeating every key in
+every record, the list is stored as a key table followed by one positional
+array of values per record:
+
+    {b"records": True, b"keys": [k1, k2, ...], b"rows": [[v1, v2, ...], ...]}
+"""
+
+from operator import itemgetter
+
+_CONTAINERS = {dict, list, tuple}
+
+
+def pack_records(obj, min_records=2):
+    """
+    Replace all homogeneous record lists nested in an object by their compact
+    key-table form. Called on the data before it's packed.
+    """
+    obj_type = type(obj)
+    if obj_type is dict:
+        # Dicts and lists without nested containers are kept as they are
+        if _CONTAINERS.isdisjoint(map(type, obj.values())):
+            return obj
+        return {key: _pack_value(value, min_records) for key, value in obj.items()}
+    if obj_type is list or obj_type is tuple:
+        if len(obj) >= min_records and type(obj[0]) is dict:
+            keys = list(obj[0])
+            rows = _record_rows(obj, keys)
+            if rows is not None:
+                # Only walk the columns again that have anything to pack
+                for i in range(len(keys)):
+                    column = map(itemgetter(i), rows)
+                    if not _CONTAINERS.isdisjoint(map(type, column)):
+                        for row in rows:
+                            if type(row[i]) in _CONTAINERS:
+                                row[i] = pack_records(row[i], min_records)
+                return {b"records": True, b"keys": keys, b"rows": rows}
+        if _CONTAINERS.isdisjoint(map(type, obj)):
+            return obj
+        return [_pack_value(value, min_records) for value in obj]
+    return obj
+
+
+def _pack_value(value, min_records):
+    if type(value) in _CONTAINERS:
+        return pack_records(value, min_records)
+    return value
+
+
+def _record_rows(records, keys):
+    """Get the values of each record in the order of the keys, or None if the
+    records don't all have the same keys."""
+    n_keys = len(keys)
+    if n_keys > 1:
+        get_values = itemgetter(*keys)
+    else:
+        # itemgetter returns a single value instead of a tuple
+        def get_values(record):
+            return tuple(record[key] for key in keys)
+
+    rows = []
+    try:
+        for record in records:
+            # With as many keys as the first record, which all have to be
+            # found, a record has the same keys
+            if type(record) is not dict or len(record) != n_keys:
+                return None
+            rows.append(list(get_values(record)))
+    except KeyError:
+        return None
+    return rows
+
+
+def decode_records(obj):
+    """
+    Decoder expanding compact record lists back into lists of dicts.
+    """
+    if b"records" not in obj:
+        return obj
+    keys = obj[b"keys"]
+    rows = obj[b"rows"]
+    records = [dict(zip(keys, row)) for row in rows]
+    # Respect use_list=False
+    return records if type(rows) is list else tuple(records)
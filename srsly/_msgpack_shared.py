@@ -0,0 +1,236 @@
+"""
+Transfer of msgpack-serialized objects between processes through shared
+memory. The object is packed with its numpy arrays replaced by their metadata
+and the position of their data, which is copied into the same block after the
+msgpack bytes. Receivers unpack the metadata and get the arrays as read-only
+views into the block, so array data is copied once in total, no matter how
+large it is:
+
+    header    b"SRSLYSHM" msgpack length (uint64) data offset (uint64)
+    msgpack   the object, with {b"nd": True, ..., b"shm": [offset, nbytes]}
+              in place of each array
+    data      the array data, each array aligned to 64 bytes
+"""
+
+from typing import Any, List, Optional, Tuple, Union
+from multiprocessing.shared_memory import SharedMemory
+import struct
+import weakref
+
+import msgpack
+
+from .util import JSONInputBin, JSONOutputBin
+from ._msgpack_api import msgpack_encoders, msgpack_decoders
+from ._msgpack_numpy import get_numpy_header, get_numpy_dtype, has_numpy, has_cupy
+
+if has_numpy:
+    import numpy as np
+if has_cupy:
+    import cupy
+
+MAGIC = b"SRSLYSHM"
+ALIGNMENT = 64
+_HEADER = struct.Struct("<8sQQ")
+
+
+class SharedMsgpack:
+    """Handle of a shared memory block written by write_shared_msgpack. The
+    handle can be pickled and sent to other processes, which read the object
+    with read_shared_msgpack. The block exists until it's unlinked, by the
+    handle or by a reader:
+
+        with write_shared_msgpack(data) as shared:
+            pool.map(process, [shared] * n_workers)
+
+    name (str): The name of the shared memory block.
+    size (int): The number of bytes used in the block.
+    """
+
+    def __init__(self, name: str, size: int, shm: Optional[SharedMemory] = None):
+        self.name = name
+        self.size = size
+        self._shm = shm
+
+    def __reduce__(self):
+        # Receivers don't own the block
+        return (self.__class__, (self.name, self.size))
+
+    def __repr__(self) -> str:
+        return f"SharedMsgpack(name={self.name!r}, size={self.size})"
+
+    def __enter__(self) -> "SharedMsgpack":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.unlink()
+
+    def unlink(self) -> None:
+        """Remove the shared memory block. Processes that are still using
+        arrays from it can keep using them, and the memory is freed once
+        they're done.
+        """
+        shm = self._shm
+        self._shm = None
+        if shm is None:
+            try:
+                shm = _attach(self.name, track=True)
+            except FileNotFoundError:
+                return
+        shm.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            # Already unlinked by a reader
+            pass
+
+
+def write_shared_msgpack(data: JSONInputBin) -> SharedMsgpack:
+    """Serialize an object into a new shared memory block. The data of numpy
+    arrays is stored outside of the msgpack bytes, so readers can use it
+    without copying it.
+
+    data: The data to serialize.
+    RETURNS (SharedMsgpack): The handle of the block.
+    """
+    arrays: List[Tuple[int, Any]] = []
+    data_size = 0
+
+    def default(obj):
+        nonlocal data_size
+        if has_cupy and isinstance(obj, cupy.ndarray):
+            obj = obj.get()
+        if has_numpy and isinstance(obj, np.ndarray) and not obj.dtype.hasobject:
+            header = get_numpy_header(obj)
+            header[b"shm"] = [data_size, obj.nbytes]
+            arrays.append((data_size, obj))
+            data_size += _align(obj.nbytes)
+            return header
+        return msgpack_encoders._run(obj)
+
+    meta = msgpack.dumps(data, strict_types=True, default=default)
+    data_start = _align(_HEADER.size + len(meta))
+    size = data_start + data_size
+    shm = SharedMemory(create=True, size=size)
+    try:
+        _fill_block(shm, meta, data_start, arrays)
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    # The writer doesn't need its own mapping of the block anymore
+    shm.close()
+    return SharedMsgpack(shm.name, size, shm)
+
+
+def read_shared_msgpack(
+    shared: Union[SharedMsgpack, str], unlink: bool = False, use_list: bool = True
+) -> JSONOutputBin:
+    """Deserialize an object from a shared memory block written by
+    write_shared_msgpack. Numpy arrays are read-only views into the block,
+    which stays mapped until all of them are garbage collected.
+
+    shared (Union[SharedMsgpack, str]): The handle or name of the block.
+    unlink (bool): Remove the block after reading it, for blocks that are
+        read by a single process. The arrays can still be used.
+    use_list (bool): Don't use tuples instead of lists. Can make
+        deserialization slower.
+    RETURNS: The deserialized Python object.
+    """
+    name = shared.name if isinstance(shared, SharedMsgpack) else shared
+    shm = _attach(name, track=unlink)
+    if unlink:
+        shm.unlink()
+    magic, meta_size, data_start = _HEADER.unpack_from(shm.buf)
+    if magic != MAGIC:
+        shm.close()
+        raise ValueError(f"Shared memory block {name} wasn't written by srsly")
+    meta_start = _HEADER.size
+    if not has_numpy:
+        meta = bytes(shm.buf[meta_start : meta_start + meta_size])
+        shm.close()
+        return msgpack.loads(
+            meta,
+            raw=False,
+            use_list=use_list,
+            object_hook=msgpack_decoders._run,
+            ext_hook=msgpack_decoders._run_ext,
+            timestamp=msgpack_decoders._timestamp,
+        )
+    # The arrays are views of the block, which keep the memoryview numpy
+    # creates for the buffer alive. Once they're all gone, the memoryview
+    # releases the buffer and the block is closed.
+    block = np.frombuffer(shm.buf, dtype=np.uint8)
+    block.flags.writeable = False
+    finalizer = weakref.finalize(block.base, shm.close)
+    # Arrays that are still alive at exit keep the block open until the
+    # process ends
+    finalizer.atexit = False
+
+    def object_hook(obj):
+        if b"shm" in obj:
+            offset, nbytes = obj[b"shm"]
+            start = data_start + offset
+            data = block[start : start + nbytes]
+            return data.view(get_numpy_dtype(obj)).reshape(obj[b"shape"])
+        return msgpack_decoders._run(obj)
+
+    meta = block[meta_start : meta_start + meta_size]
+    return msgpack.loads(
+        meta,
+        raw=False,
+        use_list=use_list,
+        object_hook=object_hook,
+        ext_hook=msgpack_decoders._run_ext,
+        timestamp=msgpack_decoders._timestamp,
+    )
+
+
+def _fill_block(
+    shm: SharedMemory, meta: bytes, data_start: int, arrays: List[Tuple[int, Any]]
+) -> None:
+    buf = shm.buf
+    target = None
+    _HEADER.pack_into(buf, 0, MAGIC, len(meta), data_start)
+    buf[_HEADER.size : _HEADER.size + len(meta)] = meta
+    for offset, arr in arrays:
+        # Copies strided and Fortran-ordered arrays without a temporary copy
+        target = np.ndarray(
+            arr.shape, dtype=arr.dtype, buffer=buf, offset=data_start + offset
+        )
+        target[...] = arr
+    # Release the views of the buffer, so the block can be closed
+    del target, buf
+
+
+class _AttachedMemory(SharedMemory):
+    """A block attached by a reader. Closing it fails while numpy arrays
+    still use its buffer, which happens when it's garbage collected at
+    interpreter exit, so the error is ignored.
+    """
+
+    def close(self) -> None:
+        try:
+            super().close()
+        except BufferError:
+            pass
+
+
+def _attach(name: str, track: bool) -> SharedMemory:
+    """Attach to an existing block. Only blocks that will be unlinked by the
+    caller are tracked, so the resource tracker doesn't remove the block when
+    this process exits.
+    """
+    if not track:
+        try:
+            return _AttachedMemory(name, track=False)
+        except TypeError:
+            # Before Python 3.13, attaching always registers the block with
+            # the resource tracker. Worker processes share the tracker of
+            # their parent, so this only adds the block that's already
+            # registered by the writer.
+            pass
+    return _AttachedMemory(name)
+
+
+def _align(n_bytes: int) -> int:
+    return -(-n_bytes // ALIGNMENT) * ALIGNMENT
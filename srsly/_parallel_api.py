@@ -0,0 +1,389 @@
+from typing import Union, Iterable, Iterator, List, Tuple, Any, Optional, Callable
+from typing import Dict, IO
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+from concurrent.futures import wait, FIRST_COMPLETED
+from collections import deque
+from pathlib import Path
+import glob
+import gzip
+
+from ._json_api import read_json, read_gzip_json, read_jsonl, read_gzip_jsonl
+from ._json_api import json_dumpb, write_json
+from ._msgpack_api import read_msgpack, msgpack_dumps, msgpack_loads
+from ._pickle_api import read_pickle
+from ._yaml_api import read_yaml
+from .util import force_path, FilePath, JSONInput, JSONOutput, ParallelGzipWriter
+
+
+def _read_pickle_gzip(path: FilePath) -> Any:
+    return read_pickle(path, compress=True)
+
+
+def _read_msgpack_gzip(path: FilePath) -> Any:
+    with gzip.open(force_path(path), "rb") as f:
+        return msgpack_loads(f.read())
+
+
+# Readers by file extension. Line-based formats yield one record per line,
+# all others load the whole file.
+READERS = {
+    ".jsonl": read_jsonl,
+    ".jsonl.gz": read_gzip_jsonl,
+    ".json": read_json,
+    ".json.gz": read_gzip_json,
+    ".msgpack": read_msgpack,
+    ".msg": read_msgpack,
+    ".mpk": read_msgpack,
+    ".msgpack.gz": _read_msgpack_gzip,
+    ".yaml": read_yaml,
+    ".yml": read_yaml,
+    ".pkl": read_pickle,
+    ".pickle": read_pickle,
+    ".pkl.gz": _read_pickle_gzip,
+}
+LINE_READERS = {read_jsonl, read_gzip_jsonl}
+
+
+def read_many(
+    paths: Union[FilePath, Iterable[FilePath]],
+    workers: int = 4,
+    ordered: bool = True,
+    per_file: bool = False,
+    processes: bool = False,
+    prefetch: Optional[int] = None,
+    skip: bool = False,
+) -> Iterator[Any]:
+    """Read many files concurrently, e.g. the shards of a dataset, and yield
+    their records. The reader is chosen by file extension: .jsonl,
+    .jsonl.gz, .json, .json.gz, .msgpack, .msgpack.gz, .msg, .mpk, .yaml,
+    .yml, .pkl, .pickle and .pkl.gz.
+
+    paths (Union[FilePath, Iterable[FilePath]]): The file paths, a glob
+        pattern like "data/*.jsonl.gz", or a directory to read all supported
+        files from. For a directory written by write_shards, the shards
+        listed in its manifest are read.
+    workers (int): Number of threads or processes reading files.
+    ordered (bool): Yield the files in the order of the paths. If False,
+        files are yielded as soon as they're loaded.
+    per_file (bool): Yield a (path, content) tuple per file instead of the
+        individual records. The content of line-based files is a list of
+        records.
+    processes (bool): Use a process pool instead of a thread pool. Helps if
+        parsing is the bottleneck, as threads share the GIL.
+    prefetch (int): Maximum number of files loaded ahead of the consumer.
+        Defaults to two per worker.
+    skip (bool): Skip broken lines in JSONL files and don't raise ValueError.
+    YIELDS: The records, i.e. the lines of line-based files and the items of
+        files containing a list, or a (path, content) tuple per file.
+    """
+    file_paths = resolve_paths(paths)
+    # Look up the readers up front to fail early on unsupported files
+    for file_path in file_paths:
+        get_reader(file_path)
+    prefetch = max(prefetch if prefetch is not None else workers * 2, 1)
+    pool_cls = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    pool = pool_cls(max_workers=workers)
+    try:
+        results = _submit_bounded(pool, file_paths, prefetch, ordered, skip)
+        for file_path, content in results:
+            if per_file:
+                yield (file_path, content)
+            elif isinstance(content, list):
+                yield from content
+            else:
+                yield content
+    finally:
+        # Don't load the remaining files if the consumer stopped early
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def resolve_paths(paths: Union[FilePath, Iterable[FilePath]]) -> List[Path]:
+    """Expand a glob pattern, directory or list of paths to a list of file
+    paths. If a directory has a shard manifest, the listed shards are used.
+
+    paths (Union[FilePath, Iterable[FilePath]]): The paths to resolve.
+    RETURNS (List[Path]): The file paths.
+    """
+    if isinstance(paths, (str, Path)):
+        if isinstance(paths, str) and glob.has_magic(paths):
+            matches = sorted(glob.glob(paths, recursive=True))
+            return [Path(match) for match in matches if Path(match).is_file()]
+        path = force_path(paths)
+        if path.is_dir() and (path / MANIFEST_NAME).exists():
+            manifest = read_json(path / MANIFEST_NAME)
+            return [path / shard["path"] for shard in manifest["shards"]]
+        elif path.is_dir():
+            return sorted(
+                p for p in path.rglob("*") if p.is_file() and _suffix(p) in READERS
+            )
+        return [path]
+    return [force_path(path) for path in paths]
+
+
+def get_reader(path: FilePath) -> Callable[..., Any]:
+    """Get the srsly reader for a file, based on its extension.
+
+    path (FilePath): The file path.
+    RETURNS (Callable): The reader function.
+    """
+    suffix = _suffix(Path(path))
+    if suffix not in READERS:
+        raise ValueError(
+            f"Can't read file with unsupported extension: {path}. "
+            f"Supported: {', '.join(READERS)}"
+        )
+    return READERS[suffix]
+
+
+def _suffix(path: Path) -> str:
+    suffixes = path.suffixes
+    if len(suffixes) >= 2 and suffixes[-1] == ".gz":
+        return "".join(suffixes[-2:]).lower()
+    return path.suffix.lower()
+
+
+def _load_file(path: Path, skip: bool) -> Tuple[Path, JSONOutput]:
+    reader = get_reader(path)
+    if reader in LINE_READERS:
+        return path, list(reader(path, skip=skip))
+    return path, reader(path)
+
+
+def _submit_bounded(
+    pool: Any, paths: List[Path], prefetch: int, ordered: bool, skip: bool
+) -> Iterator[Tuple[Path, JSONOutput]]:
+    """Submit the files to the pool, keeping at most `prefetch` of them in
+    flight, and yield the results in order or as they complete."""
+    remaining = iter(paths)
+    pending: deque = deque()
+    for path in remaining:
+        pending.append(pool.submit(_load_file, path, skip))
+        if len(pending) >= prefetch:
+            break
+    while pending:
+        if ordered:
+            future: Future = pending.popleft()
+        else:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            future = done.pop()
+            pending.remove(future)
+        result = future.result()
+        next_path = next(remaining, None)
+        if next_path is not None:
+            pending.append(pool.submit(_load_file, next_path, skip))
+        yield result
+
+
+MANIFEST_NAME = "manifest.json"
+SHARD_FORMATS = {"jsonl": ".jsonl", "msgpack": ".msgpack"}
+# Header of a msgpack array with a 32-bit length, which is patched with the
+# number of records once a shard is complete.
+_MSGPACK_ARRAY32 = b"\xdd"
+
+
+class ShardWriter:
+    """Write records to a directory of JSONL or msgpack shards, rolling over
+    to a new file after a maximum number of records or bytes. Shards can be
+    gzip-compressed on a pool of worker threads. When the writer is closed,
+    a manifest.json with the record count and size of each shard is written,
+    so readers can split the work without scanning the files.
+
+        with ShardWriter("/path/to/dir", max_records=100000) as writer:
+            for record in records:
+                writer.write(record)
+        print(writer.manifest)
+
+    JSONL shards contain one record per line, msgpack shards a single array of
+    records, so each shard can be loaded with read_jsonl or read_msgpack, and
+    the whole directory with read_many.
+    """
+
+    def __init__(
+        self,
+        path: FilePath,
+        format: str = "jsonl",
+        max_records: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        compress: bool = False,
+        workers: int = 4,
+        prefix: str = "shard",
+    ):
+        """Initialize the writer.
+
+        path (FilePath): The output directory. Created if it doesn't exist.
+        format (str): "jsonl" or "msgpack".
+        max_records (int): Maximum number of records per shard.
+        max_bytes (int): Maximum number of uncompressed bytes per shard.
+        compress (bool): Compress the shards with gzip. Each shard is streamed
+            through a ParallelGzipWriter, so only a few compression blocks
+            are held in memory, whatever the shard size.
+        workers (int): Number of threads compressing each shard. 0 or 1 to
+            compress on the calling thread.
+        prefix (str): Prefix of the shard file names.
+        """
+        if format not in SHARD_FORMATS:
+            raise ValueError(
+                f"Unsupported shard format: {format}. "
+                f"Supported: {', '.join(SHARD_FORMATS)}"
+            )
+        self.dir = force_path(path, require_exists=False)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.format = format
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.prefix = prefix
+        self.shards: List[Dict[str, Any]] = []
+        self.manifest: Optional[Dict[str, Any]] = None
+        self.workers = workers
+        self._file: Optional[IO[bytes]] = None
+        self._gzip: Optional[ParallelGzipWriter] = None
+        self._out: Optional[Union[IO[bytes], ParallelGzipWriter]] = None
+        self._n_records = 0
+        self._n_bytes = 0
+        self._is_open = False
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            # Don't write a manifest for incomplete output
+            if self._gzip is not None:
+                self._gzip.__exit__(exc_type, exc_value, traceback)
+            if self._file is not None:
+                self._file.close()
+
+    def write(self, record: JSONInput) -> None:
+        """Write a record to the current shard.
+
+        record (JSONInput): The JSON- or msgpack-serializable record.
+        """
+        if self.format == "jsonl":
+            data = json_dumpb(record) + b"\n"
+        else:
+            data = msgpack_dumps(record)
+        if self._is_open and self._is_full(len(data)):
+            self._finish_shard()
+        if not self._is_open:
+            self._open_shard()
+        self._out.write(data)  # type: ignore[union-attr]
+        self._n_records += 1
+        self._n_bytes += len(data)
+
+    def write_many(self, records: Iterable[JSONInput]) -> None:
+        """Write a sequence of records.
+
+        records (Iterable[JSONInput]): The JSON- or msgpack-serializable records.
+        """
+        for record in records:
+            self.write(record)
+
+    def close(self) -> Dict[str, Any]:
+        """Finish the last shard, wait for all shards to be compressed and
+        write the manifest.
+
+        RETURNS (Dict[str, Any]): The manifest.
+        """
+        if self.manifest is not None:
+            return self.manifest
+        if self._is_open:
+            self._finish_shard()
+        self.manifest = {
+            "format": self.format,
+            "compress": self.compress,
+            "records": sum(shard["records"] for shard in self.shards),
+            "bytes": sum(shard["bytes"] for shard in self.shards),
+            "shards": self.shards,
+        }
+        write_json(self.dir / MANIFEST_NAME, self.manifest)
+        return self.manifest
+
+    def _is_full(self, n_new_bytes: int) -> bool:
+        if self.max_records is not None and self._n_records >= self.max_records:
+            return True
+        if self.max_bytes is not None and self._n_records > 0:
+            return self._n_bytes + n_new_bytes > self.max_bytes
+        return False
+
+    def _open_shard(self) -> None:
+        suffix = SHARD_FORMATS[self.format] + (".gz" if self.compress else "")
+        name = f"{self.prefix}-{len(self.shards):05d}{suffix}"
+        self.shards.append({"path": name, "records": 0, "bytes": 0})
+        self._n_records = 0
+        self._n_bytes = 0
+        self._file = (self.dir / name).open("wb")
+        self._out = self._file
+        if self.format == "msgpack":
+            # Placeholder for the header, patched in _finish_shard
+            self._file.write(self._msgpack_header(0))
+        if self.compress:
+            self._gzip = ParallelGzipWriter(self._file, workers=self.workers)
+            self._out = self._gzip
+        self._is_open = True
+
+    def _msgpack_header(self, n_records: int) -> bytes:
+        header = _MSGPACK_ARRAY32 + n_records.to_bytes(4, "big")
+        if self.compress:
+            # A stored gzip member of the 5 header bytes always has the same
+            # size, so it can be overwritten in place like the plain header.
+            return gzip.compress(header, compresslevel=0, mtime=0)
+        return header
+
+    def _finish_shard(self) -> None:
+        shard = self.shards[-1]
+        shard["records"] = self._n_records
+        shard["uncompressed_bytes"] = self._n_bytes
+        if self.format == "msgpack":
+            shard["uncompressed_bytes"] += len(_MSGPACK_ARRAY32) + 4
+        if self._gzip is not None:
+            self._gzip.close()
+            self._gzip = None
+        assert self._file is not None
+        shard["bytes"] = self._file.tell()
+        if self.format == "msgpack":
+            self._file.seek(0)
+            self._file.write(self._msgpack_header(self._n_records))
+        self._file.close()
+        self._file = None
+        self._out = None
+        self._is_open = False
+
+
+def write_shards(
+    path: FilePath,
+    records: Iterable[JSONInput],
+    format: str = "jsonl",
+    max_records: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    compress: bool = False,
+    workers: int = 4,
+    prefix: str = "shard",
+) -> Dict[str, Any]:
+    """Write records to a directory of JSONL or msgpack shards, rolling over
+    to a new file after a maximum number of records or bytes, and write a
+    manifest.json with the record count and size of each shard.
+
+    path (FilePath): The output directory. Created if it doesn't exist.
+    records (Iterable[JSONInput]): The records to write.
+    format (str): "jsonl" or "msgpack".
+    max_records (int): Maximum number of records per shard.
+    max_bytes (int): Maximum number of uncompressed bytes per shard.
+    compress (bool): Compress the shards with gzip.
+    workers (int): Number of threads compressing each shard.
+    prefix (str): Prefix of the shard file names.
+    RETURNS (Dict[str, Any]): The manifest.
+    """
+    with ShardWriter(
+        path,
+        format=format,
+        max_records=max_records,
+        max_bytes=max_bytes,
+        compress=compress,
+        workers=workers,
+        prefix=prefix,
+    ) as writer:
+        writer.write_many(records)
+    return writer.manifest
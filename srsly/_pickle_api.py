@@ -1,10 +1,12 @@
-from typing import Optional
+from typing import Optional, Iterable, Iterator
 
 import cloudpickle
 
-from .util import JSONInput, JSONOutput
+from .util import force_path, open_binary, FilePath, JSONInput, JSONOutput
+from ._instrumentation import instrument
 
 
+@instrument("pickle", "dumps")
 def pickle_dumps(data: JSONInput, protocol: Optional[int] = None) -> bytes:
     """Serialize a Python object with pickle.
 
@@ -15,6 +17,7 @@ def pickle_dumps(data: JSONInput, protocol: Optional[int] = None) -> bytes:
     return cloudpickle.dumps(data, protocol=protocol)
 
 
+@instrument("pickle", "loads")
 def pickle_loads(data: bytes) -> JSONOutput:
     """Deserialize bytes with pickle.
 
@@ -22,3 +25,77 @@ def pickle_loads(data: bytes) -> JSONOutput:
     RETURNS: The deserialized Python object.
     """
     return cloudpickle.loads(data)
+
+
+@instrument("pickle", "write")
+def write_pickle(
+    path: FilePath,
+    data: JSONInput,
+    protocol: Optional[int] = None,
+    compress: bool = False,
+) -> None:
+    """Create a pickle file and dump contents or write to standard output.
+    The object is streamed to the file, so the full serialized bytes are never
+    held in memory.
+
+    path (FilePath): The file path. "-" for writing to stdout.
+    data: The object to serialize.
+    protocol (int): Protocol to use. -1 for highest.
+    compress (bool): Compress the output with gzip.
+    """
+    with open_binary(path, "wb", compress=compress) as f:
+        cloudpickle.dump(data, f, protocol=protocol)
+
+
+@instrument("pickle", "read")
+def read_pickle(path: FilePath, compress: bool = False) -> JSONOutput:
+    """Load a pickle file or read from standard input.
+
+    path (FilePath): The file path. "-" for reading from stdin.
+    compress (bool): Whether the file is compressed with gzip.
+    RETURNS: The deserialized Python object.
+    """
+    with open_binary(path, "rb", compress=compress) as f:
+        return cloudpickle.load(f)
+
+
+@instrument("pickle", "write", stream_arg="data")
+def write_pickle_stream(
+    path: FilePath,
+    data: Iterable[JSONInput],
+    protocol: Optional[int] = None,
+    compress: bool = False,
+    append: bool = False,
+) -> None:
+    """Create a pickle file and dump a sequence of objects into it one after
+    another, or write them to standard output. The records can be read back
+    lazily with iter_pickle.
+
+    path (FilePath): The file path. "-" for writing to stdout.
+    data (Iterable): The objects to serialize.
+    protocol (int): Protocol to use. -1 for highest.
+    compress (bool): Compress the output with gzip.
+    append (bool): Whether or not to append to the location.
+    """
+    mode = "ab" if append else "wb"
+    with open_binary(path, mode, compress=compress) as f:
+        for obj in data:
+            cloudpickle.dump(obj, f, protocol=protocol)
+
+
+@instrument("pickle", "read")
+def iter_pickle(path: FilePath, compress: bool = False) -> Iterator[JSONOutput]:
+    """Read a pickle file written with write_pickle_stream or standard input
+    and yield the objects one by one.
+
+    path (FilePath): The file path. "-" for reading from stdin.
+    compress (bool): Whether the file is compressed with gzip.
+    YIELDS: The deserialized Python objects.
+    """
+    with open_binary(path, "rb", compress=compress) as f:
+        while True:
+            try:
+                obj = cloudpickle.load(f)
+            except EOFError:
+                break
+            yield obj
@@ -0,0 +1,120 @@
+from typing import Any, Iterable, Iterator, List, Sequence, Union, overload
+
+try:
+    import numpy as np
+
+    has_numpy = True
+except ImportError:
+    has_numpy = False
+
+
+class RaggedArray(Sequence):
+    """A sequence of numpy arrays of different lengths, stored as one
+    concatenated data array and an array of offsets. Many small arrays, like
+    per-token vectors or spans, are serialized with msgpack as two arrays
+    instead of one dict per array. Items and slices are views of the data, so
+    nothing is copied when they're accessed.
+
+        ragged = RaggedArray.from_arrays([numpy.zeros((3, 300)), numpy.ones((5, 300))])
+        ragged[1].shape  # (5, 300)
+        data = srsly.msgpack_loads(srsly.msgpack_dumps({"vectors": ragged}))
+
+    data (numpy.ndarray): The arrays, concatenated along the first axis.
+    offsets (numpy.ndarray): The start of each array in data, followed by the
+        length of data.
+    """
+
+    def __init__(self, data: Any, offsets: Any):
+        _require_numpy()
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if offsets.ndim != 1 or len(offsets) == 0:
+            raise ValueError("offsets must be a 1-dimensional array of n + 1 items")
+        if offsets[0] != 0 or offsets[-1] != len(data):
+            raise ValueError(f"offsets must start at 0 and end at {len(data)}")
+        if np.any(offsets[1:] < offsets[:-1]):
+            raise ValueError("offsets must be sorted")
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_arrays(cls, arrays: Iterable[Any], dtype: Any = None) -> "RaggedArray":
+        """Create a ragged array from a sequence of arrays, which have to
+        have the same shape apart from their first dimension.
+
+        arrays (Iterable[numpy.ndarray]): The arrays.
+        dtype: The dtype of the data. Defaults to the dtype of the arrays.
+        RETURNS (RaggedArray): The ragged array.
+        """
+        _require_numpy()
+        arrays = [np.asarray(arr, dtype=dtype) for arr in arrays]
+        offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        np.cumsum([len(arr) for arr in arrays], out=offsets[1:])
+        if arrays:
+            data = np.concatenate(arrays)
+        else:
+            data = np.zeros((0,), dtype=dtype if dtype is not None else np.float64)
+        return cls(data, offsets)
+
+    @property
+    def lengths(self) -> Any:
+        """The length of each array."""
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.offsets.nbytes
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @overload
+    def __getitem__(self, i: int) -> Any: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> "RaggedArray": ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Any:
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return self.from_arrays([self[j] for j in range(start, stop, step)])
+            stop = max(start, stop)
+            offsets = self.offsets[start : stop + 1]
+            data = self.data[offsets[0] : offsets[-1]]
+            return self.__class__(data, offsets - offsets[0])
+        n_arrays = len(self)
+        if i < 0:
+            i += n_arrays
+        if not 0 <= i < n_arrays:
+            raise IndexError("ragged array index out of range")
+        return self.data[self.offsets[i] : self.offsets[i + 1]]
+
+    def __iter__(self) -> Iterator[Any]:
+        data = self.data
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets, offsets[1:]):
+            yield data[start:end]
+
+    def __repr__(self) -> str:
+        return (
+            f"RaggedArray(n={len(self)}, shape={self.data.shape}, "
+            f"dtype={self.data.dtype})"
+        )
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, RaggedArray):
+            return NotImplemented
+        return (
+            self.data.dtype == other.data.dtype
+            and np.array_equal(self.offsets, other.offsets)
+            and np.array_equal(self.data, other.data)
+        )
+
+    def to_list(self) -> List[Any]:
+        """Get the arrays as a list of views of the data."""
+        return list(self)
+
+
+def _require_numpy() -> None:
+    if not has_numpy:
+        raise ImportError("RaggedArray requires numpy")
@@ -0,0 +1,502 @@
+"""
+Record files: a container of msgpack records that supports random access,
+slicing and splitting the work between workers without parsing the file.
+
+    header    b"SRSLYREC" version (uint32)
+    record    marker (4 bytes) length (uint32) crc32 (uint32) msgpack payload
+    ...
+    index     offset of each record (uint64), aligned to 8 bytes
+    footer    index offset (uint64) number of records (uint64)
+              crc32 of the index (uint32) b"SRSLYIDX"
+
+All integers are little-endian. Each record is checked against its CRC32 when
+it's read. If the footer is missing or damaged, e.g. because the writer was
+interrupted, the index is rebuilt by scanning the file for record markers and
+keeping the records with a valid checksum, so reading resumes after a damaged
+record instead of failing at it.
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union, overload
+from array import array
+import mmap
+import random
+import struct
+import sys
+import zlib
+
+import msgpack
+
+from .util import force_path, FilePath, JSONInputBin, JSONOutputBin
+from ._instrumentation import instrument
+from ._msgpack_api import msgpack_encoders, _unpack_kwargs
+
+MAGIC = b"SRSLYREC"
+INDEX_MAGIC = b"SRSLYIDX"
+VERSION = 1
+MARKER = b"\xd5\x52\x45\x43"
+_HEADER = struct.Struct("<8sI")
+_FRAME = struct.Struct("<4sII")
+_FOOTER = struct.Struct("<QQI8s")
+# Number of records to frame before writing them out
+WRITE_BATCH = 1000
+
+
+class RecordWriter:
+    """Write msgpack records to a record file, one after another, and write
+    the offset index when it's closed.
+
+        with RecordWriter("/path/to/file.rec") as writer:
+            for record in records:
+                writer.write(record)
+
+    path (FilePath): The file path.
+    """
+
+    def __init__(self, path: FilePath):
+        self.path = force_path(path, require_exists=False)
+        self._file = self.path.open("wb")
+        self._file.write(_HEADER.pack(MAGIC, VERSION))
+        self._offset = _HEADER.size
+        self._offsets = array("Q")
+        self._packer = msgpack.Packer(strict_types=True, default=msgpack_encoders._run)
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def write(self, record: JSONInputBin) -> None:
+        """Write a record.
+
+        record (JSONInputBin): The msgpack-serializable record.
+        """
+        payload = self._packer.pack(record)
+        frame = _FRAME.pack(MARKER, len(payload), zlib.crc32(payload))
+        self._file.write(frame)
+        self._file.write(payload)
+        self._offsets.append(self._offset)
+        self._offset += len(frame) + len(payload)
+
+    def write_many(self, records: Iterable[JSONInputBin]) -> None:
+        """Write a sequence of records.
+
+        records (Iterable[JSONInputBin]): The msgpack-serializable records.
+        """
+        self._write_payloads(map(self._packer.pack, records))
+
+    def _write_payloads(self, payloads: Iterable[bytes]) -> None:
+        """Frame and write records that are already serialized."""
+        pack_frame = _FRAME.pack
+        crc32 = zlib.crc32
+        offsets = self._offsets
+        offset = self._offset
+        chunks = []
+        for payload in payloads:
+            length = len(payload)
+            chunks.append(pack_frame(MARKER, length, crc32(payload)))
+            chunks.append(payload)
+            offsets.append(offset)
+            offset += _FRAME.size + length
+            if len(chunks) >= 2 * WRITE_BATCH:
+                self._file.write(b"".join(chunks))
+                chunks = []
+        self._file.write(b"".join(chunks))
+        self._offset = offset
+
+    def close(self) -> None:
+        """Write the index and footer and close the file."""
+        if self._file.closed:
+            return
+        # Align the index so it can be used from the memory map directly
+        padding = bytes(-self._offset % 8)
+        index = _to_little_endian(self._offsets).tobytes()
+        footer = _FOOTER.pack(
+            self._offset + len(padding),
+            len(self._offsets),
+            zlib.crc32(index),
+            INDEX_MAGIC,
+        )
+        self._file.write(padding)
+        self._file.write(index)
+        self._file.write(footer)
+        self._file.close()
+
+
+class RecordReader:
+    """Random-access reader of a record file. The file is memory-mapped, and
+    records are only deserialized when they're accessed.
+
+        reader = RecordReader("/path/to/file.rec")
+        first = reader[0]
+        batch = reader[100:200]
+        for record in reader.iter_shard(worker_id, n_workers):
+            ...
+
+    Readers can be pickled and are reopened from their path, so they can be
+    passed to worker processes.
+
+    path (FilePath): The file path.
+    use_list (bool): Don't use tuples instead of lists. Can make
+        deserialization slower.
+    skip (bool): Skip records failing their checksum when iterating instead
+        of raising ValueError.
+    """
+
+    def __init__(self, path: FilePath, use_list: bool = True, skip: bool = False):
+        self.path = force_path(path)
+        self.use_list = use_list
+        self.skip = skip
+        self._unpack_kwargs = _unpack_kwargs(use_list, False, False)
+        with self.path.open("rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        if self._view[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"Not a record file: {self.path}")
+        self._offsets = self._read_index()
+        # The index is damaged or was never written
+        self.recovered = self._offsets is None
+        if self._offsets is None:
+            self._offsets = self._scan_offsets()
+
+    def __enter__(self) -> "RecordReader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __reduce__(self):
+        return (self.__class__, (self.path, self.use_list, self.skip))
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    @overload
+    def __getitem__(self, i: int) -> JSONOutputBin: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> List[JSONOutputBin]: ...
+
+    def __getitem__(
+        self, i: Union[int, slice]
+    ) -> Union[JSONOutputBin, List[JSONOutputBin]]:
+        if isinstance(i, slice):
+            return [self._read(j) for j in range(len(self))[i]]
+        n_records = len(self)
+        if i < 0:
+            i += n_records
+        if not 0 <= i < n_records:
+            raise IndexError("record index out of range")
+        return self._read(i)
+
+    def __iter__(self) -> Iterator[JSONOutputBin]:
+        return self.iter(0, len(self))
+
+    def iter(
+        self, start: int = 0, stop: Optional[int] = None
+    ) -> Iterator[JSONOutputBin]:
+        """Yield the records of a range of indices.
+
+        start (int): Index of the first record.
+        stop (Optional[int]): Index after the last record. Defaults to the
+            end of the file.
+        YIELDS (JSONOutputBin): The records.
+        """
+        for i in range(len(self))[start:stop]:
+            try:
+                yield self._read(i)
+            except ValueError:
+                if not self.skip:
+                    raise
+
+    def iter_shard(self, shard: int, n_shards: int) -> Iterator[JSONOutputBin]:
+        """Yield one of n_shards contiguous ranges of records of about equal
+        size, so each worker can process its own part of the file.
+
+        shard (int): The index of the shard, between 0 and n_shards - 1.
+        n_shards (int): The number of shards.
+        YIELDS (JSONOutputBin): The records of the shard.
+        """
+        if not 0 <= shard < n_shards:
+            raise ValueError(f"Invalid shard {shard} of {n_shards}")
+        n_records = len(self)
+        start = n_records * shard // n_shards
+        stop = n_records * (shard + 1) // n_shards
+        return self.iter(start, stop)
+
+    def close(self) -> None:
+        """Close the memory map. Records can't be read afterwards."""
+        if isinstance(getattr(self, "_offsets", None), memoryview):
+            self._offsets.release()
+        self._view.release()
+        self._mmap.close()
+
+    def _read(self, i: int) -> JSONOutputBin:
+        return msgpack.unpackb(self._read_payload(i), **self._unpack_kwargs)
+
+    def _read_payload(self, i: int) -> memoryview:
+        offset = self._offsets[i]
+        marker, length, crc = _FRAME.unpack_from(self._view, offset)
+        start = offset + _FRAME.size
+        payload = self._view[start : start + length]
+        if marker != MARKER or zlib.crc32(payload) != crc:
+            raise ValueError(f"Corrupt record {i} at offset {offset} in {self.path}")
+        return payload
+
+    def _read_index(self) -> Optional[Union[memoryview, array]]:
+        """Get the offsets from the index, or None if it isn't valid."""
+        view = self._view
+        if len(view) < _HEADER.size + _FOOTER.size:
+            return None
+        footer_start = len(view) - _FOOTER.size
+        index_start, n_records, crc, magic = _FOOTER.unpack_from(view, footer_start)
+        if magic != INDEX_MAGIC or index_start + n_records * 8 != footer_start:
+            return None
+        index = view[index_start:footer_start]
+        if zlib.crc32(index) != crc:
+            return None
+        if sys.byteorder == "little" and index_start % 8 == 0:
+            # Use the mapped index without copying it
+            return index.cast("Q")
+        offsets = array("Q", index.tobytes())
+        return _to_little_endian(offsets)
+
+    def _scan_offsets(self) -> array:
+        """Find the records of a file without a valid index by searching for
+        record markers and checking the records' checksums."""
+        view = self._view
+        offsets = array("Q")
+        offset = self._mmap.find(MARKER, _HEADER.size)
+        while offset != -1 and offset + _FRAME.size <= len(view):
+            _, length, crc = _FRAME.unpack_from(view, offset)
+            end = offset + _FRAME.size + length
+            if end <= len(view) and zlib.crc32(view[offset + _FRAME.size : end]) == crc:
+                offsets.append(offset)
+                offset = self._mmap.find(MARKER, end)
+            else:
+                offset = self._mmap.find(MARKER, offset + 1)
+        return offsets
+
+
+class RecordStore:
+    """In-memory sequence of records, kept as msgpack bytes in one contiguous
+    buffer with an array of offsets. Each record takes about as much memory as
+    its msgpack encoding instead of a tree of Python objects, and is only
+    deserialized when it's accessed.
+
+        store = RecordStore(srsly.read_jsonl("/path/to/file.jsonl"))
+        record = store[1234]
+        store.shuffle(seed=0)
+        batch = store.get_batch([1, 5, 8])
+        store.save("/path/to/file.rec")
+        store = RecordStore.load("/path/to/file.rec")
+
+    Stores are saved as record files. Loaded stores are backed by a memory map
+    of the file, so the records don't take up memory, and no records can be
+    added to them.
+
+    records (Iterable[JSONInputBin]): The msgpack-serializable records.
+    use_list (bool): Don't use tuples instead of lists. Can make
+        deserialization slower.
+    """
+
+    def __init__(self, records: Iterable[JSONInputBin] = (), use_list: bool = True):
+        self.use_list = use_list
+        self._unpack_kwargs = _unpack_kwargs(use_list, False, False)
+        self._data = bytearray()
+        # Start of each record and end of the last one
+        self._offsets = array("Q", [0])
+        # The record at each position, once the store is shuffled
+        self._order: Optional[array] = None
+        self._reader: Optional[RecordReader] = None
+        self.extend(records)
+
+    @classmethod
+    def load(cls, path: FilePath, use_list: bool = True) -> "RecordStore":
+        """Load a store saved with RecordStore.save, or any other record file,
+        by memory-mapping it.
+
+        path (FilePath): The file path.
+        use_list (bool): Don't use tuples instead of lists. Can make
+            deserialization slower.
+        RETURNS (RecordStore): The loaded store.
+        """
+        store = cls(use_list=use_list)
+        store._reader = RecordReader(path, use_list=use_list)
+        return store
+
+    def __enter__(self) -> "RecordStore":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = dict(self.__dict__)
+        # The decoder hook is set up again when unpickling
+        del state["_unpack_kwargs"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._unpack_kwargs = _unpack_kwargs(self.use_list, False, False)
+
+    def __len__(self) -> int:
+        if self._order is not None:
+            return len(self._order)
+        return self._n_records()
+
+    @overload
+    def __getitem__(self, i: int) -> JSONOutputBin: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> List[JSONOutputBin]: ...
+
+    def __getitem__(
+        self, i: Union[int, slice]
+    ) -> Union[JSONOutputBin, List[JSONOutputBin]]:
+        if isinstance(i, slice):
+            return self.get_batch(range(len(self))[i])
+        return self._read(self._get_record(i))
+
+    def __iter__(self) -> Iterator[JSONOutputBin]:
+        for i in range(len(self)):
+            yield self._read(self._get_record(i))
+
+    @property
+    def nbytes(self) -> int:
+        """The number of bytes used by the records and offsets held in
+        memory."""
+        n_bytes = len(self._data) + self._offsets.itemsize * len(self._offsets)
+        if self._order is not None:
+            n_bytes += self._order.itemsize * len(self._order)
+        return n_bytes
+
+    def append(self, record: JSONInputBin) -> None:
+        """Add a record to the end of the store.
+
+        record (JSONInputBin): The msgpack-serializable record.
+        """
+        self.extend((record,))
+
+    def extend(self, records: Iterable[JSONInputBin]) -> None:
+        """Add records to the end of the store.
+
+        records (Iterable[JSONInputBin]): The msgpack-serializable records.
+        """
+        if self._reader is not None:
+            raise ValueError("Can't add records to a store loaded from a file")
+        n_records = self._n_records()
+        pack = msgpack.Packer(strict_types=True, default=msgpack_encoders._run).pack
+        data = self._data
+        offsets = self._offsets
+        for record in records:
+            data += pack(record)
+            offsets.append(len(data))
+        if self._order is not None:
+            self._order.extend(range(n_records, self._n_records()))
+
+    def get_batch(self, indices: Iterable[int]) -> List[JSONOutputBin]:
+        """Get the records at a sequence of positions, e.g. a batch of random
+        indices.
+
+        indices (Iterable[int]): The positions of the records.
+        RETURNS (List[JSONOutputBin]): The deserialized records.
+        """
+        read = self._read
+        get_record = self._get_record
+        return [read(get_record(i)) for i in indices]
+
+    def shuffle(self, seed: Optional[int] = None) -> None:
+        """Shuffle the order of the records in place. Only the index of the
+        records is shuffled, not the records themselves.
+
+        seed (Optional[int]): Seed for the random number generator.
+        """
+        order = self._order
+        if order is None:
+            order = array("Q", range(self._n_records()))
+        random.Random(seed).shuffle(order)
+        self._order = order
+
+    def save(self, path: FilePath) -> None:
+        """Save the records to a record file, in their current order. The file
+        can be loaded with RecordStore.load and read with RecordReader.
+
+        path (FilePath): The file path.
+        """
+        path = force_path(path, require_exists=False)
+        reader = self._reader
+        if reader is not None and path.exists() and path.samefile(reader.path):
+            raise ValueError("Can't overwrite the file the store is loaded from")
+        order = self._order if self._order is not None else range(len(self))
+        with RecordWriter(path) as writer:
+            writer._write_payloads(map(self._read_payload, order))
+
+    def close(self) -> None:
+        """Close the file of a loaded store. Its records can't be read
+        afterwards."""
+        if self._reader is not None:
+            self._reader.close()
+
+    def _n_records(self) -> int:
+        if self._reader is not None:
+            return len(self._reader)
+        return len(self._offsets) - 1
+
+    def _get_record(self, i: int) -> int:
+        """Get the index of the record at a position."""
+        n_records = len(self)
+        if i < 0:
+            i += n_records
+        if not 0 <= i < n_records:
+            raise IndexError("record index out of range")
+        return self._order[i] if self._order is not None else i
+
+    def _read(self, j: int) -> JSONOutputBin:
+        return msgpack.unpackb(self._read_payload(j), **self._unpack_kwargs)
+
+    def _read_payload(self, j: int) -> Union[bytearray, memoryview]:
+        if self._reader is not None:
+            return self._reader._read_payload(j)
+        return self._data[self._offsets[j] : self._offsets[j + 1]]
+
+
+def _to_little_endian(offsets: array) -> array:
+    if sys.byteorder == "big":
+        offsets = array("Q", offsets)
+        offsets.byteswap()
+    return offsets
+
+
+@instrument("records", "write", stream_arg="data")
+def write_records(path: FilePath, data: Iterable[JSONInputBin]) -> None:
+    """Create a record file and write a sequence of objects to it. The file
+    supports random access and splitting between workers with RecordReader.
+
+    path (FilePath): The file path.
+    data (Iterable[JSONInputBin]): The objects to serialize.
+    """
+    with RecordWriter(path) as writer:
+        writer.write_many(data)
+
+
+@instrument("records", "read")
+def read_records(
+    path: FilePath, use_list: bool = True, skip: bool = False
+) -> Iterator[JSONOutputBin]:
+    """Read a record file and yield the objects one by one.
+
+    path (FilePath): The file path.
+    use_list (bool): Don't use tuples instead of lists. Can make
+        deserialization slower.
+    skip (bool): Skip records failing their checksum and don't raise
+        ValueError.
+    YIELDS (JSONOutputBin): The deserialized Python objects.
+    """
+    with RecordReader(path, use_list=use_list, skip=skip) as reader:
+        yield from reader
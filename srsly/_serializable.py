@@ -0,0 +1,135 @@
+"""
+Structural serializability checks. Instead of serializing an object, the
+checker walks its graph and looks up a verdict for the type of each value,
+which is computed once per type and cached. Containers whose values are all
+of types known to be fine are skipped at C level without visiting the values.
+"""
+
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Set
+from typing import Tuple, Union
+from itertools import chain
+
+# Verdicts for a type. Other verdicts are functions converting a value to
+# another value to check instead.
+OK = "ok"
+FAIL = "fail"
+SEQUENCE = "sequence"
+MAPPING = "mapping"
+SET = "set"
+
+Verdict = Union[str, Callable[[Any], Any]]
+# Value to convert unsupported values to, which fails every check
+UNSERIALIZABLE = object()
+Path = Tuple[Hashable, ...]
+
+
+class StructuralChecker:
+    """Checks if objects can be serialized by walking their graph.
+
+    classify (Callable[[type], Verdict]): Function returning the verdict for a
+        type: OK, FAIL, SEQUENCE, MAPPING, SET or a function converting values
+        of the type to the value to check instead.
+    check_keys (bool): Whether mapping keys need to be serializable.
+    allow_cycles (bool): Whether containers may contain themselves.
+    max_depth (int): Maximum nesting depth of containers.
+    """
+
+    def __init__(
+        self,
+        classify: Callable[[type], Verdict],
+        check_keys: bool = False,
+        allow_cycles: bool = False,
+        max_depth: Optional[int] = None,
+    ):
+        self.classify = classify
+        self.check_keys = check_keys
+        self.allow_cycles = allow_cycles
+        self.max_depth = max_depth
+        self.verdicts: Dict[type, Verdict] = {}
+        self.ok_types: Set[type] = set()
+
+    def get_verdict(self, cls: type) -> Verdict:
+        verdict = self.verdicts.get(cls)
+        if verdict is None:
+            verdict = self.classify(cls)
+            self.verdicts[cls] = verdict
+            if verdict is OK:
+                self.ok_types.add(cls)
+        return verdict
+
+    def find(self, obj: Any) -> Optional[Path]:
+        """Find the first value that can't be serialized.
+
+        obj: The object to check.
+        RETURNS (Optional[Tuple]): The keys and indices leading to the value,
+            an empty tuple if it's the object itself, or None if the object
+            can be serialized.
+        """
+        get_verdict = self.get_verdict
+        get_children = self._get_children
+        ok_types = self.ok_types
+        allow_cycles = self.allow_cycles
+        max_depth = self.max_depth if self.max_depth is not None else float("inf")
+        # The children of each container being visited, and the key and id
+        # of the container in its parent (None for the object itself)
+        stack: List[Iterator[Tuple[Hashable, Any]]] = [iter([(None, obj)])]
+        keys: List[Hashable] = []
+        ids: List[int] = []
+        while stack:
+            for key, value in stack[-1]:
+                if type(value) in ok_types:
+                    continue
+                verdict = get_verdict(type(value))
+                while callable(verdict):
+                    value = verdict(value)
+                    verdict = get_verdict(type(value))
+                if verdict is OK:
+                    continue
+                if verdict is FAIL:
+                    return tuple(keys[1:]) + (key,) if keys else ()
+                if id(value) in ids:
+                    if allow_cycles:
+                        continue
+                    return tuple(keys[1:]) + (key,) if keys else ()
+                if len(ids) >= max_depth:
+                    return tuple(keys[1:]) + (key,) if keys else ()
+                children = get_children(value, verdict)
+                if children is None:
+                    continue
+                stack.append(children)
+                keys.append(key)
+                ids.append(id(value))
+                break
+            else:
+                stack.pop()
+                if keys:
+                    keys.pop()
+                    ids.pop()
+        return None
+
+    def _get_children(
+        self, value: Any, verdict: Verdict
+    ) -> Optional[Iterator[Tuple[Hashable, Any]]]:
+        """Get the (key, value) pairs of a container to visit, or None if the
+        types of all its values are known to be fine."""
+        ok_types = self.ok_types
+        if verdict is SEQUENCE:
+            if ok_types.issuperset(map(type, value)):
+                return None
+            return enumerate(value)
+        if verdict is SET:
+            if ok_types.issuperset(map(type, value)):
+                return None
+            return zip(value, value)
+        values_ok = ok_types.issuperset(map(type, value.values()))
+        if not self.check_keys:
+            return None if values_ok else iter(value.items())
+        keys_ok = ok_types.issuperset(map(type, value))
+        if keys_ok and values_ok:
+            return None
+        return chain(zip(value, value), value.items())
+
+
+def has_call(cls: type) -> bool:
+    """Check if instances of a type are callable."""
+    return any("__call__" in vars(base) for base in cls.__mro__)
@@ -1,11 +1,13 @@
-from typing import Union, IO, Any
+from typing import Union, IO, Any, Optional, Tuple, Hashable
 from io import StringIO
 import sys
 
 from ruamel.yaml import YAML
-from ruamel.yaml.representer import RepresenterError
 
 from .util import force_path, FilePath, YAMLInput, YAMLOutput
+from ._instrumentation import instrument
+from ._serializable import StructuralChecker, Verdict
+from ._serializable import OK, FAIL, SEQUENCE, MAPPING, SET
 
 
 class CustomYaml(YAML):
@@ -26,6 +28,7 @@ class CustomYaml(YAML):
             return stream.getvalue()
 
 
+@instrument("yaml", "dumps")
 def yaml_dumps(
     data: YAMLInput,
     indent_mapping: int = 2,
@@ -50,6 +53,7 @@ def yaml_dumps(
     return yaml.dump(data)
 
 
+@instrument("yaml", "loads")
 def yaml_loads(data: Union[str, IO]) -> YAMLOutput:
     """Deserialize unicode or a file object a Python object.
 
@@ -63,6 +67,7 @@ def yaml_loads(data: Union[str, IO]) -> YAMLOutput:
         raise ValueError(f"Invalid YAML: {e}")
 
 
+@instrument("yaml", "read")
 def read_yaml(path: FilePath) -> YAMLOutput:
     """Load YAML from file or standard input.
 
@@ -77,6 +82,7 @@ def read_yaml(path: FilePath) -> YAMLOutput:
         return yaml_loads(f)
 
 
+@instrument("yaml", "write")
 def write_yaml(
     path: FilePath,
     data: YAMLInput,
@@ -111,13 +117,47 @@ def write_yaml(
 
 
 def is_yaml_serializable(obj: Any) -> bool:
-    """Check if a Python object is YAML-serializable (strict).
+    """Check if a Python object is YAML-serializable (strict). The object is
+    checked structurally, without serializing it.
 
     obj: The object to check.
     RETURNS (bool): Whether the object is YAML-serializable.
     """
-    try:
-        yaml_dumps(obj)
-        return True
-    except RepresenterError:
-        return False
+    return _yaml_checker.find(obj) is None
+
+
+def find_yaml_unserializable(obj: Any) -> Optional[Tuple[Hashable, ...]]:
+    """Find the first value or key of an object that isn't YAML-serializable
+    (strict). The object is checked structurally, without serializing it.
+
+    obj: The object to check.
+    RETURNS (Optional[Tuple[Hashable, ...]]): The keys and indices leading to
+        the value, an empty tuple if it's the object itself, or None if the
+        object is YAML-serializable.
+    """
+    return _yaml_checker.find(obj)
+
+
+def _classify_yaml_type(cls: type) -> Verdict:
+    """Get the verdict for values of a type, following the representers of
+    the safe dumper used by yaml_dumps."""
+    representer = CustomYaml().Representer
+    represent = representer.yaml_representers.get(cls)
+    if represent is None:
+        # Multi-representers also match subclasses
+        if any(base in representer.yaml_multi_representers for base in cls.__mro__):
+            return OK
+        return FAIL
+    if represent is representer.represent_list:
+        return SEQUENCE
+    if represent in (representer.represent_dict, representer.represent_ordereddict):
+        return MAPPING
+    if represent is representer.represent_set:
+        return SET
+    return OK
+
+
+# Repeated objects, including recursive ones, are written as aliases
+_yaml_checker = StructuralChecker(
+    _classify_yaml_type, check_keys=True, allow_cycles=True
+)
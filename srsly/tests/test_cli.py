@@ -0,0 +1,196 @@
+from io import BytesIO, TextIOWrapper
+import gzip
+import os
+import threading
+
+import pytest
+
+from .._cli import main, get_format, iter_records
+from .._json_api import read_jsonl, write_jsonl, read_json
+from .._msgpack_api import iter_msgpack
+from .._yaml_api import read_yaml
+from .util import make_tempdir
+
+DATA = [{"id": i, "text": f"text {i}"} for i in range(100)]
+
+
+@pytest.mark.parametrize(
+    "path,fmt",
+    [
+        ("data.jsonl", "jsonl"),
+        ("data.JSONL.GZ", "jsonl.gz"),
+        ("data.v1.json", "json"),
+        ("data.mpk", "msgpack"),
+        ("data.msgpack.gz", "msgpack.gz"),
+        ("data.yml", "yaml"),
+        ("-", "jsonl"),
+    ],
+)
+def test_cli_get_format(path, fmt):
+    assert get_format(path) == fmt
+    assert get_format(path, "yaml") == "yaml"
+
+
+def test_cli_get_format_invalid():
+    with pytest.raises(ValueError):
+        get_format("data.txt")
+    with pytest.raises(ValueError):
+        get_format("data.jsonl", "xml")
+
+
+@pytest.mark.parametrize(
+    "ext", [".jsonl", ".jsonl.gz", ".json", ".json.gz", ".msgpack", ".msgpack.gz"]
+)
+def test_cli_convert(ext):
+    with make_tempdir() as temp_dir:
+        input_path = temp_dir / "input.jsonl"
+        write_jsonl(input_path, DATA)
+        output_path = temp_dir / f"output{ext}"
+        assert main(["convert", str(input_path), str(output_path)]) == 0
+        back_path = temp_dir / "back.jsonl"
+        assert main(["convert", str(output_path), str(back_path)]) == 0
+        assert list(read_jsonl(back_path)) == DATA
+
+
+def test_cli_convert_yaml():
+    with make_tempdir() as temp_dir:
+        input_path = temp_dir / "input.jsonl"
+        write_jsonl(input_path, DATA[:3])
+        output_path = temp_dir / "output.yaml"
+        assert main(["convert", str(input_path), str(output_path)]) == 0
+        assert read_yaml(output_path) == DATA[:3]
+
+
+def test_cli_convert_parallel_gzip():
+    with make_tempdir() as temp_dir:
+        input_path = temp_dir / "input.jsonl"
+        write_jsonl(input_path, DATA * 100)
+        output_path = temp_dir / "output.jsonl.gz"
+        args = ["convert", str(input_path), str(output_path), "--workers", "4"]
+        assert main(args) == 0
+        with gzip.open(output_path, "rb") as f:
+            assert f.read() == input_path.read_bytes()
+
+
+def test_cli_convert_stdio(monkeypatch, capsysbinary):
+    input_data = b'{"hello": "world"}\n\n{"test": 123}\n'
+    monkeypatch.setattr("sys.stdin", TextIOWrapper(BytesIO(input_data)))
+    assert main(["convert", "-", "-", "--to", "msgpack"]) == 0
+    output = capsysbinary.readouterr().out
+    monkeypatch.setattr("sys.stdin", TextIOWrapper(BytesIO(output)))
+    assert main(["convert", "-", "-", "--from", "msgpack", "--to", "jsonl"]) == 0
+    assert capsysbinary.readouterr().out == b'{"hello":"world"}\n{"test":123}\n'
+
+
+def test_cli_convert_same_file(capsys):
+    with make_tempdir() as temp_dir:
+        path = temp_dir / "data.jsonl"
+        write_jsonl(path, DATA)
+        assert main(["convert", str(path), str(path)]) == 1
+        assert "different files" in capsys.readouterr().err
+        assert list(read_jsonl(path)) == DATA
+
+
+@pytest.mark.parametrize("ext", [".jsonl", ".msgpack.gz"])
+def test_cli_convert_failed_input_keeps_output(ext, capsys):
+    with make_tempdir() as temp_dir:
+        out_path = temp_dir / f"out{ext}"
+        out_path.write_bytes(b"existing")
+        broken_path = temp_dir / "broken.jsonl"
+        broken_path.write_text('{"a": 1}\n{broken\n', encoding="utf8")
+        for in_path in (temp_dir / "missing.jsonl", broken_path):
+            assert main(["convert", str(in_path), str(out_path)]) == 1
+            assert out_path.read_bytes() == b"existing"
+        # No temporary files are left behind
+        names = sorted(path.name for path in temp_dir.iterdir())
+        assert names == ["broken.jsonl", f"out{ext}"]
+    assert "missing.jsonl" in capsys.readouterr().err
+
+
+def test_cli_stdin_no_read_ahead(monkeypatch):
+    # Records are read as they're piped in, without waiting for a full chunk
+    read_fd, write_fd = os.pipe()
+    with open(read_fd, "r", encoding="utf8") as stdin, open(write_fd, "wb") as pipe:
+        monkeypatch.setattr("sys.stdin", stdin)
+        pipe.write(b'{"a": 1}\n')
+        pipe.flush()
+        records = []
+        records_iter = iter_records("-", "jsonl")
+        thread = threading.Thread(target=lambda: records.append(next(records_iter)))
+        thread.daemon = True
+        thread.start()
+        thread.join(timeout=5)
+        first = list(records)
+        pipe.close()
+        thread.join()
+    assert first == [{"a": 1}]
+
+
+def test_cli_cat(capsysbinary):
+    with make_tempdir() as temp_dir:
+        paths = [temp_dir / "a.jsonl", temp_dir / "b.msgpack.gz"]
+        write_jsonl(paths[0], DATA[:50])
+        main(["convert", str(paths[0]), str(paths[1])])
+        assert main(["cat", str(paths[0]), str(paths[1])]) == 0
+        output = capsysbinary.readouterr().out
+        assert output.count(b"\n") == 100
+        output_path = temp_dir / "all.json"
+        args = ["cat", str(paths[0]), str(paths[1]), "-o", str(output_path)]
+        assert main(args) == 0
+        assert read_json(output_path) == DATA[:50] * 2
+
+
+def test_cli_head(capsysbinary):
+    with make_tempdir() as temp_dir:
+        path = temp_dir / "data.jsonl.gz"
+        input_path = temp_dir / "data.jsonl"
+        write_jsonl(input_path, DATA)
+        main(["convert", str(input_path), str(path)])
+        assert main(["head", str(path), "-n", "2"]) == 0
+        output = capsysbinary.readouterr().out
+        assert output == b'{"id":0,"text":"text 0"}\n{"id":1,"text":"text 1"}\n'
+        output_path = temp_dir / "head.msgpack"
+        assert main(["head", str(path), "-o", str(output_path)]) == 0
+        assert list(iter_msgpack(output_path)) == DATA[:10]
+
+
+def test_cli_count(capsysbinary):
+    file_contents = '{"hello": "world"}\n\n{"test": broken}\n{"test": 123}\n'
+    with make_tempdir({"a.jsonl": file_contents}) as temp_dir:
+        path = temp_dir / "a.jsonl"
+        assert main(["count", str(path)]) == 0
+        assert capsysbinary.readouterr().out == b"3\n"
+        yaml_path = temp_dir / "b.yaml"
+        main(["convert", str(path), str(yaml_path), "--skip"])
+        assert main(["count", str(path), str(yaml_path)]) == 0
+        output = capsysbinary.readouterr().out.decode("utf8")
+        assert output == f"3\t{path}\n2\t{yaml_path}\n"
+
+
+@pytest.mark.parametrize("ext", [".jsonl", ".jsonl.gz", ".msgpack"])
+def test_cli_sample(ext):
+    with make_tempdir() as temp_dir:
+        input_path = temp_dir / "input.jsonl"
+        write_jsonl(input_path, DATA)
+        path = temp_dir / f"data{ext}"
+        if ext != ".jsonl":
+            main(["convert", str(input_path), str(path)])
+        else:
+            path = input_path
+        output_path = temp_dir / "sample.jsonl"
+        args = ["sample", str(path), "-k", "10", "--seed", "0", "-o", str(output_path)]
+        assert main(args) == 0
+        sample = list(read_jsonl(output_path))
+        assert len(sample) == 10
+        assert all(record in DATA for record in sample)
+        assert sample == sorted(sample, key=lambda record: record["id"])
+
+
+def test_cli_sample_seek_invalid(capsys):
+    with make_tempdir() as temp_dir:
+        path = temp_dir / "data.msgpack"
+        input_path = temp_dir / "input.jsonl"
+        write_jsonl(input_path, DATA)
+        main(["convert", str(input_path), str(path)])
+        assert main(["sample", str(path), "-k", "10", "--seek"]) == 1
+        assert "--seek" in capsys.readouterr().err
@@ -0,0 +1,149 @@
+import gzip
+
+import pytest
+
+from .._instrumentation import io_listeners
+from .._json_api import json_dumps, json_loads, read_jsonl, write_jsonl
+from .._json_api import write_json, read_gzip_jsonl, write_gzip_jsonl
+from .._json_api import sample_jsonl, sample_gzip_jsonl, read_jsonl_columns
+from .._msgpack_api import msgpack_dumps, read_msgpack, write_msgpack
+from .util import make_tempdir
+
+
+def test_io_listeners_dumps_loads():
+    events = []
+    with io_listeners.listen(events.append):
+        data = json_dumps({"hello": "world"})
+        json_loads(data)
+        msgpack_dumps([1, 2, 3])
+    json_dumps({"hello": "world"})
+    assert [(e.format, e.func) for e in events] == [
+        ("json", "json_dumps"),
+        ("json", "json_loads"),
+        ("msgpack", "msgpack_dumps"),
+    ]
+    assert events[0].bytes_out == len(data)
+    assert events[1].bytes_in == len(data)
+    assert events[0].records == 1
+    assert all(e.path is None and e.error is None for e in events)
+    assert all(e.wall_time >= 0 and e.cpu_time >= 0 for e in events)
+
+
+def test_io_listeners_register_deregister():
+    events = []
+    io_listeners.register("test", events.append)
+    json_dumps([1])
+    io_listeners.deregister("test")
+    json_dumps([1])
+    assert len(events) == 1
+
+
+def test_io_listeners_nested_calls():
+    """json_dumps called by write_json isn't reported separately."""
+    events = []
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.json"
+        with io_listeners.listen(events.append):
+            write_json(file_path, {"hello": "world"})
+        assert len(events) == 1
+        assert events[0].func == "write_json"
+        assert events[0].path == str(file_path)
+        assert events[0].bytes_out == file_path.stat().st_size
+
+
+def test_io_listeners_overwrite_append():
+    events = []
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        write_jsonl(file_path, [{"text": "x" * 100}] * 10)
+        sizes = []
+        with io_listeners.listen(events.append):
+            write_jsonl(file_path, [{"text": "y"}])
+            sizes.append(file_path.stat().st_size)
+            write_jsonl(file_path, [{"text": "z"}], append=True)
+            sizes.append(file_path.stat().st_size)
+            write_jsonl(file_path, [{"text": "z"}], True, False)
+            sizes.append(file_path.stat().st_size)
+    # Overwriting reports the new size, appending the size of the new data
+    assert [event.bytes_out for event in events] == [
+        sizes[0],
+        sizes[1] - sizes[0],
+        sizes[2] - sizes[1],
+    ]
+    assert all(event.bytes_out > 0 for event in events)
+
+
+def test_io_listeners_jsonl():
+    events = []
+    data = [{"hello": "world"}, {"test": 123}, {"foo": "bar"}]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        with io_listeners.listen(events.append):
+            write_jsonl(file_path, (line for line in data))
+            assert list(read_jsonl(file_path)) == data
+        size = file_path.stat().st_size
+    write_event, read_event = events
+    assert write_event.func == "write_jsonl"
+    assert write_event.records == 3
+    assert write_event.bytes_out == size
+    assert read_event.func == "read_jsonl"
+    assert read_event.records == 3
+    assert read_event.bytes_in == size
+    assert read_event.skipped == 0
+
+
+def test_io_listeners_skipped_lines():
+    events = []
+    file_contents = '{"hello": world}\n{"test": 123}\n{"broken\n'
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl.gz"
+        with gzip.open(file_path, "wb") as f:
+            f.write(file_contents.encode("utf8"))
+        with io_listeners.listen(events.append):
+            data = list(read_gzip_jsonl(file_path, skip=True))
+    assert data == [{"test": 123}]
+    assert len(events) == 1
+    assert events[0].records == 1
+    assert events[0].skipped == 2
+
+
+def test_io_listeners_error():
+    events = []
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.msg"
+        write_msgpack(file_path, {"a": 1})
+        with io_listeners.listen(events.append):
+            with pytest.raises(TypeError):
+                write_msgpack(file_path, {"a": object()})
+            with pytest.raises(ValueError):
+                read_msgpack(temp_dir / "missing.msg")
+    assert [e.func for e in events] == ["write_msgpack", "read_msgpack"]
+    assert isinstance(events[0].error, TypeError)
+    assert isinstance(events[1].error, ValueError)
+
+
+@pytest.mark.parametrize("gz", [False, True])
+def test_io_listeners_sample_records(gz):
+    events = []
+    data = [{"id": i} for i in range(20)]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / ("tmp.jsonl.gz" if gz else "tmp.jsonl")
+        (write_gzip_jsonl if gz else write_jsonl)(file_path, data)
+        sample = sample_gzip_jsonl if gz else sample_jsonl
+        with io_listeners.listen(events.append):
+            assert len(sample(file_path, 5, seed=0)) == 5
+            assert len(sample(file_path, 50, seed=0)) == 20
+    assert [event.records for event in events] == [5, 20]
+
+
+def test_io_listeners_columns_records():
+    pytest.importorskip("numpy")
+    events = []
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        write_jsonl(file_path, [{"id": i} for i in range(7)])
+        with io_listeners.listen(events.append):
+            read_jsonl_columns(file_path, chunk_size=3)
+            write_jsonl(file_path, [])
+            read_jsonl_columns(file_path)
+    assert [event.records for event in events if event.func != "write_jsonl"] == [7, 0]
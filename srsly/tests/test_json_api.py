@@ -1,6 +1,11 @@
 import pytest
-from io import StringIO
+import re
+import contextlib
+import random
+from io import StringIO, BytesIO, TextIOWrapper
 from pathlib import Path
+from dataclasses import dataclass, field
+from typing import List, NamedTuple
 import gzip
 
 from .._json_api import (
@@ -10,19 +15,57 @@ from .._json_api import (
     write_jsonl,
     read_gzip_jsonl,
     write_gzip_jsonl,
+    read_jsonl_columns,
 )
 from .._json_api import write_gzip_json, json_dumps, is_json_serializable
-from .._json_api import json_loads
+from .._json_api import json_dumpb
+from .._json_api import json_loads, sample_jsonl, sample_gzip_jsonl
+from .._json_api import find_json_unserializable, _seek_sample
 from ..util import force_string
 from .util import make_tempdir
 
 
+@dataclass
+class Span:
+    __slots__ = ("start", "end", "label")
+    start: int
+    end: int
+    label: str
+
+
+@dataclass
+class Doc:
+    text: str
+    tags: List[str] = field(default_factory=list)
+    score: float = 0.0
+
+
+class Token(NamedTuple):
+    text: str
+    pos: str = "X"
+
+
 def test_json_dumps_sort_keys():
     data = {"a": 1, "c": 3, "b": 2}
     result = json_dumps(data, sort_keys=True)
     assert result == '{"a":1,"b":2,"c":3}'
 
 
+@pytest.mark.parametrize(
+    "data,kwargs",
+    [
+        ({"hello": "wörld", "emoji": "\U0001f600"}, {}),
+        ({"c": [1, 2.5], "a": None}, {"sort_keys": True}),
+        ({"a": {"b": 1}}, {"indent": 2}),
+    ],
+)
+def test_json_dumpb(data, kwargs):
+    result = json_dumpb(data, **kwargs)
+    assert isinstance(result, bytes)
+    assert result == json_dumps(data, **kwargs).encode("utf8")
+    assert json_loads(result) == data
+
+
 def test_read_json_file():
     file_contents = '{\n    "hello": "world"\n}'
     with make_tempdir({"tmp.json": file_contents}) as temp_dir:
@@ -119,6 +162,16 @@ def test_read_jsonl_file_invalid():
     assert data[0]["test"] == 123
 
 
+def test_read_jsonl_file_invalid_yields_previous_lines():
+    file_contents = '{"a": 1}\n{"a": 2}\n{"a": 3\n{"a": 4}'
+    with make_tempdir({"tmp.jsonl": file_contents}) as temp_dir:
+        lines = read_jsonl(temp_dir / "tmp.jsonl")
+        assert next(lines) == {"a": 1}
+        assert next(lines) == {"a": 2}
+        with pytest.raises(ValueError):
+            next(lines)
+
+
 def test_read_jsonl_stdin(monkeypatch):
     input_data = '{"hello": "world"}\n{"test": 123}'
     monkeypatch.setattr("sys.stdin", StringIO(input_data))
@@ -171,6 +224,31 @@ def test_write_jsonl_stdout(capsys):
     assert captured.out == '{"hello":"world"}\n{"test":123}\n'
 
 
+def test_write_jsonl_stdout_after_print(capsys):
+    print("header")
+    write_jsonl("-", [{"a": 1}])
+    print("footer")
+    assert capsys.readouterr().out == 'header\n{"a":1}\nfooter\n'
+
+
+def test_write_json_redirected_stdout():
+    out = StringIO()
+    with contextlib.redirect_stdout(out):
+        write_jsonl("-", [{"a": 1}, {"b": "ü"}])
+        write_json("-", {"c": 2})
+    assert out.getvalue() == '{"a":1}\n{"b":"\\u00fc"}\n{\n  "c": 2\n}\n'
+
+
+def test_write_jsonl_file_batches():
+    data = [{"id": i, "text": "ü" * (i % 3)} for i in range(2500)]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        write_jsonl(file_path, iter(data))
+        assert list(read_jsonl(file_path)) == data
+        write_gzip_jsonl(temp_dir / "tmp.jsonl.gz", iter(data))
+        assert list(read_gzip_jsonl(temp_dir / "tmp.jsonl.gz")) == data
+
+
 @pytest.mark.parametrize(
     "obj,expected",
     [
@@ -182,6 +260,47 @@ def test_write_jsonl_stdout(capsys):
 )
 def test_is_json_serializable(obj, expected):
     assert is_json_serializable(obj) == expected
+    assert (find_json_unserializable(obj) is None) == expected
+
+
+@pytest.mark.parametrize(
+    "obj,expected",
+    [
+        ({"a": [1, 2, {"b": {1, 2}}]}, ("a", 2, "b")),
+        ([b"bytes"], (0,)),
+        ({1: "a", None: [1.5, "b"]}, None),
+        ((1, {"a": [None, lambda x: x]}), (1, "a", 1)),
+        (object(), ()),
+    ],
+)
+def test_find_json_unserializable(obj, expected):
+    assert find_json_unserializable(obj) == expected
+    assert is_json_serializable(obj) == (expected is None)
+
+
+def test_find_json_unserializable_recursive():
+    data = {"a": [1]}
+    data["a"].append(data)
+    assert find_json_unserializable(data) == ("a", 1)
+    assert not is_json_serializable(data)
+    nested = []
+    for _ in range(2000):
+        nested = [nested]
+    assert find_json_unserializable(nested) is not None
+    assert not is_json_serializable(nested)
+
+
+def test_find_json_unserializable_numpy():
+    numpy = pytest.importorskip("numpy")
+    data = {
+        "a": numpy.zeros((2, 2), dtype="float32"),
+        "b": numpy.array([1, "x"], dtype=object),
+        "c": numpy.int64(1),
+    }
+    assert find_json_unserializable(data) is None
+    assert find_json_unserializable({"d": numpy.complex64()}) == ("d",)
+    data = [numpy.array([{1}], dtype=object)]
+    assert find_json_unserializable(data) == (0, 0)
 
 
 @pytest.mark.parametrize(
@@ -213,9 +332,76 @@ def test_unsupported_type_error():
 
 def test_unsupported_type_error_numpy():
     numpy = pytest.importorskip("numpy")
-    f = numpy.float32()
+    c = numpy.complex64()
+    with pytest.raises(TypeError, match="is not JSON serializable"):
+        s = json_dumps(c)
     with pytest.raises(TypeError, match="is not JSON serializable"):
-        s = json_dumps(f)
+        s = json_dumps(numpy.zeros((2,), dtype="complex128"))
+    assert not is_json_serializable(c)
+
+
+@pytest.mark.parametrize("sort_keys", [False, True])
+def test_json_dumps_numpy(sort_keys):
+    numpy = pytest.importorskip("numpy")
+    data = {
+        "f32": numpy.array([0.1, 2.5, 1e-7], dtype="float32"),
+        "f64": numpy.array([[0.1, 0.2], [0.3, 0.4]]),
+        "i": numpy.arange(3, dtype="int8"),
+        "b": numpy.array([True, False]),
+        "s": numpy.array(["a", "b"]),
+        "o": numpy.array([numpy.int64(1), "x"], dtype=object),
+        "scalars": [numpy.float32(0.1), numpy.int64(2), numpy.bool_(True)],
+        "empty": numpy.zeros((0, 3), dtype="float32"),
+    }
+    result = json_loads(json_dumps(data, sort_keys=sort_keys))
+    assert result["f64"] == [[0.1, 0.2], [0.3, 0.4]]
+    assert result["i"] == [0, 1, 2]
+    assert result["b"] == [True, False]
+    assert result["s"] == ["a", "b"]
+    assert result["o"] == [1, "x"]
+    assert result["scalars"][1:] == [2, True]
+    assert result["empty"] == []
+    # float32 values are widened exactly
+    assert numpy.array_equal(numpy.array(result["f32"], dtype="float32"), data["f32"])
+    assert numpy.float32(result["scalars"][0]) == data["scalars"][0]
+
+
+def test_json_dumps_numpy_float_precision():
+    numpy = pytest.importorskip("numpy")
+    data = [numpy.array([1 / 3, 2 / 3], dtype="float32"), numpy.float64(1 / 3)]
+    assert json_dumps(data[0], float_precision=3) == "[0.333,0.667]"
+    assert json_dumps(data, float_precision=2) == "[[0.33,0.67],0.3333333333333333]"
+    assert json_dumps(data[0], sort_keys=True, float_precision=2) == "[0.33,0.67]"
+    # float64 arrays aren't copied, so rounding must not modify them
+    values = numpy.array([1 / 3, 2 / 3])
+    assert json_dumps(values, float_precision=1) == "[0.3,0.7]"
+    assert values.tolist() == [1 / 3, 2 / 3]
+
+
+def test_json_dumps_numpy_nan():
+    numpy = pytest.importorskip("numpy")
+    data = numpy.array([numpy.nan, 1.5], dtype="float32")
+    assert json_dumps(data) == json_dumps([float("nan"), 1.5])
+    assert json_dumps(data, float_precision=2) == json_dumps([float("nan"), 1.5])
+
+
+def test_is_json_serializable_numpy():
+    numpy = pytest.importorskip("numpy")
+    assert is_json_serializable(numpy.zeros((2, 2), dtype="float32"))
+    assert is_json_serializable({"a": [numpy.int32(1)]})
+    assert not is_json_serializable(numpy.array([{1, 2}], dtype=object))
+
+
+def test_write_json_numpy():
+    numpy = pytest.importorskip("numpy")
+    data = {"scores": numpy.array([0.25, 0.5], dtype="float32")}
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.json"
+        write_json(file_path, data)
+        assert read_json(file_path) == {"scores": [0.25, 0.5]}
+        file_path = temp_dir / "tmp.jsonl"
+        write_jsonl(file_path, [data, data], float_precision=1)
+        assert list(read_jsonl(file_path)) == [{"scores": [0.2, 0.5]}] * 2
 
 
 def test_write_jsonl_gzip():
@@ -267,3 +453,379 @@ def test_read_jsonl_gzip():
     assert len(data[1]) == 1
     assert data[0]["hello"] == "world"
     assert data[1]["test"] == 123
+
+
+def test_read_jsonl_columns():
+    numpy = pytest.importorskip("numpy")
+    data = [
+        {"id": 1, "score": 0.5, "label": "A", "ok": True},
+        {"id": 2, "score": 1, "label": "B", "ok": False},
+        {"id": 3, "label": "C", "ok": True, "extra": [1, 2]},
+    ]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        write_jsonl(file_path, data)
+        columns = read_jsonl_columns(file_path, chunk_size=2)
+    assert list(columns) == ["id", "score", "label", "ok"]
+    assert columns["id"].dtype == numpy.int64
+    assert columns["id"].tolist() == [1, 2, 3]
+    assert columns["score"].dtype == numpy.float64
+    assert columns["score"][:2].tolist() == [0.5, 1.0]
+    assert numpy.isnan(columns["score"][2])
+    assert columns["label"].dtype == object
+    assert columns["label"].tolist() == ["A", "B", "C"]
+    assert columns["ok"].dtype == bool
+    assert columns["ok"].tolist() == [True, False, True]
+
+
+def test_read_jsonl_columns_fields_dtypes():
+    numpy = pytest.importorskip("numpy")
+    data = [{"a": 1, "b": "x"}, {"b": "yy"}, {"a": 3, "b": None, "c": [1]}]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        write_jsonl(file_path, data)
+        columns = read_jsonl_columns(
+            file_path,
+            fields=["a", "b", "c"],
+            dtypes={"a": "int32", "b": str},
+            fill_values={"a": -1},
+            chunk_size=1,
+        )
+        assert columns["a"].dtype == numpy.int32
+        assert columns["a"].tolist() == [1, -1, 3]
+        assert columns["b"].dtype.kind == "U"
+        assert columns["b"].tolist() == ["x", "yy", ""]
+        assert columns["c"].dtype == object
+        assert columns["c"].tolist() == [None, None, [1]]
+        with pytest.raises(ValueError, match="Missing value for field 'a'"):
+            read_jsonl_columns(file_path, fields=["a"], dtypes={"a": "int32"})
+
+
+def test_read_jsonl_columns_promote():
+    pytest.importorskip("numpy")
+    data = [{"a": 1}, {"a": 2.5}, {"a": "x"}]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        write_jsonl(file_path, data[:2])
+        columns = read_jsonl_columns(file_path, chunk_size=1)
+        assert columns["a"].tolist() == [1.0, 2.5]
+        write_jsonl(file_path, data)
+        columns = read_jsonl_columns(file_path, chunk_size=1)
+        assert columns["a"].tolist() == [1, 2.5, "x"]
+
+
+@pytest.mark.parametrize("data", [[1, True], [True, 1], [1.5, False]])
+@pytest.mark.parametrize("chunk_size", [1, 10])
+def test_read_jsonl_columns_promote_bool(data, chunk_size):
+    numpy = pytest.importorskip("numpy")
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        write_jsonl(file_path, [{"a": value} for value in data])
+        columns = read_jsonl_columns(file_path, chunk_size=chunk_size)
+        assert columns["a"].dtype == numpy.dtype("O")
+        assert [type(value) for value in columns["a"]] == [type(v) for v in data]
+
+
+def test_read_jsonl_columns_not_object():
+    pytest.importorskip("numpy")
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        write_jsonl(file_path, [{"a": 1}, {"a": 2}, [3], {"a": 4}])
+        with pytest.raises(ValueError, match="line 3: expected an object, got list"):
+            read_jsonl_columns(file_path, chunk_size=2)
+        columns = read_jsonl_columns(file_path, skip=True, chunk_size=2)
+        assert columns["a"].tolist() == [1, 2, 4]
+        write_jsonl(file_path, ["x", {"a": 1}])
+        columns = read_jsonl_columns(file_path, skip=True, chunk_size=1)
+        assert columns["a"].tolist() == [1]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 10])
+def test_read_jsonl_columns_missing_int(chunk_size):
+    numpy = pytest.importorskip("numpy")
+    data = [{"a": 1, "b": True}, {"a": 2, "b": False}, {}, {"a": 4, "b": True}]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        write_jsonl(file_path, data)
+        columns = read_jsonl_columns(file_path, chunk_size=chunk_size)
+        assert columns["a"].dtype == numpy.float64
+        assert columns["a"][[0, 1, 3]].tolist() == [1.0, 2.0, 4.0]
+        assert numpy.isnan(columns["a"][2])
+        assert columns["b"].dtype == object
+        assert columns["b"].tolist() == [True, False, None, True]
+        # A missing value in the first chunk
+        write_jsonl(file_path, data[2:] + data[:2])
+        columns = read_jsonl_columns(
+            file_path, fields=["a", "b"], chunk_size=chunk_size
+        )
+        assert columns["a"].dtype == numpy.float64
+        assert columns["b"].tolist() == [None, True, True, False]
+
+
+def test_json_loads_intern():
+    data = '[{"label": "POSITIVE", "id": 1}, {"label": "POSITIVE", "id": 2}]'
+    result = json_loads(data, intern_keys=True)
+    assert result == json_loads(data)
+    assert list(result[0])[0] is list(result[1])[0]
+    assert result[0]["label"] is not result[1]["label"]
+    result = json_loads(data, intern_values=True)
+    assert result[0]["label"] is result[1]["label"]
+
+
+@pytest.mark.parametrize("data", ['{"a": "b\tc"}', b'{"a": "\xc3\xa9"}', "1e400"])
+@pytest.mark.parametrize("kwargs", [{"intern_keys": True}, {"intern_values": True}])
+def test_json_loads_intern_same_documents(data, kwargs):
+    # The json module fallback accepts what ujson accepts
+    assert json_loads(data, **kwargs) == json_loads(data)
+
+
+@pytest.mark.parametrize("gz", [False, True])
+def test_read_jsonl_intern(gz):
+    data = [{"long_key_name": "some value"}, {"long_key_name": "some value"}]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        if gz:
+            write_gzip_jsonl(file_path, data)
+            reader = read_gzip_jsonl
+        else:
+            write_jsonl(file_path, data)
+            reader = read_jsonl
+        plain = list(reader(file_path))
+        assert list(plain[0])[0] is not list(plain[1])[0]
+        interned = list(reader(file_path, intern_keys=True, intern_values=True))
+    assert interned == data
+    assert list(interned[0])[0] is list(interned[1])[0]
+    assert interned[0]["long_key_name"] is interned[1]["long_key_name"]
+
+
+@pytest.mark.parametrize("read_ahead", [False, True])
+def test_read_jsonl_gzip_blank_lines(read_ahead):
+    data = [{"hello": "world"}, {"test": 123}]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl.gz"
+        write_gzip_jsonl(file_path, data)
+        write_gzip_jsonl(file_path, data, append=True)
+        result = list(read_gzip_jsonl(file_path, read_ahead=read_ahead))
+    assert result == data + data
+
+
+def test_read_jsonl_read_ahead():
+    data = [{"id": i, "text": "héllo" * (i % 7)} for i in range(1000)]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        write_jsonl(file_path, data)
+        lines = read_jsonl(file_path, read_ahead=True)
+        # Make sure this returns a generator, not just a list
+        assert not hasattr(lines, "__len__")
+        assert list(lines) == data
+        # Stop reading early
+        lines = read_jsonl(file_path, read_ahead=True)
+        assert next(lines) == data[0]
+        lines.close()
+
+
+def test_read_jsonl_read_ahead_stdin(monkeypatch):
+    input_data = b'{"hello": "world"}\r\n\n{"test": 123}'
+    monkeypatch.setattr("sys.stdin", TextIOWrapper(BytesIO(input_data)))
+    data = list(read_jsonl("-", read_ahead=True))
+    assert data == [{"hello": "world"}, {"test": 123}]
+
+
+def test_read_jsonl_read_ahead_invalid():
+    file_contents = '{"hello": world}\n{"test": 123}'
+    with make_tempdir({"tmp.jsonl": file_contents}) as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        with pytest.raises(ValueError):
+            list(read_jsonl(file_path, read_ahead=True))
+        data = list(read_jsonl(file_path, skip=True, read_ahead=True))
+    assert data == [{"test": 123}]
+
+
+@pytest.mark.parametrize(
+    "prefilter",
+    [
+        b'"ORG"',
+        '"ORG"',
+        re.compile(rb'"label":\s*"ORG"'),
+        re.compile(r'"label":\s*"ORG"'),
+        lambda line: b"ORG" in line,
+    ],
+)
+def test_read_jsonl_prefilter(prefilter):
+    data = [{"id": i, "label": ["ORG", "PERSON", "GPE"][i % 3]} for i in range(10)]
+    expected = [record for record in data if record["label"] == "ORG"]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        write_jsonl(file_path, data)
+        assert list(read_jsonl(file_path, prefilter=prefilter)) == expected
+        assert (
+            list(read_jsonl(file_path, prefilter=prefilter, read_ahead=True))
+            == expected
+        )
+        gzip_path = temp_dir / "tmp.jsonl.gz"
+        write_gzip_jsonl(gzip_path, data)
+        assert list(read_gzip_jsonl(gzip_path, prefilter=prefilter)) == expected
+
+
+def test_read_jsonl_prefilter_skips_parsing():
+    file_contents = '{"label": "ORG"}\n{"label": broken}\n{"label": "ORG"}'
+    with make_tempdir({"tmp.jsonl": file_contents}) as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        data = list(read_jsonl(file_path, prefilter=b"ORG"))
+        assert data == [{"label": "ORG"}, {"label": "ORG"}]
+        with pytest.raises(ValueError):
+            list(read_jsonl(file_path, prefilter=b"label"))
+
+
+def test_read_jsonl_prefilter_stdin(monkeypatch):
+    input_data = b'{"hello": "w\xc3\xb6rld"}\n{"test": 123}'
+    monkeypatch.setattr("sys.stdin", TextIOWrapper(BytesIO(input_data)))
+    data = list(read_jsonl("-", prefilter="wörld"))
+    assert data == [{"hello": "wörld"}]
+
+
+def test_read_jsonl_prefilter_str_pattern():
+    texts = ["STRAẞE", "street", "straße", "strasse"]
+    file_contents = "".join(f'{{"text": "{text}"}}\n' for text in texts)
+    with make_tempdir({"tmp.jsonl": file_contents}) as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        # Unicode classes and case folding apply to str patterns
+        pattern = re.compile(r'"stra\w+"', re.IGNORECASE)
+        data = list(read_jsonl(file_path, prefilter=pattern))
+        assert [record["text"] for record in data] == ["STRAẞE", "straße", "strasse"]
+        # while bytes patterns match the raw bytes
+        data = list(read_jsonl(file_path, prefilter=re.compile(rb'"stra\w+"')))
+        assert [record["text"] for record in data] == ["strasse"]
+
+
+def test_read_jsonl_prefilter_invalid():
+    with make_tempdir({"tmp.jsonl": '{"hello": "world"}'}) as temp_dir:
+        with pytest.raises(TypeError):
+            list(read_jsonl(temp_dir / "tmp.jsonl", prefilter=123))
+
+
+@pytest.mark.parametrize("gz", [False, True])
+def test_read_jsonl_into(gz):
+    data = [
+        {"start": 0, "end": 5, "label": "PERSON"},
+        {"label": "ORG", "end": 12, "start": 7},
+    ]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        if gz:
+            write_gzip_jsonl(file_path, data)
+            spans = list(read_gzip_jsonl(file_path, into=Span))
+        else:
+            write_jsonl(file_path, data)
+            spans = list(read_jsonl(file_path, into=Span))
+    assert spans == [Span(0, 5, "PERSON"), Span(7, 12, "ORG")]
+    assert not hasattr(spans[0], "__dict__")
+
+
+def test_read_jsonl_into_defaults():
+    data = [{"text": "a", "tags": ["x"], "score": 0.5}, {"text": "b"}]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        write_jsonl(file_path, data)
+        docs = list(read_jsonl(file_path, into=Doc))
+        tokens = list(read_jsonl(file_path, into=Token))
+    assert docs == [Doc("a", ["x"], 0.5), Doc("b")]
+    # Every record gets its own list from the default factory
+    assert docs[1].tags is not Doc("c").tags
+    assert tokens == [Token("a"), Token("b")]
+
+
+def test_read_jsonl_into_unknown_missing():
+    lines = '{"text": "a", "pos": "NOUN"}\n{"pos": "VERB"}\n[1, 2]\n{"text": "c"}'
+    with make_tempdir({"tmp.jsonl": lines}) as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        with pytest.raises(ValueError, match="line 2.*Missing fields.*text"):
+            list(read_jsonl(file_path, into=Token))
+        tokens = list(read_jsonl(file_path, into=Token, skip=True))
+        assert tokens == [Token("a", "NOUN"), Token("c")]
+        tokens = list(read_jsonl(file_path, into=Token, missing="none", skip=True))
+        assert tokens == [Token("a", "NOUN"), Token(None, "VERB"), Token("c")]
+        with pytest.raises(ValueError, match="Unknown fields.*pos"):
+            list(read_jsonl(file_path, into=Doc, unknown="error"))
+        with pytest.raises(ValueError):
+            list(read_jsonl(file_path, into=Token, missing="default"))
+        with pytest.raises(TypeError):
+            list(read_jsonl(file_path, into=dict))
+
+
+@pytest.mark.parametrize("seek", [False, True])
+def test_sample_jsonl(seek):
+    data = [{"id": i} for i in range(100)]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        write_jsonl(file_path, data)
+        sample = sample_jsonl(file_path, 10, seed=0, seek=seek)
+        assert len(sample) == 10
+        ids = [record["id"] for record in sample]
+        assert ids == sorted(set(ids))
+        assert sample_jsonl(file_path, 10, seed=0, seek=seek) == sample
+        assert sample_jsonl(file_path, 200, seek=seek) == data
+        assert sample_jsonl(file_path, 0, seek=seek) == []
+
+
+def test_sample_jsonl_seek_small_file(monkeypatch):
+    class SeekCounter(BytesIO):
+        n_seeks = 0
+
+        def seek(self, *args):
+            self.n_seeks += 1
+            return super().seek(*args)
+
+    data = b"".join(b'{"id": %d}\n' % i for i in range(100))
+    monkeypatch.setattr("srsly._json_api.SEEK_SAMPLE_PROBE_SIZE", 64)
+    f = SeekCounter(data)
+    lines = _seek_sample(f, len(data), 10, random.Random(0))
+    assert len(lines) == 10 and f.n_seeks >= 10
+    # Fewer than 2 * k lines: scan the file instead of seeking
+    for k in (60, 200):
+        f = SeekCounter(data)
+        lines = _seek_sample(f, len(data), k, random.Random(0))
+        assert f.n_seeks == 1
+        assert len(lines) == min(k, 100)
+
+
+def test_sample_jsonl_uniform():
+    data = [{"id": i} for i in range(20)]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        write_jsonl(file_path, data)
+        counts = [0] * len(data)
+        for seed in range(500):
+            for record in sample_jsonl(file_path, 5, seed=seed):
+                counts[record["id"]] += 1
+    # Every line is expected to be sampled 125 times
+    assert min(counts) > 75 and max(counts) < 175
+
+
+def test_sample_jsonl_skip():
+    file_contents = '{"hello": "world"}\n\n{"test": broken}\n{"test": 123}\n'
+    with make_tempdir({"tmp.jsonl": file_contents}) as temp_dir:
+        file_path = temp_dir / "tmp.jsonl"
+        with pytest.raises(ValueError):
+            sample_jsonl(file_path, 10)
+        data = sample_jsonl(file_path, 10, skip=True)
+    assert data == [{"hello": "world"}, {"test": 123}]
+
+
+def test_sample_jsonl_stdin(monkeypatch):
+    input_data = b'{"hello": "world"}\n{"test": 123}'
+    monkeypatch.setattr("sys.stdin", TextIOWrapper(BytesIO(input_data)))
+    assert sample_jsonl("-", 5) == [{"hello": "world"}, {"test": 123}]
+    with pytest.raises(ValueError):
+        sample_jsonl("-", 5, seek=True)
+
+
+def test_sample_gzip_jsonl():
+    data = [{"id": i} for i in range(100)]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.jsonl.gz"
+        write_gzip_jsonl(file_path, data)
+        sample = sample_gzip_jsonl(file_path, 10, seed=0)
+        assert len(sample) == 10
+        assert all(record in data for record in sample)
+        assert sample_gzip_jsonl(file_path, 200) == data
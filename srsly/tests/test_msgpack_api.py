@@ -1,12 +1,19 @@
 import datetime
+import threading
+import uuid
+from decimal import Decimal
+from io import BytesIO, TextIOWrapper
 from collections import namedtuple
 from pathlib import Path
 
+import msgpack
 import pytest
 
 from .._msgpack_api import read_msgpack, write_msgpack
 from .._msgpack_api import msgpack_loads, msgpack_dumps
 from .._msgpack_api import msgpack_encoders, msgpack_decoders
+from .._msgpack_api import iter_msgpack, write_msgpack_stream, MsgpackSerializer
+from .._msgpack_codecs import register_msgpack_codecs, MSGPACK_CODECS
 from .util import make_tempdir
 
 
@@ -207,3 +214,357 @@ def test_msgpack_numpy_not_installed():
     except ModuleNotFoundError:
         with pytest.raises(ModuleNotFoundError, match="numpy"):
             msgpack_loads(bin)
+
+
+def test_msgpack_extensions_profile():
+    data = {"a": 1 + 2j, "b": {"c": 1}, "d": [{"e": 2}]}
+    with msgpack_encoders.profile() as enc_prof:
+        msg = msgpack_dumps(data)
+    with msgpack_decoders.profile() as dec_prof:
+        assert msgpack_loads(msg) == data
+    # Profiling is switched off after the block
+    msgpack_loads(msg)
+    assert enc_prof.stats["numpy"].calls == 1
+    assert enc_prof.stats["numpy"].hits == 0
+    assert enc_prof.stats["complex"].calls == 1
+    assert enc_prof.stats["complex"].hits == 1
+    # Decoders run on every map: the top-level dict, b, the complex and e
+    assert dec_prof.stats["numpy"].calls == 4
+    assert dec_prof.stats["numpy"].hits == 0
+    assert dec_prof.stats["complex"].hits == 1
+    assert dec_prof.stats["complex"].calls == 4
+    assert dec_prof.to_dict()["complex"]["calls"] == 4
+    assert dec_prof.stats["complex"].time >= 0
+    report = dec_prof.report()
+    assert "numpy" in report and "complex" in report
+
+
+def test_msgpack_pack_records():
+    records = [{"id": i, "text": f"t{i}", "tags": ["a"]} for i in range(10)]
+    # Key order doesn't matter, only the set of keys
+    records.append({"text": "x", "tags": [], "id": 10})
+    data = {"records": records, "nested": [{"a": [{"b": 1}, {"b": 2}]}] * 3}
+    msg = msgpack_dumps(data, pack_records=True)
+    assert len(msg) < len(msgpack_dumps(data))
+    out = msgpack_loads(msg)
+    assert out == data
+    assert list(out["records"][-1]) == ["id", "text", "tags"]
+    out = msgpack_loads(msg, use_list=False)
+    assert out["records"][0] == {"id": 0, "text": "t0", "tags": ("a",)}
+    assert isinstance(out["records"], tuple)
+    # Decoded by the numpy decoder, without a decoder of their own
+    assert "records" not in msgpack_decoders._ext
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        [{"a": 1}, {"b": 2}],
+        [{"a": 1}, {"a": 1, "b": 2}],
+        [{"a": 1}, 5],
+        [{"a": 1}],
+        [],
+        [{}, {}],
+        [{"a": 1, "b": 2}, {"a": 1, "c": 2}],
+        [{"a": 1}, {"a": [2, {"b": 3}]}],
+    ],
+)
+def test_msgpack_pack_records_heterogeneous(data):
+    assert msgpack_loads(msgpack_dumps(data, pack_records=True)) == data
+
+
+def test_write_msgpack_pack_records():
+    data = [{"hello": "world", "test": i} for i in range(100)]
+    with make_tempdir(mode="wb") as temp_dir:
+        file_path = temp_dir / "tmp.msg"
+        write_msgpack(file_path, data, pack_records=True)
+        assert read_msgpack(file_path) == data
+        packed_size = file_path.stat().st_size
+        write_msgpack(file_path, data)
+        assert packed_size < file_path.stat().st_size
+
+
+def test_msgpack_loads_intern():
+    data = [{"label": "POSITIVE", "c": 1 + 2j}, {"label": "POSITIVE", "c": 1j}]
+    msg = msgpack_dumps(data)
+    result = msgpack_loads(msg, intern_keys=True, intern_values=True)
+    assert result == data
+    assert list(result[0])[0] is list(result[1])[0]
+    assert result[0]["label"] is result[1]["label"]
+    with make_tempdir(mode="wb") as temp_dir:
+        file_path = temp_dir / "tmp.msg"
+        write_msgpack(file_path, data)
+        result = read_msgpack(file_path, use_list=False, intern_values=True)
+    assert result[0]["label"] is result[1]["label"]
+    assert isinstance(result, tuple)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_msgpack_stream(compress):
+    data = [{"hello": "world"}, [1, 2, 3], 1j, None]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.msgpack"
+        write_msgpack_stream(file_path, data[:2], compress=compress)
+        write_msgpack_stream(file_path, data[2:], compress=compress, append=True)
+        objs = iter_msgpack(file_path, compress=compress)
+        # Make sure this returns a generator, not just a list
+        assert not hasattr(objs, "__len__")
+        assert list(objs) == data
+        assert list(iter_msgpack(file_path, compress=compress, use_list=False)) == [
+            {"hello": "world"},
+            (1, 2, 3),
+            1j,
+            None,
+        ]
+
+
+def test_iter_msgpack_into():
+    Token = namedtuple("Token", ["text", "pos"], defaults=["X"])
+    data = [{"text": "a", "pos": "NOUN"}, {"text": "b", "lemma": "b"}, {"pos": "X"}]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.msgpack"
+        write_msgpack_stream(file_path, data)
+        tokens = iter_msgpack(file_path, into=Token)
+        assert next(tokens) == Token("a", "NOUN")
+        assert next(tokens) == Token("b", "X")
+        with pytest.raises(ValueError):
+            next(tokens)
+        tokens = list(iter_msgpack(file_path, into=Token, missing="none"))
+        assert tokens[2] == Token(None, "X")
+        with pytest.raises(ValueError):
+            list(iter_msgpack(file_path, into=Token, unknown="error"))
+
+
+def test_msgpack_stream_stdio(monkeypatch, capsysbinary):
+    data = [{"hello": "world"}, {"test": 123}]
+    write_msgpack_stream("-", data)
+    output = capsysbinary.readouterr().out
+    monkeypatch.setattr("sys.stdin", TextIOWrapper(BytesIO(output)))
+    assert list(iter_msgpack("-")) == data
+
+
+def test_msgpack_serializer():
+    serializer = MsgpackSerializer()
+    data = {"hello": "world", "test": [1, 2.5, None], "complex": 1j}
+    msg = serializer.dumps(data)
+    assert msg == msgpack_dumps(data)
+    assert serializer.loads(msg) == data
+    assert msgpack_loads(msg) == data
+    assert MsgpackSerializer(use_list=False).loads(msg)["test"] == (1, 2.5, None)
+
+
+def test_msgpack_serializer_dumps_many():
+    serializer = MsgpackSerializer()
+    data = [{"id": i, "values": (i, i + 1)} for i in range(100)]
+    msg = serializer.dumps_many(iter(data))
+    expected = [{"id": i, "values": [i, i + 1]} for i in range(100)]
+    assert serializer.loads_many(msg) == expected
+    # The batch is a msgpack array
+    assert msgpack_loads(msg) == expected
+    assert serializer.loads_many(serializer.dumps_many([])) == []
+    with pytest.raises(ValueError):
+        serializer.loads_many(msg[:-1])
+    # The packer is reset after a failure
+    with pytest.raises(TypeError):
+        serializer.dumps_many([1, object()])
+    assert serializer.loads_many(serializer.dumps_many([1, 2])) == [1, 2]
+
+
+def test_msgpack_serializer_scoped_registries():
+    serializer = MsgpackSerializer(encoders={}, decoders={})
+    with pytest.raises(TypeError):
+        serializer.dumps(1j)
+    # Registries are independent of the global ones
+    serializer.encoders.register(
+        "set", lambda obj: {b"set": list(obj)} if isinstance(obj, set) else obj
+    )
+    serializer.decoders.register(
+        "set", lambda obj: set(obj[b"set"]) if b"set" in obj else obj
+    )
+    assert "set" not in msgpack_encoders._ext
+    assert serializer.loads(serializer.dumps({1, 2})) == {1, 2}
+    with pytest.raises(TypeError):
+        msgpack_dumps({1, 2})
+    # Defaults are copied from the global registries when it's created
+    msgpack_encoders.register("set", func=lambda obj: obj)
+    try:
+        assert "set" not in MsgpackSerializer(encoders={}).encoders._ext
+        assert "set" in MsgpackSerializer().encoders._ext
+    finally:
+        msgpack_encoders.deregister("set")
+
+
+def test_msgpack_serializer_threads():
+    serializer = MsgpackSerializer()
+    errors = []
+
+    def run(i):
+        try:
+            for j in range(200):
+                data = [{"thread": i, "j": j}] * 3
+                assert serializer.loads_many(serializer.dumps_many(data)) == data
+                assert serializer.loads(serializer.dumps(data)) == data
+        except AssertionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+@pytest.fixture
+def msgpack_codecs():
+    register_msgpack_codecs()
+    yield
+    for name in MSGPACK_CODECS:
+        msgpack_encoders.deregister(name)
+        msgpack_decoders.deregister(name)
+
+
+UTC = datetime.timezone.utc
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        uuid.uuid4(),
+        Decimal("12.50"),
+        Decimal("-3.1415926535897932384626433832795028841971"),
+        Decimal("1E+300"),
+        Decimal("-0"),
+        Decimal("0.000"),
+        Decimal("Infinity"),
+        Decimal("-Infinity"),
+        Decimal("7" * 100),
+        {1, "a", (2, (3, 4))},
+        frozenset([1.5, None]),
+        set(),
+    ],
+)
+def test_msgpack_codecs(msgpack_codecs, value):
+    data = {"value": value, "values": [value, {"nested": value}]}
+    result = msgpack_loads(msgpack_dumps(data))
+    assert result == data
+    assert type(result["value"]) is type(value)
+    # The order of sets depends on the hash seed
+    if not isinstance(value, (set, frozenset)):
+        assert str(result["values"][1]["nested"]) == str(value)
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        (
+            datetime.datetime(2024, 5, 17, 12, 30, 1),
+            datetime.datetime(2024, 5, 17, 12, 30, 1, tzinfo=UTC),
+        ),
+        (
+            datetime.datetime(2024, 5, 17, 12, 30, 1, 123456),
+            datetime.datetime(2024, 5, 17, 12, 30, 1, 123456, tzinfo=UTC),
+        ),
+        (
+            datetime.datetime(1901, 1, 1, 0, 0, 0, 1),
+            datetime.datetime(1901, 1, 1, 0, 0, 0, 1, tzinfo=UTC),
+        ),
+        (
+            datetime.datetime(9999, 12, 31, 23, 59, 59, 999999),
+            datetime.datetime(9999, 12, 31, 23, 59, 59, 999999, tzinfo=UTC),
+        ),
+        (
+            datetime.datetime(2024, 5, 17, 12, 30, tzinfo=UTC),
+            datetime.datetime(2024, 5, 17, 12, 30, tzinfo=UTC),
+        ),
+        (
+            datetime.datetime(
+                1960,
+                5,
+                17,
+                23,
+                30,
+                0,
+                5,
+                datetime.timezone(datetime.timedelta(hours=-5)),
+            ),
+            datetime.datetime(1960, 5, 18, 4, 30, 0, 5, tzinfo=UTC),
+        ),
+    ],
+)
+def test_msgpack_codecs_datetime(msgpack_codecs, value, expected):
+    packed = msgpack_dumps({"value": value, "values": [value]})
+    # Standard msgpack timestamps, which msgpack itself can read
+    unpacked = msgpack.unpackb(packed, timestamp=3)
+    assert unpacked == {"value": expected, "values": [expected]}
+    result = msgpack_loads(packed)
+    assert result == {"value": expected, "values": [expected]}
+    assert result["value"].tzinfo == UTC
+
+
+def test_msgpack_codecs_nan(msgpack_codecs):
+    assert msgpack_loads(msgpack_dumps(Decimal("NaN"))).is_nan()
+
+
+def test_msgpack_codecs_compact(msgpack_codecs):
+    assert len(msgpack_dumps(datetime.datetime(2024, 5, 17))) == 6
+    assert len(msgpack_dumps(datetime.datetime(2024, 5, 17, 0, 0, 0, 1))) == 10
+    assert len(msgpack_dumps(uuid.uuid4())) == 18
+
+
+def test_msgpack_codecs_register():
+    with pytest.raises(TypeError):
+        msgpack_dumps(uuid.uuid4())
+    with pytest.raises(ValueError):
+        register_msgpack_codecs(["uuid", "datetimes"])
+    assert uuid.UUID not in msgpack_encoders._types
+    register_msgpack_codecs(["uuid"])
+    try:
+        value = uuid.uuid4()
+        assert msgpack_loads(msgpack_dumps(value)) == value
+        with pytest.raises(TypeError):
+            msgpack_dumps(Decimal("1.5"))
+        # Serializers copy the codecs from the global registries
+        serializer = MsgpackSerializer()
+        assert serializer.loads(serializer.dumps([value])) == [value]
+    finally:
+        msgpack_encoders.deregister("uuid")
+        msgpack_decoders.deregister("uuid")
+    # Without the decoders, extension types are returned as is
+    assert isinstance(msgpack_loads(serializer.dumps(value)), msgpack.ExtType)
+    register_msgpack_codecs(["datetime"])
+    try:
+        value = datetime.datetime(2024, 5, 17, tzinfo=UTC)
+        serializer = MsgpackSerializer()
+        assert serializer.loads(serializer.dumps(value)) == value
+    finally:
+        msgpack_encoders.deregister("datetime")
+        msgpack_decoders.deregister("datetime")
+    assert isinstance(msgpack_loads(serializer.dumps(value)), msgpack.Timestamp)
+
+
+def test_msgpack_codecs_files(msgpack_codecs):
+    data = [
+        {"id": uuid.uuid4(), "time": datetime.datetime(2024, 5, 17, tzinfo=UTC)}
+    ] * 3
+    with make_tempdir() as temp_dir:
+        path = temp_dir / "data.msgpack"
+        write_msgpack(path, data)
+        assert read_msgpack(path) == data
+        write_msgpack_stream(path, data)
+        assert list(iter_msgpack(path)) == data
+
+
+def test_msgpack_decoders_dict_only(msgpack_codecs):
+    # Decoders only receive dicts, also with extension types in the data
+    msgpack_decoders.register("get_x", func=lambda obj: obj.get(b"x", obj))
+    try:
+        data = {"x": 1, "y": {b"x": 2}, "z": [uuid.uuid4(), msgpack.ExtType(42, b"")]}
+        result = msgpack_loads(msgpack_dumps(data))
+        assert result == {"x": 1, "y": 2, "z": data["z"]}
+        with msgpack_encoders.profile() as prof:
+            msgpack_dumps(data)
+        assert prof.stats["uuid"].calls == 1
+    finally:
+        msgpack_decoders.deregister("get_x")
@@ -1,4 +1,4 @@
-from unittest import TestCase
+from unittest import TestCase, mock
 import pytest
 
 pytest.importorskip("numpy", reason="numpy is required for these tests")
@@ -6,6 +6,11 @@ pytest.importorskip("numpy", reason="numpy is required for these tests")
 from numpy.testing import assert_equal, assert_array_equal
 import numpy as np
 from srsly import msgpack_dumps, msgpack_loads, msgpack_decoders, msgpack_encoders
+from srsly import read_msgpack, write_msgpack
+from srsly import write_shared_msgpack, read_shared_msgpack, RaggedArray
+from srsly import _msgpack_numpy
+from srsly._msgpack_numpy import iter_numpy_chunks, count_numpy_chunks
+from .util import make_tempdir
 
 
 class ThirdParty(object):
@@ -228,6 +233,110 @@ class test_numpy_msgpack(TestCase):
         assert_array_equal(x, x_rec)
         assert_equal(x.dtype, x_rec.dtype)
 
+    def test_numpy_array_fortran_order(self):
+        x = np.asfortranarray(np.arange(24, dtype=np.float32).reshape(2, 3, 4))
+        # Arrays up to a chunk keep the layout older versions can read
+        x_enc = msgpack_dumps(x)
+        assert x.tobytes() in x_enc and b"chunks" not in x_enc
+        assert_array_equal(x, msgpack_loads(x_enc))
+        with mock.patch.object(_msgpack_numpy, "NUMPY_CHUNK_SIZE", 64):
+            x_enc = msgpack_dumps(x)
+        assert b"".join(iter_numpy_chunks(x, 64)) == x.tobytes(order="F")
+        x_rec = msgpack_loads(x_enc)
+        assert_array_equal(x, x_rec)
+        assert x_rec.flags["F_CONTIGUOUS"] and not x_rec.flags["C_CONTIGUOUS"]
+        x_rec = msgpack_loads(x_enc, use_list=False)
+        assert_array_equal(x, x_rec)
+
+    def test_numpy_array_fortran_rows(self):
+        # Strided, with Fortran-contiguous rows
+        base = np.asfortranarray(np.arange(60.0).reshape(5, 6, 2))
+        x = np.moveaxis(base, 2, 0)
+        assert not x.flags["C_CONTIGUOUS"] and x[0].flags["F_CONTIGUOUS"]
+        with mock.patch.object(_msgpack_numpy, "NUMPY_CHUNK_SIZE", 64):
+            assert len(list(iter_numpy_chunks(x, 64))) == count_numpy_chunks(x, 64)
+            assert_array_equal(x, self.encode_decode(x))
+            with make_tempdir() as temp_dir:
+                file_path = temp_dir / "tmp.msgpack"
+                write_msgpack(file_path, {"x": x})
+                assert_array_equal(x, read_msgpack(file_path)["x"])
+
+    def test_numpy_array_chunks(self):
+        arrays = [
+            np.arange(1000, dtype=np.float64).reshape(10, 100),
+            np.asfortranarray(np.arange(1000, dtype=np.int16).reshape(10, 100)),
+            np.arange(1000, dtype=np.float64).reshape(10, 100)[:, ::3],
+            np.arange(3000, dtype=np.int32).reshape(3, 1000)[:, ::2],
+            np.arange(100)[::7],
+            np.zeros(9, dtype=[("a", "i4"), ("b", "f8")])[::2],
+        ]
+        with mock.patch.object(_msgpack_numpy, "NUMPY_CHUNK_SIZE", 64):
+            for x in arrays:
+                chunks = list(iter_numpy_chunks(x, 64))
+                assert len(chunks) == count_numpy_chunks(x, 64)
+                assert all(len(chunk) <= 64 for chunk in chunks)
+                x_rec = self.encode_decode(x)
+                assert_array_equal(x, x_rec)
+                assert_equal(x.dtype, x_rec.dtype)
+
+    def test_write_msgpack_chunks(self):
+        data = {
+            "c": np.arange(10000, dtype=np.float32).reshape(100, 100),
+            "f": np.asfortranarray(np.ones((50, 60))),
+            "strided": np.arange(20000).reshape(100, 200)[::2, ::3],
+            "small": np.arange(3),
+            "list": [np.arange(500, dtype=np.int8), "text"],
+        }
+        with make_tempdir() as temp_dir:
+            file_path = temp_dir / "tmp.msgpack"
+            with mock.patch.object(_msgpack_numpy, "NUMPY_CHUNK_SIZE", 1000):
+                write_msgpack(file_path, data)
+            result = read_msgpack(file_path)
+            assert_array_equal(msgpack_loads(file_path.read_bytes())["c"], data["c"])
+        for key in ("c", "f", "strided", "small"):
+            assert_array_equal(result[key], data[key])
+            assert_equal(result[key].dtype, data[key].dtype)
+        assert result["f"].flags["F_CONTIGUOUS"]
+        assert_array_equal(result["list"][0], data["list"][0])
+        assert result["list"][1] == "text"
+
+    def test_ragged_array(self):
+        arrays = [np.arange(i * 3, dtype="f").reshape(i, 3) for i in (2, 0, 5, 1)]
+        ragged = RaggedArray.from_arrays(arrays)
+        assert len(ragged) == 4
+        assert_array_equal(ragged.lengths, [2, 0, 5, 1])
+        for arr, item in zip(arrays, ragged):
+            assert_array_equal(arr, item)
+        assert ragged[2].base is not None
+        assert_array_equal(ragged[-1], arrays[-1])
+        sliced = ragged[1:3]
+        assert isinstance(sliced, RaggedArray)
+        assert_array_equal(sliced.offsets, [0, 0, 5])
+        assert np.shares_memory(sliced.data, ragged.data)
+        assert ragged[::2].to_list()[1].shape == (5, 3)
+        assert len(ragged[3:1]) == 0
+        with pytest.raises(IndexError):
+            ragged[4]
+        with pytest.raises(ValueError):
+            RaggedArray(np.zeros(3), [0, 2])
+        with pytest.raises(ValueError):
+            RaggedArray(np.zeros(3), [0, 2, 1, 3])
+
+    def test_ragged_array_msgpack(self):
+        arrays = [np.arange(i, dtype="i4") for i in range(100)]
+        data = {
+            "spans": RaggedArray.from_arrays(arrays),
+            "empty": RaggedArray.from_arrays([]),
+        }
+        x_enc = msgpack_dumps(data)
+        assert len(x_enc) < len(msgpack_dumps(arrays))
+        x_rec = msgpack_loads(x_enc)
+        assert x_rec["spans"] == data["spans"]
+        assert x_rec["empty"] == data["empty"]
+        assert_array_equal(x_rec["spans"][42], arrays[42])
+        with write_shared_msgpack(data) as shared:
+            assert read_shared_msgpack(shared)["spans"] == data["spans"]
+
     def test_list_mixed(self):
         x = [1.0, np.float32(3.5), np.complex128(4.25), b"foo"]
         x_rec = self.encode_decode(x)
@@ -0,0 +1,110 @@
+import gc
+import multiprocessing
+import pickle
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from .._msgpack_shared import write_shared_msgpack, read_shared_msgpack
+from .._msgpack_shared import SharedMsgpack
+
+try:
+    import numpy
+
+    has_numpy = True
+except ImportError:
+    has_numpy = False
+
+# Closing a block that's still in use is reported as an unraisable exception
+pytestmark = pytest.mark.filterwarnings(
+    "error::pytest.PytestUnraisableExceptionWarning"
+)
+
+
+def sum_vectors(shared):
+    data = read_shared_msgpack(shared)
+    return {key: float(value.sum()) for key, value in data["vectors"].items()}
+
+
+def test_shared_msgpack_roundtrip():
+    data = {"hello": "world", "test": [1, 2.5, None], "bytes": b"\x00\x01"}
+    with write_shared_msgpack(data) as shared:
+        assert isinstance(shared, SharedMsgpack)
+        assert read_shared_msgpack(shared) == data
+        assert read_shared_msgpack(shared.name, use_list=False)["test"] == (
+            1,
+            2.5,
+            None,
+        )
+
+
+def test_shared_msgpack_unlink():
+    shared = write_shared_msgpack({"a": 1})
+    assert read_shared_msgpack(shared, unlink=True) == {"a": 1}
+    with pytest.raises(FileNotFoundError):
+        read_shared_msgpack(shared)
+    # Unlinking again is fine
+    shared.unlink()
+
+
+def test_shared_msgpack_pickle():
+    with write_shared_msgpack([1, 2, 3]) as shared:
+        received = pickle.loads(pickle.dumps(shared))
+        assert received.name == shared.name
+        assert read_shared_msgpack(received) == [1, 2, 3]
+
+
+@pytest.mark.skipif(not has_numpy, reason="numpy not installed")
+def test_shared_msgpack_numpy_views():
+    arr = numpy.arange(24, dtype="f").reshape(4, 6)
+    data = {
+        "c": arr,
+        "f": numpy.asfortranarray(arr),
+        "strided": arr[:, ::2],
+        "empty": numpy.zeros((0, 3)),
+        "scalar": numpy.float64(1.5),
+        "structured": numpy.zeros(3, dtype=[("a", "i4"), ("b", "f8")]),
+    }
+    with write_shared_msgpack(data) as shared:
+        result = read_shared_msgpack(shared)
+    for key in ("c", "f", "strided", "empty", "structured"):
+        numpy.testing.assert_array_equal(result[key], data[key])
+        assert result[key].dtype == data[key].dtype
+        assert not result[key].flags.writeable
+    assert result["c"].base is result["f"].base
+    assert result["scalar"] == 1.5
+    # The views remain valid after the block is unlinked and other views of
+    # it are gone
+    vector = result["c"]
+    del result
+    gc.collect()
+    assert vector.sum() == arr.sum()
+    del vector
+    gc.collect()
+
+
+@pytest.mark.skipif(not has_numpy, reason="numpy not installed")
+def test_shared_msgpack_worker_process():
+    vectors = {str(i): numpy.full((100, 10), i, dtype="f") for i in range(3)}
+    ctx = multiprocessing.get_context("spawn")
+    with write_shared_msgpack({"vectors": vectors}) as shared:
+        with ctx.Pool(1) as pool:
+            result = pool.apply(sum_vectors, (shared,))
+    assert result == {"0": 0.0, "1": 1000.0, "2": 2000.0}
+
+
+@pytest.mark.skipif(not has_numpy, reason="numpy not installed")
+def test_shared_msgpack_arrays_alive_at_exit():
+    script = (
+        "import numpy, srsly\n"
+        "shared = srsly.write_shared_msgpack({'a': numpy.arange(10)})\n"
+        "data = srsly.read_shared_msgpack(shared, unlink=True)\n"
+    )
+    root = Path(__file__).parent.parent.parent
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=root, capture_output=True, text=True
+    )
+    assert result.returncode == 0
+    assert result.stderr == ""
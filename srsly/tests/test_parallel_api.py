@@ -0,0 +1,167 @@
+import gzip
+import os
+
+import pytest
+
+from .._json_api import write_jsonl, write_gzip_jsonl, write_json
+from .._json_api import read_json, read_jsonl
+from .._msgpack_api import write_msgpack, read_msgpack
+from .._pickle_api import write_pickle
+from .._yaml_api import write_yaml
+from .._parallel_api import read_many, resolve_paths, get_reader
+from .._parallel_api import write_shards, ShardWriter
+from .util import make_tempdir
+
+
+def make_shards(temp_dir, n_shards=6, n_lines=5):
+    paths = []
+    for i in range(n_shards):
+        lines = [{"shard": i, "line": j} for j in range(n_lines)]
+        if i % 2:
+            path = temp_dir / f"shard-{i}.jsonl.gz"
+            write_gzip_jsonl(path, lines)
+        else:
+            path = temp_dir / f"shard-{i}.jsonl"
+            write_jsonl(path, lines)
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_read_many_ordered(processes):
+    with make_tempdir() as temp_dir:
+        paths = make_shards(temp_dir)
+        records = read_many(paths, workers=2, prefetch=2, processes=processes)
+        # Make sure this returns a generator, not just a list
+        assert not hasattr(records, "__len__")
+        records = list(records)
+    assert records == [{"shard": i, "line": j} for i in range(6) for j in range(5)]
+
+
+def test_read_many_unordered_glob():
+    with make_tempdir() as temp_dir:
+        make_shards(temp_dir)
+        records = list(read_many(str(temp_dir / "shard-*"), ordered=False))
+    assert len(records) == 30
+    assert sorted((r["shard"], r["line"]) for r in records) == [
+        (i, j) for i in range(6) for j in range(5)
+    ]
+
+
+def test_read_many_per_file_mixed_formats():
+    with make_tempdir() as temp_dir:
+        write_json(temp_dir / "a.json", {"a": 1})
+        write_msgpack(temp_dir / "b.msgpack", [1, 2, 3])
+        write_yaml(temp_dir / "c.yml", {"c": 3})
+        write_pickle(temp_dir / "d.pkl", {"d": 4})
+        write_jsonl(temp_dir / "e.jsonl", [{"e": 5}, {"e": 6}])
+        (temp_dir / "notes.txt").write_text("not a shard")
+        results = list(read_many(temp_dir, per_file=True))
+        assert [(path.name, content) for path, content in results] == [
+            ("a.json", {"a": 1}),
+            ("b.msgpack", [1, 2, 3]),
+            ("c.yml", {"c": 3}),
+            ("d.pkl", {"d": 4}),
+            ("e.jsonl", [{"e": 5}, {"e": 6}]),
+        ]
+        records = list(read_many(temp_dir))
+    assert records == [{"a": 1}, 1, 2, 3, {"c": 3}, {"d": 4}, {"e": 5}, {"e": 6}]
+
+
+def test_read_many_errors():
+    with make_tempdir() as temp_dir:
+        (temp_dir / "notes.txt").write_text("not a shard")
+        with pytest.raises(ValueError, match="unsupported extension"):
+            read_many([temp_dir / "notes.txt"]).__next__()
+        with pytest.raises(ValueError):
+            resolve_paths([temp_dir / "missing.jsonl"])
+        path = temp_dir / "broken.jsonl"
+        path.write_text('{"a": 1}\n{broken\n')
+        with pytest.raises(ValueError):
+            list(read_many([path]))
+        assert list(read_many([path], skip=True)) == [{"a": 1}]
+
+
+def test_read_many_stop_early():
+    with make_tempdir() as temp_dir:
+        paths = make_shards(temp_dir, n_shards=20)
+        records = read_many(paths, workers=2, prefetch=2)
+        assert next(records) == {"shard": 0, "line": 0}
+        records.close()
+
+
+def test_get_reader_extensions():
+    assert get_reader("data.JSONL").__name__ == "read_jsonl"
+    assert get_reader("data.v1.jsonl.gz").__name__ == "read_gzip_jsonl"
+    assert get_reader("data.msg").__name__ == "read_msgpack"
+
+
+@pytest.mark.parametrize("format", ["jsonl", "msgpack"])
+@pytest.mark.parametrize("compress,workers", [(False, 4), (True, 0), (True, 2)])
+def test_write_shards_max_records(format, compress, workers):
+    records = [{"id": i, "text": "hello"} for i in range(25)]
+    with make_tempdir() as temp_dir:
+        manifest = write_shards(
+            temp_dir / "out",
+            iter(records),
+            format=format,
+            max_records=10,
+            compress=compress,
+            workers=workers,
+        )
+        assert manifest["records"] == 25
+        assert [shard["records"] for shard in manifest["shards"]] == [10, 10, 5]
+        for shard in manifest["shards"]:
+            shard_path = temp_dir / "out" / shard["path"]
+            assert shard_path.stat().st_size == shard["bytes"]
+        assert read_json(temp_dir / "out" / "manifest.json") == manifest
+        suffix = (".jsonl" if format == "jsonl" else ".msgpack") + (
+            ".gz" if compress else ""
+        )
+        assert manifest["shards"][0]["path"] == f"shard-00000{suffix}"
+        # Reading the directory uses the shards listed in the manifest
+        assert list(read_many(temp_dir / "out")) == records
+
+
+def test_write_shards_max_bytes():
+    records = [{"id": i} for i in range(100)]
+    line_size = len('{"id":10}\n')
+    with make_tempdir() as temp_dir:
+        with ShardWriter(temp_dir, max_bytes=line_size * 10, prefix="part") as writer:
+            writer.write_many(records)
+            writer.write({"id": 100})
+        manifest = writer.manifest
+        assert manifest["records"] == 101
+        for shard in manifest["shards"]:
+            assert shard["bytes"] <= line_size * 10
+            assert shard["path"].startswith("part-")
+            assert read_jsonl(temp_dir / shard["path"])
+        msgpack_shard = write_shards(temp_dir / "m", records[:3], format="msgpack")
+        shard_path = temp_dir / "m" / msgpack_shard["shards"][0]["path"]
+        assert read_msgpack(shard_path) == records[:3]
+
+
+def test_write_shards_errors():
+    with make_tempdir() as temp_dir:
+        with pytest.raises(ValueError, match="Unsupported shard format"):
+            write_shards(temp_dir, [], format="yaml")
+        manifest = write_shards(temp_dir, [])
+        assert manifest["shards"] == []
+        assert list(read_many(temp_dir)) == []
+
+
+@pytest.mark.parametrize("format", ["jsonl", "msgpack"])
+def test_write_shards_compress_streams(format):
+    # Compressed shards are written as the records come in, not buffered
+    records = [{"id": i, "text": os.urandom(32).hex()} for i in range(100000)]
+    with make_tempdir() as temp_dir:
+        with ShardWriter(temp_dir, format=format, compress=True, workers=2) as writer:
+            writer.write_many(records)
+            shard_path = temp_dir / writer.shards[0]["path"]
+            assert shard_path.stat().st_size > 2**20
+        shard = writer.manifest["shards"][0]
+        assert shard["records"] == len(records)
+        assert shard_path.stat().st_size == shard["bytes"]
+        with gzip.open(shard_path, "rb") as f:
+            assert len(f.read()) == shard["uncompressed_bytes"]
+        assert list(read_many(temp_dir)) == records
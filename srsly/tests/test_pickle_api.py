@@ -1,4 +1,12 @@
+from io import BytesIO, TextIOWrapper
+import gzip
+
+import pytest
+
 from .._pickle_api import pickle_dumps, pickle_loads
+from .._pickle_api import read_pickle, write_pickle
+from .._pickle_api import iter_pickle, write_pickle_stream
+from .util import make_tempdir
 
 
 def test_pickle_dumps():
@@ -19,3 +27,50 @@ def test_pickle_loads():
     assert len(data) == 2
     assert data["hello"] == "world"
     assert data["test"] == 123
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_write_read_pickle_file(compress):
+    data = {"hello": "world", "test": [1, 2, 3]}
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.pkl"
+        write_pickle(file_path, data, compress=compress)
+        assert file_path.exists()
+        if compress:
+            with gzip.open(file_path, "rb") as f:
+                assert pickle_loads(f.read()) == data
+        assert read_pickle(file_path, compress=compress) == data
+
+
+def test_read_pickle_file_missing():
+    with make_tempdir() as temp_dir:
+        with pytest.raises(ValueError):
+            read_pickle(temp_dir / "missing.pkl")
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_write_pickle_stream_iter_pickle(compress):
+    data = [{"hello": "world"}, {"test": 123}, [1, 2]]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "tmp.pkl"
+        write_pickle_stream(file_path, data, compress=compress)
+        write_pickle_stream(file_path, data[:1], compress=compress, append=True)
+        records = iter_pickle(file_path, compress=compress)
+        # Make sure this returns a generator, not just a list
+        assert not hasattr(records, "__len__")
+        assert list(records) == data + data[:1]
+
+
+def test_read_pickle_stdin(monkeypatch):
+    stdin = TextIOWrapper(BytesIO(pickle_dumps({"hello": "world"})))
+    monkeypatch.setattr("sys.stdin", stdin)
+    assert read_pickle("-") == {"hello": "world"}
+
+
+def test_write_pickle_stream_stdout(monkeypatch):
+    stdout = TextIOWrapper(BytesIO())
+    monkeypatch.setattr("sys.stdout", stdout)
+    write_pickle_stream("-", [1, 2, 3])
+    stdout.buffer.seek(0)
+    monkeypatch.setattr("sys.stdin", TextIOWrapper(stdout.buffer))
+    assert list(iter_pickle("-")) == [1, 2, 3]
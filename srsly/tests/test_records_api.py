@@ -0,0 +1,220 @@
+import pickle
+
+import pytest
+
+from .._records_api import read_records, write_records, RecordReader, RecordWriter
+from .._records_api import RecordStore, MARKER
+from .._msgpack_api import msgpack_dumps
+from .util import make_tempdir
+
+try:
+    import numpy
+
+    has_numpy = True
+except ImportError:
+    has_numpy = False
+
+
+def make_records(n=10):
+    return [{"id": i, "text": f"record {i}", "data": b"\x00" * i} for i in range(n)]
+
+
+def test_write_read_records():
+    records = make_records()
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "data.rec"
+        write_records(file_path, records)
+        assert list(read_records(file_path)) == records
+        assert list(read_records(str(file_path))) == records
+
+
+def test_write_records_empty():
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "data.rec"
+        write_records(file_path, [])
+        with RecordReader(file_path) as reader:
+            assert len(reader) == 0
+            assert list(reader) == []
+            assert not reader.recovered
+
+
+def test_record_reader_random_access():
+    records = make_records(20)
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "data.rec"
+        write_records(file_path, iter(records))
+        with RecordReader(file_path) as reader:
+            assert len(reader) == 20
+            assert reader[0] == records[0]
+            assert reader[13] == records[13]
+            assert reader[-1] == records[-1]
+            assert reader[5:8] == records[5:8]
+            assert reader[::-3] == records[::-3]
+            assert list(reader.iter(15)) == records[15:]
+            with pytest.raises(IndexError):
+                reader[20]
+
+
+def test_record_reader_use_list():
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "data.rec"
+        write_records(file_path, [[1, 2], {"a": [3]}])
+        with RecordReader(file_path, use_list=False) as reader:
+            assert reader[0] == (1, 2)
+            assert reader[1] == {"a": (3,)}
+
+
+@pytest.mark.parametrize("n_shards", [1, 3, 7, 25])
+def test_record_reader_iter_shard(n_shards):
+    records = make_records(20)
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "data.rec"
+        write_records(file_path, records)
+        with RecordReader(file_path) as reader:
+            shards = [list(reader.iter_shard(i, n_shards)) for i in range(n_shards)]
+            with pytest.raises(ValueError):
+                reader.iter_shard(n_shards, n_shards)
+    assert [record for shard in shards for record in shard] == records
+    sizes = [len(shard) for shard in shards]
+    assert max(sizes) - min(sizes) <= 1
+
+
+def test_record_reader_pickle():
+    records = make_records()
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "data.rec"
+        write_records(file_path, records)
+        with RecordReader(file_path) as reader:
+            copy = pickle.loads(pickle.dumps(reader))
+        with copy:
+            assert copy[1:3] == records[1:3]
+
+
+def test_record_writer():
+    records = make_records()
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "data.rec"
+        with RecordWriter(file_path) as writer:
+            writer.write(records[0])
+            writer.write_many(records[1:])
+            assert len(writer) == len(records)
+        assert list(read_records(file_path)) == records
+
+
+def test_record_reader_not_a_record_file():
+    with make_tempdir({"data.rec": "hello"}) as temp_dir:
+        with pytest.raises(ValueError):
+            RecordReader(temp_dir / "data.rec")
+
+
+def test_record_reader_corrupt_record():
+    records = make_records()
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "data.rec"
+        write_records(file_path, records)
+        data = bytearray(file_path.read_bytes())
+        # Change one byte of the text of the fourth record
+        pos = data.index(b"record 3")
+        data[pos] = ord("R")
+        file_path.write_bytes(bytes(data))
+        with RecordReader(file_path) as reader:
+            assert reader[2] == records[2]
+            with pytest.raises(ValueError):
+                reader[3]
+            with pytest.raises(ValueError):
+                list(reader)
+        assert list(read_records(file_path, skip=True)) == records[:3] + records[4:]
+
+
+def test_record_reader_recover_without_index():
+    records = make_records()
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "data.rec"
+        write_records(file_path, records)
+        data = file_path.read_bytes()
+        # Cut off the index and the second half of the last record
+        last = data.rindex(MARKER)
+        file_path.write_bytes(data[: last + 20])
+        with RecordReader(file_path) as reader:
+            assert reader.recovered
+            assert list(reader) == records[:-1]
+        # Damage a record header: reading resumes at the next record
+        pos = data.index(MARKER, data.index(b"record 5"))
+        file_path.write_bytes(data[:pos] + b"\xff" * 8 + data[pos + 8 : last])
+        with RecordReader(file_path) as reader:
+            assert reader.recovered
+            assert list(reader) == records[:6] + records[7:-1]
+
+
+@pytest.mark.skipif(not has_numpy, reason="numpy not installed")
+def test_records_numpy():
+    records = [{"id": i, "vector": numpy.arange(i, dtype="f")} for i in range(5)]
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "data.rec"
+        write_records(file_path, records)
+        with RecordReader(file_path) as reader:
+            record = reader[3]
+    assert record["id"] == 3
+    assert numpy.array_equal(record["vector"], records[3]["vector"])
+    assert record["vector"].dtype == numpy.float32
+
+
+def test_record_store():
+    records = make_records(20)
+    store = RecordStore(iter(records[:15]))
+    store.extend(records[15:19])
+    store.append(records[19])
+    assert len(store) == 20
+    assert store[3] == records[3]
+    assert store[-1] == records[-1]
+    assert store[2:10:3] == records[2:10:3]
+    assert store.get_batch([7, 0, -2]) == [records[7], records[0], records[-2]]
+    assert list(store) == records
+    n_bytes = sum(len(msgpack_dumps(record)) for record in records)
+    assert store.nbytes == n_bytes + 8 * 21
+    with pytest.raises(IndexError):
+        store[20]
+    assert RecordStore(records, use_list=False)[0] == records[0]
+    assert RecordStore([[1, [2]]], use_list=False)[0] == (1, (2,))
+
+
+def test_record_store_shuffle():
+    records = make_records(50)
+    store = RecordStore(records)
+    store.shuffle(seed=0)
+    shuffled = list(store)
+    assert shuffled != records
+    assert sorted(shuffled, key=lambda record: record["id"]) == records
+    other = RecordStore(records)
+    other.shuffle(seed=0)
+    assert list(other) == shuffled
+    # Records added later are appended after the shuffled ones
+    store.append({"id": 50})
+    assert store[-1] == {"id": 50}
+    assert len(store) == 51
+
+
+def test_record_store_save_load():
+    records = make_records(20)
+    store = RecordStore(records)
+    store.shuffle(seed=1)
+    with make_tempdir() as temp_dir:
+        file_path = temp_dir / "store.rec"
+        store.save(file_path)
+        assert list(read_records(file_path)) == list(store)
+        with RecordStore.load(file_path) as loaded:
+            assert len(loaded) == 20
+            assert list(loaded) == list(store)
+            assert loaded.nbytes < store.nbytes
+            loaded.shuffle(seed=2)
+            shuffled = list(loaded)
+            assert sorted(shuffled, key=lambda record: record["id"]) == records
+            copy = pickle.loads(pickle.dumps(loaded))
+            assert list(copy) == list(loaded)
+            copy.close()
+            with pytest.raises(ValueError):
+                loaded.append({"id": 20})
+            with pytest.raises(ValueError):
+                loaded.save(file_path)
+            loaded.save(temp_dir / "copy.rec")
+        assert list(read_records(temp_dir / "copy.rec")) == shuffled
@@ -0,0 +1,142 @@
+from io import BytesIO
+import gc
+import gzip
+import random
+import threading
+
+import pytest
+
+from ..util import StringInterner, read_ahead_lines, reservoir_sample
+from ..util import ParallelGzipWriter, suspend_gc
+
+
+def test_string_interner():
+    interner = StringInterner(max_size=2, max_value_length=3)
+    a = "".join(["a", "b"])
+    b = "".join(["a", "b"])
+    assert a is not b
+    assert interner(a) is a
+    assert interner(b) is a
+    interner("c")
+    # The table is full, new strings are returned as-is
+    d = "".join(["d", "e"])
+    assert interner(d) is d
+    assert "de" not in interner.strings
+    assert interner.intern_value("xyzw") == "xyzw"
+    assert interner.intern_value(5) == 5
+
+
+def test_string_interner_pairs_hook():
+    interner = StringInterner(max_size=4)
+    hook = interner.pairs_hook(keys=True, values=True)
+    key = "".join(["k", "ey"])
+    assert hook([(key, "val"), (1, "x" * 40)]) == {"key": "val", 1: "x" * 40}
+    assert hook([("key", "other")]) == {"key": "other"}
+    assert list(hook([("key", 1)]))[0] is key
+    assert len(interner.strings) == 3
+    # The dict's strings don't all fit into the table, so they're not added
+    assert hook([("a", "b"), ("c", "d")]) == {"a": "b", "c": "d"}
+    assert len(interner.strings) == 3
+    hook = interner.pairs_hook(keys=False, values=True)
+    assert list(hook([("new", "val")])) == ["new"]
+    assert "new" not in interner.strings
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1024])
+def test_read_ahead_lines(chunk_size):
+    data = b'{"a": 1}\n{"b": 2}\r\n\n{"c": "x\ry\x0cz"}\n' + b"w" * 50
+    lines = list(read_ahead_lines(BytesIO(data), chunk_size=chunk_size))
+    # The same lines as file iteration, which only splits on \n
+    assert lines == BytesIO(data).readlines()
+    assert [line.strip() for line in lines] == [
+        b'{"a": 1}',
+        b'{"b": 2}',
+        b"",
+        b'{"c": "x\ry\x0cz"}',
+        b"w" * 50,
+    ]
+
+
+def test_read_ahead_lines_error():
+    class BrokenStream:
+        def read(self, size):
+            raise OSError("broken")
+
+    with pytest.raises(OSError, match="broken"):
+        list(read_ahead_lines(BrokenStream()))
+
+
+def test_read_ahead_lines_stop_early():
+    stream = BytesIO(b"line\n" * 10000)
+    lines = read_ahead_lines(stream, chunk_size=16, depth=1)
+    assert next(lines) == b"line\n"
+    lines.close()
+
+
+@pytest.mark.parametrize("workers", [0, 1, 4])
+def test_parallel_gzip_writer(workers):
+    data = [f"line {i}\n".encode("utf8") for i in range(10000)]
+    stream = BytesIO()
+    with ParallelGzipWriter(stream, workers=workers, block_size=1000) as f:
+        f.writelines(data)
+    assert gzip.decompress(stream.getvalue()) == b"".join(data)
+    # Every block is a complete gzip member
+    stream = BytesIO()
+    with ParallelGzipWriter(stream, workers=workers) as f:
+        f.write(b"")
+    assert gzip.decompress(stream.getvalue()) == b""
+
+
+def test_reservoir_sample():
+    items = [None, 0, "a", 1.5, None] * 20
+    sample = reservoir_sample(items, 10, random.Random(0))
+    assert len(sample) == 10
+    assert reservoir_sample(items, 10, random.Random(0)) == sample
+    assert reservoir_sample(iter(items), 1000) == items
+    assert reservoir_sample(items, 0) == []
+    # Items are returned in their original order
+    numbered = reservoir_sample(range(1000), 50)
+    assert numbered == sorted(numbered)
+
+
+def test_suspend_gc_nested():
+    assert gc.isenabled()
+    with suspend_gc():
+        assert not gc.isenabled()
+        with suspend_gc():
+            assert not gc.isenabled()
+        # The outer block is still running
+        assert not gc.isenabled()
+    assert gc.isenabled()
+    assert suspend_gc().depth == 0
+
+
+def test_suspend_gc_keeps_disabled():
+    gc.disable()
+    try:
+        with suspend_gc():
+            pass
+        assert not gc.isenabled()
+    finally:
+        gc.enable()
+
+
+def test_suspend_gc_threads():
+    inside = threading.Event()
+    release = threading.Event()
+
+    def decode():
+        with suspend_gc():
+            inside.set()
+            release.wait()
+
+    thread = threading.Thread(target=decode)
+    thread.start()
+    inside.wait()
+    # Exiting here doesn't enable the collector while the thread decodes
+    with suspend_gc():
+        pass
+    assert not gc.isenabled()
+    release.set()
+    thread.join()
+    assert gc.isenabled()
@@ -1,9 +1,12 @@
 from io import StringIO
 from pathlib import Path
+from collections import OrderedDict
+from enum import IntEnum
+import datetime
 import pytest
 
 from .._yaml_api import yaml_dumps, yaml_loads, read_yaml, write_yaml
-from .._yaml_api import is_yaml_serializable
+from .._yaml_api import is_yaml_serializable, find_yaml_unserializable
 from ruamel.yaml import YAML
 from ruamel.yaml.comments import CommentedMap
 from ruamel.yaml.representer import RepresenterError
@@ -92,6 +95,48 @@ def test_is_yaml_serializable(obj, expected):
     assert is_yaml_serializable(obj) == expected
     # Check again to be sure it's consistent
     assert is_yaml_serializable(obj) == expected
+    assert (find_yaml_unserializable(obj) is None) == expected
+
+
+class FloatSubclass(float):
+    pass
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        {"a": {1, 2}, "b": (1, [2.5, None]), "c": b"bytes"},
+        {(1, 2): "tuple key", 3: OrderedDict(a=1)},
+        [datetime.date(2024, 1, 1), datetime.datetime(2024, 1, 1, 12)],
+        {"a": lambda x: x},
+        {"a": [1, CommentedMap(a=1)]},
+        {"a": {IntEnum("E", "A").A: 1}},
+        {"a": {1, FloatSubclass(1.5)}},
+    ],
+)
+def test_find_yaml_unserializable_matches_dumps(obj):
+    try:
+        yaml_dumps(obj)
+        expected = True
+    except RepresenterError:
+        expected = False
+    assert is_yaml_serializable(obj) == expected
+    assert (find_yaml_unserializable(obj) is None) == expected
+
+
+def test_find_yaml_unserializable():
+    data = {"a": [1, {"b": lambda x: x}]}
+    assert find_yaml_unserializable(data) == ("a", 1, "b")
+    assert find_yaml_unserializable({"a": [1, CommentedMap()]}) == ("a", 1)
+    assert find_yaml_unserializable(lambda x: x) == ()
+
+
+def test_is_yaml_serializable_recursive():
+    data = {"a": [1]}
+    data["a"].append(data)
+    assert is_yaml_serializable(data)
+    data["a"].append(object())
+    assert find_yaml_unserializable(data) == ("a", 2)
 
 
 class Malicious:
@@ -1,6 +1,18 @@
 from pathlib import Path
-from typing import Union, Dict, Any, List, Tuple
-from collections import OrderedDict
+from typing import Union, Dict, Any, List, Tuple, Callable, Iterable, Iterator, IO
+from typing import Optional, TypeVar
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from queue import Queue
+import gc
+import gzip
+import itertools
+import math
+import random
+import sys
+import threading
 
 
 # fmt: off
@@ -29,3 +41,364 @@ def force_string(location):
     if isinstance(location, str):
         return location
     return str(location)
+
+
+@contextmanager
+def open_binary(
+    path: FilePath, mode: str, compress: bool = False
+) -> Iterator[IO[bytes]]:
+    """Open a file, or standard input/output for "-", as a binary stream.
+
+    path (FilePath): The file path. "-" for stdin (when reading) or stdout.
+    mode (str): "rb", "wb" or "ab".
+    compress (bool): Whether the stream is compressed with gzip.
+    YIELDS (IO[bytes]): The binary stream.
+    """
+    reading = mode.startswith("r")
+    if path == "-":  # reading from sys.stdin or writing to sys.stdout
+        if not reading:
+            # Keep the order of text printed before
+            sys.stdout.flush()
+        if reading:
+            stream = sys.stdin.buffer
+        else:
+            stream = getattr(sys.stdout, "buffer", None)
+        if stream is None:
+            # sys.stdout was replaced by a text stream, e.g. by
+            # contextlib.redirect_stdout or in a notebook
+            if compress:
+                raise ValueError("Can't write compressed data to a text stdout")
+            yield _TextWriter(sys.stdout)
+            sys.stdout.flush()
+            return
+        if compress:
+            with gzip.GzipFile(fileobj=stream, mode=mode) as f:
+                yield f
+        else:
+            yield stream
+        if not reading:
+            stream.flush()
+        return
+    file_path = force_path(path, require_exists=reading)
+    if compress:
+        with gzip.open(file_path, mode) as f:
+            yield f
+    else:
+        with file_path.open(mode) as f:
+            yield f
+
+
+class _TextWriter:
+    """Binary stream writing UTF-8 encoded data to a text stream."""
+
+    def __init__(self, stream: IO[str]):
+        self._stream = stream
+
+    def write(self, data: bytes) -> int:
+        return self._stream.write(bytes(data).decode("utf8"))
+
+    def flush(self) -> None:
+        self._stream.flush()
+
+
+class _GCSuspension:
+    """Counted suspension of the garbage collector, shared by all threads.
+    The collector is disabled when the first block is entered and re-enabled
+    when the last one exits, so nested and concurrent blocks don't turn it
+    back on while another one is still running. If the collector was already
+    disabled, it stays disabled.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._was_enabled = False
+
+    def __enter__(self) -> None:
+        with self._lock:
+            if self._depth == 0:
+                self._was_enabled = gc.isenabled()
+                gc.disable()
+            self._depth += 1
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        with self._lock:
+            self._depth -= 1
+            if self._depth == 0 and self._was_enabled:
+                gc.enable()
+
+    @property
+    def depth(self) -> int:
+        """The number of blocks currently suspending the collector."""
+        return self._depth
+
+
+_gc_suspension = _GCSuspension()
+# Smaller payloads don't allocate enough objects to trigger a collection
+GC_SUSPEND_MIN_SIZE = 2**14
+
+
+def suspend_gc() -> _GCSuspension:
+    """Get a context manager suspending the garbage collector while a large
+    payload is decoded. Decoding allocates many container objects, which
+    would trigger collections scanning all of them over and over, although
+    none of them are garbage. The suspension is counted, so it's safe to use
+    from multiple threads and in nested calls:
+
+        with suspend_gc():
+            data = ujson.loads(text)
+
+    RETURNS (ContextManager): The context manager.
+    """
+    return _gc_suspension
+
+
+class ParallelGzipWriter:
+    """Binary writer that compresses its input in blocks on a pool of worker
+    threads and writes them to a stream in order. zlib releases the GIL, so
+    the blocks are compressed in parallel while the caller produces more
+    data. Every block is a complete gzip member, and the output is a
+    multi-member gzip stream that gzip, zcat and srsly's readers decompress
+    as a whole.
+
+    stream (IO[bytes]): The binary stream to write the compressed data to.
+    workers (int): Number of compression threads. 0 or 1 to compress in the
+        calling thread.
+    level (int): The gzip compression level.
+    block_size (int): Number of uncompressed bytes per block.
+    """
+
+    def __init__(
+        self,
+        stream: IO[bytes],
+        workers: int = 4,
+        level: int = 6,
+        block_size: int = 2**20,
+    ):
+        self.stream = stream
+        self.level = level
+        self.block_size = block_size
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(workers) if workers > 1 else None
+        self._pending: deque = deque()
+        self._buffer: List[bytes] = []
+        self._buffer_size = 0
+
+    def __enter__(self) -> "ParallelGzipWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        elif self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def write(self, data: bytes) -> int:
+        self._buffer.append(data)
+        self._buffer_size += len(data)
+        if self._buffer_size >= self.block_size:
+            self._submit()
+        return len(data)
+
+    def writelines(self, lines: Iterable[bytes]) -> None:
+        for line in lines:
+            self.write(line)
+
+    def close(self) -> None:
+        """Compress and write the remaining data. Doesn't close the stream."""
+        if self._buffer:
+            self._submit()
+        while self._pending:
+            self.stream.write(self._pending.popleft().result())
+        if self._pool is not None:
+            self._pool.shutdown()
+        self.stream.flush()
+
+    def _submit(self) -> None:
+        block = b"".join(self._buffer)
+        self._buffer = []
+        self._buffer_size = 0
+        if self._pool is None:
+            self.stream.write(self._compress(block))
+            return
+        self._pending.append(self._pool.submit(self._compress, block))
+        # Bound the memory used by blocks waiting to be written
+        while len(self._pending) > self.workers * 2 or (
+            self._pending and self._pending[0].done()
+        ):
+            self.stream.write(self._pending.popleft().result())
+
+    def _compress(self, block: bytes) -> bytes:
+        return gzip.compress(block, compresslevel=self.level, mtime=0)
+
+
+T = TypeVar("T")
+
+
+def reservoir_sample(
+    items: Iterable[T], k: int, rng: Optional[random.Random] = None
+) -> List[T]:
+    """Sample k items of an iterable uniformly in a single pass, using
+    reservoir sampling with geometric jumps (Li's "Algorithm L"). Items
+    between two replacements are skipped at C level without drawing a random
+    number.
+
+    items (Iterable): The items to sample.
+    k (int): Number of items to sample. If there are fewer items, all of them
+        are returned.
+    rng (random.Random): The random number generator.
+    RETURNS (List): The sampled items, in their original order.
+    """
+    if k <= 0:
+        return []
+    rng = rng if rng is not None else random.Random()
+    items = iter(items)
+    reservoir = list(enumerate(itertools.islice(items, k)))
+    if len(reservoir) == k:
+        # 1.0 - random() is in (0, 1], so the logarithms are defined
+        w = math.exp(math.log(1.0 - rng.random()) / k)
+        i = k - 1
+        while w < 1.0:
+            jump = int(math.log(1.0 - rng.random()) / math.log(1.0 - w))
+            # Use a sentinel, as the items may be None
+            item = next(itertools.islice(items, jump, None), _EXHAUSTED)
+            if item is _EXHAUSTED:
+                break
+            i += jump + 1
+            reservoir[rng.randrange(k)] = (i, item)
+            w *= math.exp(math.log(1.0 - rng.random()) / k)
+    reservoir.sort(key=lambda entry: entry[0])
+    return [item for _, item in reservoir]
+
+
+_EXHAUSTED = object()
+
+
+def read_ahead_lines(
+    stream: IO[bytes], chunk_size: int = 2**20, depth: int = 2
+) -> Iterator[bytes]:
+    """Yield the lines of a binary stream, while a background thread reads
+    (and for compressed streams, decompresses) the upcoming chunks. File reads
+    and zlib release the GIL, so I/O and decompression overlap with the work
+    done on the lines by the consumer.
+
+    stream (IO[bytes]): The binary stream to read from.
+    chunk_size (int): Number of bytes to read at a time.
+    depth (int): Maximum number of chunks read ahead of the consumer.
+    YIELDS (bytes): The lines, including the line break.
+    """
+    chunks: Queue = Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def read_chunks():
+        try:
+            while not stop.is_set():
+                chunk = stream.read(chunk_size)
+                chunks.put(chunk)
+                if not chunk:
+                    break
+        except BaseException as e:
+            chunks.put(e)
+
+    thread = threading.Thread(target=read_chunks, daemon=True)
+    thread.start()
+    try:
+        # Pieces of a line that spans several chunks
+        pieces: List[bytes] = []
+        while True:
+            chunk = chunks.get()
+            if isinstance(chunk, BaseException):
+                raise chunk
+            if not chunk:
+                break
+            # Only split on line feeds, like file iteration does: other
+            # line boundaries such as \r can be part of a JSON string
+            lines = BytesIO(chunk).readlines()
+            # The last line may continue in the next chunk
+            last = lines.pop() if not lines[-1].endswith(b"\n") else None
+            if lines and pieces:
+                pieces.append(lines[0])
+                lines[0] = b"".join(pieces)
+                pieces = []
+            yield from lines
+            if last is not None:
+                pieces.append(last)
+        if pieces:
+            yield b"".join(pieces)
+    finally:
+        stop.set()
+        # Unblock the reader if it's waiting for space in the queue
+        while thread.is_alive():
+            while not chunks.empty():
+                chunks.get_nowait()
+            thread.join(timeout=0.01)
+
+
+class StringInterner:
+    """Bounded table of strings, used to share a single object between
+    repeated dict keys and short string values of deserialized data. The
+    table lives as long as the interner, e.g. for one call of a loader or
+    one file of a JSONL reader, and never holds more than max_size strings.
+
+    max_size (int): Maximum number of distinct strings in the table. Once it's
+        full, new strings are returned as-is.
+    max_value_length (int): Maximum length of string values to intern.
+    """
+
+    __slots__ = ("strings", "max_size", "max_value_length")
+
+    def __init__(self, max_size: int = 100_000, max_value_length: int = 32):
+        self.strings: Dict[str, str] = {}
+        self.max_size = max_size
+        self.max_value_length = max_value_length
+
+    def __call__(self, string: str) -> str:
+        cached = self.strings.get(string)
+        if cached is not None:
+            return cached
+        if len(self.strings) < self.max_size:
+            self.strings[string] = string
+        return string
+
+    def intern_value(self, value: Any) -> Any:
+        """Intern a value if it's a short string."""
+        if type(value) is str and len(value) <= self.max_value_length:
+            return self(value)
+        return value
+
+    def pairs_hook(
+        self, keys: bool = True, values: bool = False
+    ) -> Callable[[List[Tuple[Any, Any]]], Dict[Any, Any]]:
+        """Get an object_pairs_hook for the json and msgpack decoders, which
+        builds each dict with its keys and/or short string values interned as
+        it's decoded.
+
+        keys (bool): Intern the keys.
+        values (bool): Intern short string values.
+        RETURNS (Callable): The hook, called with the (key, value) pairs.
+        """
+        strings = self.strings
+        max_size = self.max_size
+        max_length = self.max_value_length
+        n_per_pair = keys + values
+
+        def hook(pairs):
+            # Look up strings at C level instead of calling self for each.
+            # New strings are only added while all strings of the dict fit
+            # into the table.
+            if len(strings) + len(pairs) * n_per_pair <= max_size:
+                lookup = strings.setdefault
+            else:
+                lookup = strings.get
+            if not values:
+                return {
+                    (lookup(k, k) if type(k) is str else k): v for k, v in pairs
+                }
+            return {
+                (lookup(k, k) if keys and type(k) is str else k): (
+                    lookup(v, v) if type(v) is str and len(v) <= max_length else v
+                )
+                for k, v in pairs
+            }
+
+        return hook